@@ -0,0 +1,261 @@
+# bench/run.py
+
+"""
+Timed scenarios against VersionManager on a synthetic install (see bench/synth.py).
+Results are written as JSON so two runs (e.g. before and after a change) can be compared:
+
+    python -m bench.run --scale small --out before.json
+    python -m bench.run --scale small --out after.json --compare before.json
+
+Timings include the OS page cache as it happens to be; run the same scale on the same
+disk when comparing, and prefer the median of a few --repeat runs for the short scenarios.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import subprocess
+
+from bench import synth
+from core import trace
+from core.manager import VersionManager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Dedicated server installs for the fleet scenarios.
+FLEET_SERVERS = 4
+
+def _timed(func, repeat=1, setup=None):
+    """Runs func() 'repeat' times (calling setup() untimed before each run). Returns a result dict."""
+    runs = []
+    value = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        value = func()
+        runs.append(time.perf_counter() - started)
+    result = {'seconds': statistics.median(runs), 'runs': runs}
+    if isinstance(value, dict):
+        result.update(value)
+    return result
+
+def _evict(paths):
+    """Drops files from the page cache where the OS allows it (Linux; a no-op on tmpfs)."""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            if hasattr(os, 'posix_fadvise'):
+                os.fdatasync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+def _read_all(paths):
+    """Stands in for a game launch: reads every file of the hot set once."""
+    total = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                total += len(chunk)
+    return {'files': len(paths), 'bytes': total}
+
+def _verify_stats(result):
+    return {key: result[key] for key in ('ok', 'files', 'hashed', 'cached')}
+
+def _fleet_stats(result):
+    return {'ok': result['ok'], 'instances': len(result['instances']),
+            'slowest': max(entry['seconds'] for entry in result['instances'])}
+
+def run_scenarios(workdir, scale, repeat, log):
+    info = synth.generate(os.path.join(workdir, 'pz'), scale)
+    log(f"Generated {info['game_files']} game files ({info['game_bytes'] / 2**20:.0f} MB) and "
+        f"{info['user_files']} user files ({info['user_bytes'] / 2**20:.0f} MB).")
+    config_path = os.path.join(workdir, 'config.json')
+    synth.write_config(config_path, info, os.path.join(workdir, 'manager'))
+    os.makedirs(os.path.join(workdir, 'manager'))
+    manager = VersionManager(config_path)
+    results = {}
+
+    def record(name, result):
+        results[name] = result
+        log(f"{name:<20} {result['seconds']:8.3f}s")
+
+    record('scan_cold', _timed(lambda: {'files': manager.scan_game_install(use_cache=False).file_count}, repeat))
+    manager.scan_game_install()
+    record('scan_cached', _timed(lambda: {'files': manager.scan_game_install().file_count}, repeat))
+
+    record('capture', _timed(lambda: manager.capture_current_version('base'), 1))
+    record('verify_full', _timed(lambda: _verify_stats(manager.verify_profile('base', use_cache=False)), 1))
+    record('verify_cached', _timed(lambda: _verify_stats(manager.verify_profile('base')), repeat))
+
+    # A second build that shares most of its files with the first one.
+    synth.regenerate_user_data(info)
+    touched = synth.mutate(info['game_path'], fraction=0.02)
+    synth.write_manifest(info['steamapps_path'], build_id='12345679', beta_key='unstable')
+    record('capture_dedup', _timed(lambda: dict(manager.capture_current_version('patched'),
+                                                touched=touched), 1))
+
+    # A point release on top of that, stored as deltas over the previous build.
+    synth.regenerate_user_data(info, seed=8)
+    edited = synth.patch(info['game_path'])
+    synth.write_manifest(info['steamapps_path'], build_id='12345680', beta_key='unstable')
+    record('capture_delta', _timed(lambda: dict(manager.capture_current_version('delta', base='patched'),
+                                                edited=edited), 1))
+    record('materialize', _timed(lambda: manager.materialize_profile('delta'), 1))
+
+    # The first switch moves the captured real folders aside; time the ones after it.
+    manager.switch_to_version('patched')
+    targets = ['base', 'patched']
+    def switch_next():
+        targets.reverse()
+        manager.switch_to_version(targets[0])
+    record('switch', _timed(switch_next, repeat * 2))
+    record('prepare', _timed(manager._remove_symlinks_and_manifest, repeat,
+                             setup=lambda: manager.switch_to_version('patched')))
+    manager.switch_to_version('patched')
+
+    # The first launch after a switch, with a cold cache and after a pre-warm.
+    from core.prewarm import build_hot_set
+    hot = build_hot_set(os.path.join(manager.get_profile_path('patched'), 'GameFiles'))
+    def prewarmed():
+        _evict(hot)
+        manager.prewarm_profile('patched').wait()
+    record('launch_cold', _timed(lambda: _read_all(hot), repeat, setup=lambda: _evict(hot)))
+    record('launch_prewarmed', _timed(lambda: _read_all(hot), repeat, setup=prewarmed))
+
+    def refresh(fresh):
+        target = VersionManager(config_path) if fresh else manager
+        return {'profiles': len(target.get_profile_infos()), 'active': target.get_active_profile(),
+                'version': target.detect_current_version_name()}
+    record('refresh_cold', _timed(lambda: refresh(True), repeat))
+    record('refresh_warm', _timed(lambda: refresh(False), repeat))
+
+    # A hotfix written into the linked profile, then picked up by update_profile().
+    synth.mutate(info['game_path'], fraction=0.005, seed=2)
+    record('update', _timed(lambda: manager.update_profile('patched'), 1))
+
+    # A host running several dedicated servers: store them all, then roll all of them back and forth.
+    from core.instances import Fleet
+    instances = synth.generate_servers(os.path.join(workdir, 'servers'), info, FLEET_SERVERS)
+    fleet = Fleet(VersionManager(config_path, dict(manager.config, instances=instances)))
+    record('fleet_capture', _timed(lambda: _fleet_stats(fleet.capture('b41')), 1))
+    for entry in instances:
+        synth.regenerate_user_data(entry, seed=11)
+        synth.mutate(os.path.join(entry['steamapps_path'], 'common', synth.APPS[synth.DEDICATED_SERVER_APP_ID][1]),
+                     fraction=0.02, seed=4)
+        synth.write_manifest(entry['steamapps_path'], '12345690', 'unstable', app_id=synth.DEDICATED_SERVER_APP_ID)
+    record('fleet_capture_dedup', _timed(lambda: _fleet_stats(fleet.capture('b42')), 1))
+    fleet.switch('b41')
+    fleet_targets = ['b41', 'b42']
+    def fleet_switch_next():
+        fleet_targets.reverse()
+        return _fleet_stats(fleet.switch(fleet_targets[0]))
+    record('fleet_switch', _timed(fleet_switch_next, repeat * 2))
+
+    # Handing a build to another PC: a bundle file, read back into an empty manager folder.
+    bundle_path = os.path.join(workdir, 'base.pzbundle')
+    record('bundle_export', _timed(lambda: manager.export_profile('base', bundle_path, include_user_data=True), 1))
+    remote = VersionManager(config_path, dict(manager.config, manager_path=os.path.join(workdir, 'remote')))
+    os.makedirs(remote.manager_path)
+    record('bundle_import', _timed(lambda: remote.import_profile(bundle_path), 1))
+    shutil.rmtree(remote.manager_path)
+    os.remove(bundle_path)
+
+    copy_dest = os.path.join(workdir, 'plain-copy')
+    record('plain_copy', _timed(lambda: manager.get_copy_engine().copy_tree(
+        os.path.join(manager.get_profile_path('base'), 'GameFiles'), copy_dest), 1))
+    shutil.rmtree(copy_dest)
+    record('archive', _timed(lambda: manager.archive_profile('base'), 1))
+    record('restore', _timed(lambda: manager.restore_profile('base'), 1))
+
+    cli = [sys.executable, os.path.join(REPO_ROOT, 'cli.py'), '--config', config_path, 'status']
+    record('cli_startup', _timed(lambda: subprocess.run(cli, check=True, capture_output=True) and None,
+                                 repeat * 3))
+
+    shutil.rmtree(manager.manager_path, ignore_errors=True)
+    return info, results
+
+def compare(results, baseline, threshold, noise=0.005):
+    """
+    Prints a before/after table. Returns the names of scenarios slower than 'threshold' times;
+    differences under 'noise' seconds are ignored, as sub-millisecond timings jitter a lot.
+    """
+    regressions = []
+    print(f"{'scenario':<16} {'before':>9} {'after':>9} {'ratio':>7}")
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        ratio = result['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        slower = ratio > threshold and result['seconds'] - before['seconds'] > noise
+        flag = ' <-- slower' if slower else ''
+        print(f"{name:<16} {before['seconds']:9.3f} {result['seconds']:9.3f} {ratio:7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.run', description="Version manager benchmarks.")
+    parser.add_argument('--scale', default='small',
+                        help=f"One of {', '.join(synth.SCALES)} or a factor (1.0 is about 1 GB).")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per short scenario (median is kept).")
+    parser.add_argument('--workdir', help="Where to generate the synthetic install (default: a temp folder).")
+    parser.add_argument('--out', help="Write the results to this JSON file.")
+    parser.add_argument('--compare', help="A previous results file to compare against.")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="With --compare, exit with 1 if a scenario is this many times slower.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the manager's own log output.")
+    parser.add_argument('--trace', help="Also write timing spans to this file (.jsonl, or Chrome trace format).")
+    args = parser.parse_args(argv)
+    if args.trace:
+        trace.enable(args.trace)
+    scale = args.scale if args.scale in synth.SCALES else float(args.scale)
+
+    log = lambda message: print(message, file=sys.stderr)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='pzvm-bench-')
+    try:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+        with quiet:
+            info, results = run_scenarios(workdir, scale, args.repeat, log)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'scale': args.scale, 'repeat': args.repeat, 'revision': _git_revision(),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'game_files': info['game_files'], 'game_bytes': info['game_bytes'],
+            'user_files': info['user_files'], 'user_bytes': info['user_bytes'],
+        },
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if compare(results, baseline, args.threshold) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# bench/synth.py
+
+import os
+import json
+import random
+import shutil
+
+PZ_APP_ID = '108600'
+DEDICATED_SERVER_APP_ID = '380870'
+APPS = {PZ_APP_ID: ('Project Zomboid', 'ProjectZomboid'),
+        DEDICATED_SERVER_APP_ID: ('Project Zomboid Dedicated Server', 'Project Zomboid Dedicated Server')}
+
+# (file count, min size, max size) per kind of file, at scale 1.0 (about 1 GB of game files).
+# Loosely modelled on a real install: lots of small Lua/script/media files, a few big
+# texture packs and jars, and a user folder full of tiny map_*.bin save chunks.
+GAME_LAYOUT = {
+    'media/lua/{group}/{i}.lua': (6000, 512, 48 * 1024),
+    'media/scripts/{group}/{i}.txt': (1500, 256, 32 * 1024),
+    'media/textures/{group}/{i}.png': (4000, 1024, 256 * 1024),
+    'media/sound/{group}/{i}.ogg': (600, 64 * 1024, 1024 * 1024),
+    'media/texturepacks/pack{i}.pack': (12, 16 * 1024 * 1024, 48 * 1024 * 1024),
+    'java/lib{i}.jar': (30, 256 * 1024, 4 * 1024 * 1024),
+    'projectzomboid{i}.jar': (1, 40 * 1024 * 1024, 40 * 1024 * 1024),
+}
+USER_LAYOUT = {
+    'Saves/Sandbox/world{group}/map_{i}.bin': (12000, 200, 4 * 1024),
+    'Saves/Sandbox/world{group}/chunkdata_{i}.bin': (800, 64, 512),
+    'Logs/log{i}.txt': (20, 1024, 64 * 1024),
+    'mods/placeholder{i}.txt': (5, 16, 64),
+}
+# Per Workshop item: a mod folder with a handful of Lua files, textures and a poster.
+WORKSHOP_ITEM_LAYOUT = {
+    'mods/{group}/media/lua/client/{i}.lua': (30, 512, 16 * 1024),
+    'mods/{group}/media/textures/{i}.png': (20, 2048, 512 * 1024),
+    'mods/{group}/poster{i}.png': (1, 64 * 1024, 256 * 1024),
+}
+WORKSHOP_ITEMS = 200
+SCALES = {'tiny': 0.02, 'small': 0.1, 'medium': 1.0, 'large': 3.0}
+
+class _ContentSource:
+    """Cheap pseudo-random file contents: slices of one random pool behind a unique header."""
+
+    def __init__(self, rng, pool_size=64 * 1024 * 1024):
+        self.rng = rng
+        self.pool = rng.randbytes(pool_size)
+        self.counter = 0
+
+    def write(self, path, size):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.counter += 1
+        header = f"{self.counter}:{self.rng.random()}\n".encode()
+        with open(path, 'wb') as f:
+            f.write(header[:size])
+            remaining = size - min(size, len(header))
+            while remaining > 0:
+                chunk = min(remaining, len(self.pool) // 2)
+                offset = self.rng.randrange(len(self.pool) - chunk + 1)
+                f.write(self.pool[offset:offset + chunk])
+                remaining -= chunk
+
+def _populate(root, layout, scale, content, rng):
+    total_bytes, total_files = 0, 0
+    for pattern, (count, min_size, max_size) in layout.items():
+        # Kinds with only a few huge files shrink in size rather than count at small scales.
+        size_scale = min(1.0, count * scale)
+        for i in range(max(1, int(count * scale))):
+            rel_path = pattern.format(group=i % 20, i=i)
+            size = int(rng.randint(min_size, max_size) * size_scale)
+            content.write(os.path.join(root, rel_path), size)
+            total_bytes += size
+            total_files += 1
+    return total_bytes, total_files
+
+def write_manifest(steamapps_path, build_id, beta_key=None, app_id=PZ_APP_ID):
+    """Writes a minimal but valid appmanifest_<app id>.acf (the game's by default)."""
+    beta = f'\t\t"BetaKey"\t\t"{beta_key}"\n' if beta_key else ''
+    name, install_dir = APPS[app_id]
+    with open(os.path.join(steamapps_path, f'appmanifest_{app_id}.acf'), 'w', encoding='utf-8') as f:
+        f.write('"AppState"\n{\n'
+                f'\t"appid"\t\t"{app_id}"\n'
+                f'\t"name"\t\t"{name}"\n'
+                '\t"StateFlags"\t\t"4"\n'
+                f'\t"installdir"\t\t"{install_dir}"\n'
+                f'\t"buildid"\t\t"{build_id}"\n'
+                '\t"UserConfig"\n\t{\n' + beta + '\t}\n}\n')
+
+def write_workshop_manifest(steamapps_path, items):
+    """Writes appworkshop_108600.acf listing {item id: time updated} as installed."""
+    entries = ''.join(f'\t\t"{item_id}"\n\t\t{{\n\t\t\t"size"\t\t"0"\n'
+                      f'\t\t\t"timeupdated"\t\t"{updated}"\n\t\t}}\n'
+                      for item_id, updated in items.items())
+    with open(os.path.join(steamapps_path, 'workshop', f'appworkshop_{PZ_APP_ID}.acf'), 'w', encoding='utf-8') as f:
+        f.write('"AppWorkshop"\n{\n'
+                f'\t"appid"\t\t"{PZ_APP_ID}"\n'
+                '\t"WorkshopItemsInstalled"\n\t{\n' + entries + '\t}\n}\n')
+
+def generate_workshop(steamapps_path, count, content, rng, first_id=2000000000):
+    """Creates 'count' Workshop items and their manifest. Returns {item id: time updated}."""
+    items = {}
+    for n in range(count):
+        item_id = str(first_id + n)
+        item_path = os.path.join(steamapps_path, 'workshop', 'content', PZ_APP_ID, item_id)
+        _populate(item_path, WORKSHOP_ITEM_LAYOUT, 1.0, content, rng)
+        items[item_id] = str(1600000000 + rng.randrange(10**8))
+    write_workshop_manifest(steamapps_path, items)
+    return items
+
+def generate(root, scale='small', seed=42):
+    """
+    Creates a synthetic Steam library and Zomboid user folder under 'root'.
+    Returns a dict with the paths and the size of what was generated.
+    """
+    factor = SCALES.get(scale, scale)
+    rng = random.Random(seed)
+    content = _ContentSource(rng, pool_size=min(64 * 1024 * 1024, max(4 * 1024 * 1024, int(64 * 1024 * 1024 * factor))))
+    steamapps_path = os.path.join(root, 'steamapps')
+    game_path = os.path.join(steamapps_path, 'common', 'ProjectZomboid')
+    user_path = os.path.join(root, 'Zomboid')
+    game_bytes, game_files = _populate(game_path, GAME_LAYOUT, factor, content, rng)
+    user_bytes, user_files = _populate(user_path, USER_LAYOUT, factor, content, rng)
+    workshop_items = generate_workshop(steamapps_path, max(1, int(WORKSHOP_ITEMS * factor)), content, rng)
+    write_manifest(steamapps_path, build_id='12345678')
+    return {
+        'root': root,
+        'steamapps_path': steamapps_path,
+        'game_path': game_path,
+        'zomboid_user_path': user_path,
+        'game_bytes': game_bytes, 'game_files': game_files,
+        'user_bytes': user_bytes, 'user_files': user_files,
+        'workshop_items': workshop_items,
+    }
+
+def generate_servers(root, info, count, build_id='12345678'):
+    """
+    Creates 'count' dedicated server installs (app 380870) under 'root', each a copy of the
+    generated game files with a steamapps and user folder of its own, like a host running
+    several servers has. Returns their entries for the config's 'instances' list.
+    """
+    instances = []
+    for n in range(count):
+        name = f'server{n + 1}'
+        steamapps_path = os.path.join(root, name, 'steamapps')
+        shutil.copytree(info['game_path'], os.path.join(steamapps_path, 'common', APPS[DEDICATED_SERVER_APP_ID][1]))
+        write_manifest(steamapps_path, build_id, app_id=DEDICATED_SERVER_APP_ID)
+        user_path = os.path.join(root, name, 'Zomboid')
+        regenerate_user_data({'zomboid_user_path': user_path}, seed=n)
+        instances.append({'name': name, 'steamapps_path': steamapps_path, 'zomboid_user_path': user_path})
+    return instances
+
+def regenerate_user_data(info, seed=7):
+    """Creates a fresh user folder (a capture moves the old one into the profile)."""
+    rng = random.Random(seed)
+    content = _ContentSource(rng, pool_size=4 * 1024 * 1024)
+    _populate(info['zomboid_user_path'], USER_LAYOUT, 0.1, content, rng)
+
+def mutate(game_path, fraction=0.01, seed=1):
+    """
+    Simulates a small Steam patch: rewrites about 'fraction' of the files (by replacing
+    them, like Steam does), adds a few and deletes a few. Returns the number of files touched.
+    """
+    rng = random.Random(seed)
+    content = _ContentSource(rng, pool_size=4 * 1024 * 1024)
+    paths = sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(game_path) for name in names)
+    touched = rng.sample(paths, max(1, int(len(paths) * fraction)))
+    for path in touched[:len(touched) * 3 // 4]:
+        size = os.path.getsize(path)
+        content.write(path + '.patch', size)
+        os.replace(path + '.patch', path)
+    for path in touched[len(touched) * 3 // 4:]:
+        os.remove(path)
+    for i in range(max(1, len(touched) // 4)):
+        content.write(os.path.join(game_path, 'media', 'lua', 'patch', f'new{i}.lua'), rng.randint(512, 8192))
+    return len(touched)
+
+def patch(game_path, fraction=0.2, min_size=256 * 1024, seed=3):
+    """
+    Simulates a point release: about 'fraction' of the large files get small binary edits
+    (a few bytes overwritten, a few KB inserted and removed) instead of new contents, which
+    is what delta capture is for. Returns the number of files edited.
+    """
+    rng = random.Random(seed)
+    paths = sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(game_path) for name in names
+                   if os.path.getsize(os.path.join(dirpath, name)) >= min_size)
+    edited = rng.sample(paths, max(1, int(len(paths) * fraction))) if paths else []
+    for path in edited:
+        with open(path, 'rb') as f:
+            data = bytearray(f.read())
+        for _ in range(3):
+            at = rng.randrange(len(data))
+            data[at:at + 16] = rng.randbytes(16)
+        at = rng.randrange(len(data))
+        data[at:at] = rng.randbytes(rng.randint(1024, 8192))
+        at = rng.randrange(len(data))
+        del data[at:at + rng.randint(1024, 8192)]
+        with open(path + '.patch', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.patch', path)
+    return len(edited)
+
+def write_config(config_path, info, manager_path):
+    with open(config_path, 'w') as f:
+        json.dump({
+            'steamapps_path': info['steamapps_path'],
+            'manager_path': manager_path,
+            'zomboid_user_path': info['zomboid_user_path'],
+        }, f, indent=4)
@@ -0,0 +1,274 @@
+# cli.py
+
+"""
+Headless command line interface for the version manager, e.g. for cron jobs, deploy
+scripts and dedicated server hosts. Results are printed to stdout as JSON; log messages
+and progress (with --progress) go to stderr. Never imports Qt. Ctrl+C cancels a long
+command cleanly.
+
+    python cli.py list
+    python cli.py status
+    python cli.py capture "b41-stable"
+    python cli.py switch "b42-unstable" --progress
+    python cli.py verify "b41-stable" --full
+    python cli.py capture "b42.1" --base "b42.0"
+    python cli.py migrate "b41-stable" /mnt/hdd/pzvm
+    python cli.py --instance pvp-1 switch "b41"
+    python cli.py fleet-switch "b41" --jobs 8
+    python cli.py export "b42-unstable" tcp://0.0.0.0:7890 --connections 3
+    python cli.py import tcp://192.168.1.20:7890
+"""
+
+import sys
+import json
+import argparse
+import contextlib
+
+from core.manager import VersionManager
+
+def cmd_list(manager, args):
+    active_profile = manager.get_active_profile()
+    profiles = manager.get_profile_infos()
+    for info in profiles:
+        info['active'] = info['name'] == active_profile
+    return {'profiles': profiles}
+
+def cmd_status(manager, args):
+    return {
+        'active_profile': manager.get_active_profile() or None,
+        'detected_version': manager.detect_current_version_name(),
+        'steam_updating': manager.is_steam_updating(),
+        'steamapps_path': manager.steamapps_path,
+        'manager_path': manager.manager_path,
+        'zomboid_user_path': manager.zomboid_user_path,
+        'quarantined': manager.get_quarantined_paths(),
+    }
+
+def cmd_capture(manager, args):
+    return manager.capture_current_version(args.profile, progress=args.tracker, base=args.base)
+
+def cmd_update(manager, args):
+    return manager.update_profile(args.profile, progress=args.tracker)
+
+def cmd_switch(manager, args):
+    previous = manager.get_active_profile()
+    manager.switch_to_version(args.profile, progress=args.tracker)
+    # The switch is done; deleting any real folders it set aside may take a while longer.
+    result = {'active_profile': args.profile, 'purged': manager.purge_quarantine(args.tracker)}
+    if previous and previous != args.profile and manager.needs_written_through_check(previous):
+        result['written_through'] = manager.repair_written_through(previous)
+    return result
+
+def cmd_prepare(manager, args):
+    manager._remove_symlinks_and_manifest()
+    return {'active_profile': None, 'purged': manager.purge_quarantine(args.tracker)}
+
+def cmd_purge(manager, args):
+    return {'purged': manager.purge_quarantine(args.tracker)}
+
+def cmd_verify(manager, args):
+    return manager.verify_profile(args.profile, progress=args.tracker, use_cache=not args.full)
+
+def cmd_archive(manager, args):
+    manager.archive_profile(args.profile, progress=args.tracker)
+    return {'archived': args.profile}
+
+def cmd_restore(manager, args):
+    return manager.restore_profile(args.profile, progress=args.tracker)
+
+def cmd_materialize(manager, args):
+    return manager.materialize_profile(args.profile, progress=args.tracker)
+
+def cmd_dematerialize(manager, args):
+    removed, freed = manager.dematerialize_profile(args.profile)
+    return {'objects_removed': removed, 'bytes_freed': freed}
+
+def cmd_prewarm(manager, args):
+    prewarmer = manager.prewarm_profile(args.profile)
+    try:
+        while prewarmer.running:
+            prewarmer.wait(0.5)
+            args.tracker.check_cancelled()
+    finally:
+        prewarmer.stop()
+    return {'files': prewarmer.files, 'bytes': prewarmer.bytes, 'seconds': prewarmer.seconds}
+
+def cmd_roots(manager, args):
+    return {'placement_policy': manager.placement_policy, 'roots': manager.get_storage_roots()}
+
+def cmd_migrate(manager, args):
+    return manager.migrate_profile(args.profile, args.root, progress=args.tracker)
+
+def cmd_rebalance(manager, args):
+    moves = manager.plan_rebalance()
+    if not args.dry_run:
+        for name, _, root in moves:
+            manager.migrate_profile(name, root, progress=args.tracker)
+    return {'moves': [{'profile': name, 'from': source, 'to': root} for name, source, root in moves],
+            'dry_run': args.dry_run}
+
+def _fleet(manager, args):
+    from core.instances import Fleet
+    return Fleet(manager, args.jobs)
+
+def _instance_names(args):
+    return [name.strip() for name in args.instances.split(',')] if args.instances else None
+
+def cmd_instances(manager, args):
+    return {'instances': _fleet(manager, args).status(_instance_names(args))}
+
+def cmd_fleet_capture(manager, args):
+    return _fleet(manager, args).capture(args.profile, _instance_names(args), progress=args.tracker)
+
+def cmd_fleet_switch(manager, args):
+    return _fleet(manager, args).switch(args.profile, _instance_names(args), progress=args.tracker)
+
+def cmd_export(manager, args):
+    from core.bundle import is_address
+    if is_address(args.dest):
+        return manager.serve_profile(args.profile, args.dest, args.user_data, args.connections, progress=args.tracker)
+    return manager.export_profile(args.profile, args.dest, args.user_data, progress=args.tracker)
+
+def cmd_import(manager, args):
+    return manager.import_profile(args.source, args.profile, progress=args.tracker)
+
+def cmd_recover(manager, args):
+    return {'recovered': manager.recover_interrupted_switch(),
+            'migrations_recovered': manager.recover_interrupted_migrations()}
+
+# name: (handler, help, takes a profile, runs as a job: None (quick, runs inline), 'profile' or 'install')
+COMMANDS = {
+    'list': (cmd_list, "List stored profiles with their metadata.", False, None),
+    'status': (cmd_status, "Show the active profile and detected version.", False, None),
+    'capture': (cmd_capture, "Store the current install as a new profile.", True, 'install'),
+    'update': (cmd_update, "Update a profile from the current install (changed files only).", True, 'install'),
+    'switch': (cmd_switch, "Switch the active version to a profile.", True, 'install'),
+    'prepare': (cmd_prepare, "Unlink the active version before a new Steam download.", False, 'install'),
+    'purge': (cmd_purge, "Delete the real game folders a switch or unlink set aside.", False, 'profile'),
+    'verify': (cmd_verify, "Check a profile's files against their recorded hashes.", True, 'profile'),
+    'archive': (cmd_archive, "Compress a profile to save space.", True, 'profile'),
+    'restore': (cmd_restore, "Unpack an archived profile.", True, 'profile'),
+    'materialize': (cmd_materialize, "Rebuild a delta profile's files ahead of switching to it.", True, 'profile'),
+    'dematerialize': (cmd_dematerialize, "Shrink a delta profile back to its deltas.", True, 'profile'),
+    'prewarm': (cmd_prewarm, "Read a profile's hot files into the OS cache (e.g. right after a switch).",
+                True, 'profile'),
+    'roots': (cmd_roots, "List the storage roots with their free space and profiles.", False, None),
+    'migrate': (cmd_migrate, "Move a profile to another storage root.", True, 'install'),
+    'rebalance': (cmd_rebalance, "Move profiles between storage roots as the placement policy wants.",
+                  False, 'install'),
+    'instances': (cmd_instances, "List the configured instances and their active profiles.", False, None),
+    'fleet-capture': (cmd_fleet_capture, "Store the current install of many instances at once.", True, 'install'),
+    'fleet-switch': (cmd_fleet_switch, "Switch many instances to their profile of this name at once.",
+                     True, 'install'),
+    'export': (cmd_export, "Write a profile to a bundle file, or send it to importers on other machines.",
+               True, 'profile'),
+    'import': (cmd_import, "Add a profile from a bundle file or an exporting machine.", False, 'profile'),
+    'recover': (cmd_recover, "Finish or roll back an interrupted switch or profile move.", False, None),
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="Project Zomboid Version Manager (headless).")
+    parser.add_argument('--config', help="Path to config.json (default: ./config.json).")
+    parser.add_argument('--progress', action='store_true',
+                        help="Write progress snapshots to stderr as JSON lines.")
+    parser.add_argument('--trace', metavar='PATH',
+                        help="Write timing spans to PATH (.jsonl, or Chrome trace format for anything else).")
+    parser.add_argument('--instance', metavar='NAME',
+                        help="Run the command on this instance from the config's 'instances' list.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (_, help_text, takes_profile, _) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        if takes_profile:
+            subparser.add_argument('profile', help="Profile name.")
+        if name == 'capture':
+            subparser.add_argument('--base', metavar='PROFILE',
+                                   help="Store changed large files as deltas over this profile (e.g. the previous build).")
+        if name == 'migrate':
+            subparser.add_argument('root', help="The storage root to move it to (see 'roots').")
+        if name == 'export':
+            subparser.add_argument('dest', help="A bundle file to write, or tcp://HOST:PORT (unix://PATH) "
+                                                "to serve it on.")
+            subparser.add_argument('--user-data', action='store_true', help="Include the profile's saves and settings.")
+            subparser.add_argument('--connections', type=int, default=1,
+                                   help="When serving, how many importers to send it to (default: 1).")
+        if name == 'import':
+            subparser.add_argument('source', help="A bundle file, or tcp://HOST:PORT (unix://PATH) of an export.")
+            subparser.add_argument('--name', dest='profile', help="Store it under this name (default: the exported one).")
+        if name == 'rebalance':
+            subparser.add_argument('--dry-run', action='store_true', help="Only list the moves.")
+        if name in ('instances', 'fleet-capture', 'fleet-switch'):
+            subparser.add_argument('--instances', metavar='A,B,...', help="Only these instances (default: all).")
+            subparser.add_argument('--jobs', type=int, help="How many instances at a time (default: 'fleet_workers', 4).")
+        if name == 'verify':
+            subparser.add_argument('--full', action='store_true',
+                                   help="Hash every file, even ones unchanged since the last check.")
+    return parser
+
+def run_job(manager, args, handler, job_kind):
+    """
+    Runs a long command on the job scheduler, so Ctrl+C cancels it cleanly (partial copies
+    are removed) instead of killing it halfway. Returns (result, error, exit code).
+    """
+    from core.jobs import JobScheduler
+
+    def report(job):
+        if args.progress and job['progress']:
+            print(json.dumps({'progress': job['progress']}), file=sys.stderr)
+
+    def run(tracker):
+        args.tracker = tracker
+        return handler(manager, args)
+
+    scheduler = JobScheduler(workers=1, on_update=report, progress_interval=1.0)
+    job = scheduler.submit(args.command, run, getattr(args, 'profile', None), job_kind == 'install')
+    try:
+        # Wait in short steps: a plain wait can't be interrupted by Ctrl+C on Windows.
+        while scheduler.wait(job.id, timeout=0.5)['state'] in ('queued', 'running'):
+            pass
+    except KeyboardInterrupt:
+        print("Cancelling...", file=sys.stderr)
+        scheduler.cancel(job.id)
+    scheduler.shutdown(cancel=False)
+    job = scheduler.get(job.id)
+    if job['state'] == 'cancelled':
+        return None, job['error'], 130
+    if job['state'] == 'failed':
+        return None, job['error'], 1
+    return job['result'], None, 0
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        from core import trace
+        trace.enable(args.trace)
+    manager = VersionManager(args.config)
+    if args.instance:
+        try:
+            manager = manager.get_instance(args.instance)
+        except ValueError as e:
+            print(json.dumps({'ok': False, 'command': args.command, 'error': str(e)}))
+            return 1
+    handler, job_kind = COMMANDS[args.command][0], COMMANDS[args.command][3]
+    args.tracker = None
+
+    # The manager logs with print(); keep stdout clean for the JSON result.
+    with contextlib.redirect_stdout(sys.stderr):
+        if job_kind:
+            result, error, code = run_job(manager, args, handler, job_kind)
+        else:
+            try:
+                result, error, code = handler(manager, args), None, 0
+            except Exception as e:
+                result, error, code = None, str(e), 1
+    if error is not None:
+        print(json.dumps({'ok': False, 'command': args.command, 'error': error}))
+        return code
+    # A verify that found damage succeeded as a command, but should still fail a script.
+    ok = not isinstance(result, dict) or result.get('ok', True)
+    print(json.dumps({'ok': ok, 'command': args.command, 'result': result}, indent=2))
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# core/archive.py
+
+import os
+import gzip
+import time
+import uuid
+import shutil
+import hashlib
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class ParallelGzipWriter:
+    """
+    A write-only file object that gzip-compresses on several cores, like pigz.
+    Data is cut into blocks that are compressed in parallel and written in order as
+    separate gzip members; any gzip reader (including Python's gzip module) reads
+    concatenated members back as one stream. zlib releases the GIL, so threads are enough.
+    """
+    BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, fileobj, workers=None, level=6):
+        self.fileobj = fileobj
+        self.level = level
+        self.workers = workers or os.cpu_count() or 2
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='gzip')
+        self._pending = deque()
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.BLOCK_SIZE:
+            block = bytes(self._buffer[:self.BLOCK_SIZE])
+            del self._buffer[:self.BLOCK_SIZE]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block):
+        self._pending.append(self._pool.submit(gzip.compress, block, self.level, mtime=0))
+        # Keep a bounded number of blocks in flight so memory use stays flat.
+        while len(self._pending) > self.workers * 2:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def close(self):
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().result())
+        finally:
+            self.abort()
+
+    def abort(self):
+        """Drops whatever wasn't written yet and stops the compression threads. Safe to call after close()."""
+        self._buffer = bytearray()
+        self._pending.clear()
+        self._pool.shutdown(cancel_futures=True)
+
+class _CountingReader:
+    """Wraps a file object and reports how many bytes were read through it."""
+
+    def __init__(self, fileobj, on_read):
+        self.fileobj = fileobj
+        self.on_read = on_read
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.on_read(len(data))
+        return data
+
+def _safe_member_path(root, name):
+    """Resolves an archive member name under 'root', refusing anything that would escape it."""
+    path = os.path.normpath(os.path.join(root, name))
+    if os.path.isabs(name) or not path.startswith(os.path.join(os.path.normpath(root), '')):
+        raise ValueError(f"Unsafe path in archive: {name}")
+    return path
+
+def archive_profile_folders(profile_path, archive_path, folders, progress=None, workers=None):
+    """
+    Streams the given profile sub-folders into a tar.gz at 'archive_path' with parallel
+    compression. Nothing is staged on disk besides the archive itself.
+    Hardlinked files inside the profile are stored once.
+    """
+    def track(tarinfo):
+        if progress and tarinfo.isfile():
+            progress.advance(tarinfo.size, 1)
+        return tarinfo
+
+    tmp_path = archive_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as raw:
+            writer = ParallelGzipWriter(raw, workers)
+            try:
+                with tarfile.open(fileobj=writer, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                    for folder in folders:
+                        folder_path = os.path.join(profile_path, folder)
+                        if os.path.isdir(folder_path):
+                            tar.add(folder_path, arcname=folder, filter=track)
+                writer.close()
+            finally:
+                writer.abort()
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def restore_profile_folders(profile_path, archive_path, store=None, files=None, progress=None):
+    """
+    Unpacks an archive made by archive_profile_folders() back into 'profile_path'.
+    Game files listed in 'files' (the profile's file index) go back through the object
+    store: objects that another profile still has are linked without writing any data.
+    Returns (bytes of archive read, seconds taken).
+    """
+    started = time.perf_counter()
+    read_bytes = [0]
+
+    def on_read(n):
+        read_bytes[0] += n
+        if progress:
+            progress.advance(n)
+
+    files = files or {}
+    with open(archive_path, 'rb') as raw, \
+         gzip.GzipFile(fileobj=_CountingReader(raw, on_read)) as gz, \
+         tarfile.open(fileobj=gz, mode='r|') as tar:
+        for member in tar:
+            dest = _safe_member_path(profile_path, member.name)
+            if member.isdir():
+                os.makedirs(dest, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if member.islnk():
+                target = _safe_member_path(profile_path, member.linkname)
+                try:
+                    os.link(target, dest)
+                except OSError:
+                    shutil.copy2(target, dest)
+            elif member.issym():
+                os.symlink(member.linkname, dest)
+            elif member.isfile():
+                entry = None
+                if store and member.name.startswith('GameFiles/'):
+                    entry = files.get(member.name[len('GameFiles/'):])
+                if entry:
+                    _restore_into_store(tar, member, entry[2], store, dest)
+                else:
+                    with tar.extractfile(member) as fsrc, open(dest, 'wb') as fdst:
+                        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+                    os.utime(dest, (member.mtime, member.mtime))
+    return read_bytes[0], time.perf_counter() - started
+
+def _restore_into_store(tar, member, digest, store, dest):
+    if not store.has(digest):
+        os.makedirs(store.tmp_path, exist_ok=True)
+        tmp_path = os.path.join(store.tmp_path, uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        with tar.extractfile(member) as fsrc, open(tmp_path, 'wb') as fdst:
+            while True:
+                chunk = fsrc.read(1024 * 1024)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                fdst.write(chunk)
+        os.utime(tmp_path, (member.mtime, member.mtime))
+        if hasher.hexdigest() != digest:
+            os.remove(tmp_path)
+            raise ValueError(f"Archived file '{member.name}' is corrupt (hash mismatch).")
+        store.commit(tmp_path, digest)
+    # Objects the store already has are just linked; the stream skips over the data.
+    store.link(digest, dest)
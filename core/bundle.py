@@ -0,0 +1,417 @@
+# core/bundle.py
+
+"""
+Profile bundles: one stream holding a profile's game files, manifest and (optionally)
+user data, for handing a stored build to another machine without Steam. The layout is:
+
+    MAGIC
+    header      one JSON line: the file index, the unique objects and other files it carries
+    records     b'O' + sha256 digest + size, then the object's chunks
+                b'F' + index into the header's 'extra' list, then the file's chunks
+    b'E'        then a JSON line with totals; a stream without it was cut off
+
+Every chunk carries its own BLAKE2b checksum, so damage is caught where it happens, and
+every object is checked against its SHA-256 digest before it enters the store. Game files
+are sent once per unique content, like they are stored. The importer skips objects its
+store already has; over a socket it tells the exporter which ones it needs before any are
+sent, so builds that share most of their files with one already imported travel fast.
+"""
+
+import os
+import re
+import json
+import time
+import struct
+import hashlib
+
+MAGIC = b'PZVMBUNDLE\n'
+BUNDLE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+OBJECT, FILE, END = b'O', b'F', b'E'
+# Longest header line accepted; a file index of a few hundred thousand files fits easily.
+MAX_HEADER = 256 * 1024 * 1024
+# Profile files sent besides the game files. Workshop links, hot sets etc. stay local.
+PROFILE_FILES = ('manifest.acf',)
+
+_DIGEST = re.compile(r'[0-9a-f]{64}')
+
+_CHUNK = struct.Struct('<I16s') # length, BLAKE2b-128 of the data
+_OBJECT = struct.Struct('<32sQ') # raw digest, size
+_FILE = struct.Struct('<I') # index into header['extra']
+
+def _checksum(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            raise ValueError("The bundle ended early; the file or connection was cut off.")
+        data += more
+    return data
+
+def _write_line(out, record):
+    out.write(json.dumps(record).encode('utf-8') + b'\n')
+
+def _read_line(stream):
+    line = stream.readline(MAX_HEADER)
+    if not line.endswith(b'\n'):
+        raise ValueError("The bundle ended early; the file or connection was cut off.")
+    return json.loads(line)
+
+def _safe_path(root, rel):
+    """Resolves a bundle's '/'-separated path under 'root', refusing anything that would escape it."""
+    path = os.path.normpath(os.path.join(root, *rel.split('/')))
+    if os.path.isabs(rel) or not path.startswith(os.path.join(os.path.normpath(root), '')):
+        raise ValueError(f"Unsafe path in bundle: {rel}")
+    return path
+
+def _is_size(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+def _is_plain_path(rel):
+    """True for a relative '/'-separated path without '..', '.', empty or drive parts."""
+    return (isinstance(rel, str) and '\\' not in rel and ':' not in rel
+            and all(part not in ('', '.', '..') for part in rel.split('/')))
+
+def _in_folder(rel, folder):
+    return _is_plain_path(rel) and (rel == folder or rel.startswith(folder + '/'))
+
+def _check_header(header):
+    """
+    Refuses a header that could make an import touch anything but its own new profile: digests
+    double as store paths, and names and paths as paths under the profile. A bundle comes from
+    another machine, so nothing in it is trusted.
+    """
+    def damaged(reason):
+        return ValueError(f"The bundle is damaged or unsafe ({reason}).")
+
+    name = header.get('profile')
+    if not isinstance(name, str) or not name or name.startswith('.') or '/' in name or '\\' in name:
+        raise damaged(f"bad profile name {name!r}")
+    if not (isinstance(header.get('objects'), list) and isinstance(header.get('files'), dict)
+            and isinstance(header.get('dirs'), list) and isinstance(header.get('extra'), list)):
+        raise damaged("incomplete header")
+    sizes = {}
+    for record in header['objects']:
+        if not (isinstance(record, list) and len(record) == 2 and isinstance(record[0], str)
+                and _DIGEST.fullmatch(record[0]) and _is_size(record[1])):
+            raise damaged(f"bad object {record!r}")
+        sizes[record[0]] = record[1]
+    used = set()
+    for rel, entry in header['files'].items():
+        if not (_is_plain_path(rel) and isinstance(entry, list) and len(entry) == 3 and isinstance(entry[1], int)
+                and isinstance(entry[2], str) and sizes.get(entry[2]) == entry[0]):
+            raise damaged(f"game file {rel!r} isn't one of its objects")
+        used.add(entry[2])
+    if used != set(sizes):
+        raise damaged("objects no file is made from")
+    for rel in header['dirs']:
+        if not (_in_folder(rel, 'GameFiles') or _in_folder(rel, 'UserData')):
+            raise damaged(f"bad folder {rel!r}")
+    # Only the manifest and saves: files.json, profile.delta etc. are written by the import itself.
+    for entry in header['extra']:
+        rel = entry.get('path') if isinstance(entry, dict) else None
+        if not ((rel in PROFILE_FILES or (_in_folder(rel, 'UserData') and rel != 'UserData'))
+                and _is_size(entry.get('size')) and isinstance(entry.get('mtime_ns'), int)):
+            raise damaged(f"bad file {rel!r}")
+
+def _list_folder(profile_path, folder):
+    """Returns (dirs, files) under a profile folder as '/'-separated paths relative to the profile."""
+    dirs, files = [], []
+    root = os.path.join(profile_path, folder)
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, profile_path).replace(os.sep, '/')
+        dirs.append(rel_dir)
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.isfile(path) and not os.path.islink(path):
+                files.append((f'{rel_dir}/{filename}', path))
+    return dirs, files
+
+def _send_file(out, path, size, progress):
+    """Writes 'size' bytes of a file as checksummed chunks."""
+    with open(path, 'rb') as f:
+        remaining = size
+        while remaining:
+            data = f.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                raise ValueError(f"'{path}' got shorter while it was being exported.")
+            out.write(_CHUNK.pack(len(data), _checksum(data)))
+            out.write(data)
+            remaining -= len(data)
+            if progress:
+                progress.advance(len(data))
+
+def write_bundle(profile_path, out, files, include_user_data=False, progress=None, peer=None):
+    """
+    Streams a profile into a bundle on the binary stream 'out'. 'files' is the profile's
+    file index; the game files are read from its GameFiles folder. With 'peer' (the reading
+    side of a connection to the importer), the importer first answers the header with the
+    objects it is missing, and only those are sent. Returns {'objects', 'files', 'bytes'} sent.
+    """
+    game_files = os.path.join(profile_path, 'GameFiles')
+    objects = {}
+    for rel, entry in files.items():
+        objects.setdefault(entry[2], (entry[0], rel))
+    dirs, _ = _list_folder(profile_path, 'GameFiles')
+    extra = [(name, os.path.join(profile_path, name)) for name in PROFILE_FILES]
+    if include_user_data and os.path.isdir(os.path.join(profile_path, 'UserData')):
+        user_dirs, user_files = _list_folder(profile_path, 'UserData')
+        dirs += user_dirs
+        extra += user_files
+    extra_entries = []
+    for rel, path in extra:
+        st = os.stat(path)
+        extra_entries.append({'path': rel, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+
+    header = {
+        'version': BUNDLE_VERSION,
+        'profile': os.path.basename(os.path.normpath(profile_path)),
+        'created_at': time.time(),
+        'negotiate': peer is not None,
+        'files': files,
+        'dirs': dirs,
+        'objects': [[digest, size] for digest, (size, _) in objects.items()],
+        'extra': extra_entries,
+    }
+    out.write(MAGIC)
+    _write_line(out, header)
+    out.flush()
+
+    wanted = set(objects)
+    if peer is not None:
+        answer = peer.readline(MAX_HEADER)
+        if not answer.endswith(b'\n'):
+            raise ValueError("The importer hung up before asking for any files (it may already have this profile).")
+        wanted &= set(json.loads(answer)['want'])
+    if progress:
+        total = sum(objects[digest][0] for digest in wanted) + sum(entry['size'] for entry in extra_entries)
+        progress.start_phase("Exporting", total, len(wanted) + len(extra_entries))
+
+    sent_bytes = 0
+    for digest, (size, rel) in objects.items():
+        if digest not in wanted:
+            continue
+        out.write(OBJECT + _OBJECT.pack(bytes.fromhex(digest), size))
+        _send_file(out, os.path.join(game_files, *rel.split('/')), size, progress)
+        sent_bytes += size
+        if progress:
+            progress.advance(0, 1)
+    for index, ((_, path), entry) in enumerate(zip(extra, extra_entries)):
+        out.write(FILE + _FILE.pack(index))
+        _send_file(out, path, entry['size'], progress)
+        sent_bytes += entry['size']
+        if progress:
+            progress.advance(0, 1)
+    out.write(END)
+    result = {'objects': len(wanted), 'files': len(extra_entries), 'bytes': sent_bytes}
+    _write_line(out, result)
+    out.flush()
+    if progress:
+        progress.finish_phase()
+    return result
+
+class BundleReader:
+    """
+    Reads a bundle written by write_bundle() into a profile folder: read_header() first, so
+    the caller can decide on a name and place, then read_into(). 'reply' is the writing side
+    of the connection for bundles that ask which objects to send (see write_bundle's 'peer').
+    """
+
+    def __init__(self, stream, reply=None):
+        self.stream = stream
+        self.reply = reply
+        self.header = None
+
+    def read_header(self):
+        if _read_exact(self.stream, len(MAGIC)) != MAGIC:
+            raise ValueError("Not a profile bundle.")
+        self.header = _read_line(self.stream)
+        if not isinstance(self.header, dict):
+            raise ValueError("Not a profile bundle.")
+        if self.header.get('version', 0) > BUNDLE_VERSION:
+            raise ValueError("The bundle was written by a newer version of the manager.")
+        _check_header(self.header)
+        return self.header
+
+    def missing(self, store):
+        """The (digest, size) pairs of the bundle's objects that 'store' doesn't have."""
+        return [(digest, size) for digest, size in self.header['objects'] if not store.has(digest)]
+
+    def read_into(self, profile_path, store, progress=None):
+        """
+        Receives the objects 'store' is missing and the other files, then builds the profile
+        at 'profile_path' the way a capture leaves it: GameFiles linked from the store, a file
+        index, manifest.acf and UserData. Returns {'objects', 'skipped', 'bytes', 'files'}.
+        """
+        header = self.header
+        sizes = dict((digest, size) for digest, size in header['objects'])
+        missing = self.missing(store)
+        if header.get('negotiate'):
+            if self.reply is None:
+                raise ValueError("The bundle expects an answer, but it isn't read from a connection.")
+            _write_line(self.reply, {'want': [digest for digest, _ in missing]})
+            self.reply.flush()
+        if progress:
+            total = sum(size for _, size in missing) + sum(entry['size'] for entry in header['extra'])
+            progress.start_phase("Importing", total, len(missing) + len(header['extra']))
+
+        for rel in header['dirs']:
+            os.makedirs(_safe_path(profile_path, rel), exist_ok=True)
+        # Objects keep the mtime of the first file made from them, like an ingested copy would.
+        mtimes = {}
+        for entry in header['files'].values():
+            mtimes.setdefault(entry[2], entry[1])
+
+        received, received_bytes = 0, 0
+        os.makedirs(store.tmp_path, exist_ok=True)
+        while True:
+            kind = _read_exact(self.stream, 1)
+            if kind == END:
+                _read_line(self.stream)
+                break
+            if kind == OBJECT:
+                raw, size = _OBJECT.unpack(_read_exact(self.stream, _OBJECT.size))
+                digest = raw.hex()
+                if sizes.get(digest) != size:
+                    raise ValueError(f"The bundle has an object its header doesn't list: {digest}")
+                if store.has(digest):
+                    self._receive(size, None, progress)
+                    continue
+                self._receive_object(store, digest, size, mtimes[digest], progress)
+                received += 1
+                received_bytes += size
+            elif kind == FILE:
+                index, = _FILE.unpack(_read_exact(self.stream, _FILE.size))
+                entry = header['extra'][index]
+                self._receive_file(_safe_path(profile_path, entry['path']), entry, store.tmp_path, progress)
+                received_bytes += entry['size']
+            else:
+                raise ValueError("The bundle is damaged (unknown record).")
+            if progress:
+                progress.advance(0, 1)
+
+        absent = [digest for digest in sizes if not store.has(digest)]
+        if absent:
+            raise ValueError(f"The bundle is missing {len(absent)} objects, e.g. {absent[0]}.")
+        from core.store import write_file_index
+        game_files = os.path.join(profile_path, 'GameFiles')
+        for rel, entry in header['files'].items():
+            store.link(entry[2], _safe_path(game_files, rel))
+        write_file_index(profile_path, header['files'])
+        if progress:
+            progress.finish_phase()
+        return {'objects': received, 'skipped': len(sizes) - received, 'bytes': received_bytes,
+                'files': len(header['files'])}
+
+    def _receive(self, size, sink, progress):
+        """Reads one record's chunks, checking each and handing it to sink() (None: discard)."""
+        remaining = size
+        while remaining:
+            length, checksum = _CHUNK.unpack(_read_exact(self.stream, _CHUNK.size))
+            if not 0 < length <= remaining:
+                raise ValueError("The bundle is damaged (bad chunk length).")
+            data = _read_exact(self.stream, length)
+            if sink is not None:
+                if _checksum(data) != checksum:
+                    raise ValueError("The bundle is damaged (a chunk doesn't match its checksum).")
+                sink(data)
+                if progress:
+                    progress.advance(length)
+            remaining -= length
+
+    def _receive_object(self, store, digest, size, mtime_ns, progress):
+        tmp_path = os.path.join(store.tmp_path, os.urandom(16).hex())
+        hasher = hashlib.sha256()
+        try:
+            with open(tmp_path, 'wb') as f:
+                def sink(data):
+                    hasher.update(data)
+                    f.write(data)
+                self._receive(size, sink, progress)
+            if hasher.hexdigest() != digest:
+                raise ValueError(f"Object {digest} in the bundle doesn't match its digest.")
+            os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+            store.commit(tmp_path, digest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _receive_file(self, path, entry, tmp_dir, progress):
+        tmp_path = os.path.join(tmp_dir, os.urandom(16).hex())
+        try:
+            with open(tmp_path, 'wb') as f:
+                self._receive(entry['size'], f.write, progress)
+            os.utime(tmp_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def is_address(target):
+    """True for the socket addresses bundles can be served on or read from, e.g. 'tcp://host:7890'."""
+    return target.startswith(('tcp://', 'unix://'))
+
+def _socket_for(address):
+    """Returns (socket, address to bind or connect to) for 'tcp://host:port' or 'unix:///path'."""
+    import socket
+    if address.startswith('unix://'):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM), address[len('unix://'):]
+    host, _, port = address[len('tcp://'):].rpartition(':')
+    if not port.isdigit():
+        raise ValueError(f"'{address}' has no port number.")
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM), (host.strip('[]') or '0.0.0.0', int(port))
+
+def connect(address):
+    """Connects to a bundle being served at 'address'. Returns the socket."""
+    sock, target = _socket_for(address)
+    try:
+        sock.connect(target)
+    except OSError as e:
+        sock.close()
+        raise ValueError(f"Could not connect to {address}: {e}")
+    return sock
+
+def serve(address, handle, connections=1, progress=None):
+    """
+    Listens on 'address' and calls handle(sock) for each of the next 'connections' clients,
+    one after another. Cancelling 'progress' stops the wait. Returns one dict per client:
+    handle()'s result, or {'error': ...} if that client failed (e.g. it hung up because it
+    already had the profile); the others are still served.
+    """
+    import socket
+    sock, target = _socket_for(address)
+    if isinstance(target, str) and os.path.exists(target):
+        os.remove(target) # A socket file left over from an earlier run.
+    results = []
+    try:
+        if not isinstance(target, str):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(target)
+        sock.listen(connections)
+        sock.settimeout(0.5)
+        print(f"Serving the bundle on {address} to {connections} importer(s)...")
+        while len(results) < connections:
+            if progress:
+                progress.check_cancelled()
+            try:
+                conn, peer = sock.accept()
+            except socket.timeout:
+                continue
+            peer = peer or 'a local importer'
+            with conn:
+                conn.settimeout(None)
+                print(f"Sending to {peer}...")
+                try:
+                    results.append(handle(conn))
+                except (OSError, ValueError) as e:
+                    print(f"Sending to {peer} failed: {e}")
+                    results.append({'error': str(e) or type(e).__name__})
+    finally:
+        sock.close()
+        if isinstance(target, str) and os.path.exists(target):
+            os.remove(target)
+    return results
@@ -0,0 +1,248 @@
+# core/delta.py
+
+"""
+Binary deltas between two versions of a file, the way rsync finds them: the old file is
+cut into blocks, each with a cheap rolling checksum (adler32) and a strong hash. The new
+file is searched for those blocks, and whatever doesn't match any block is kept as literal
+data. A patch that changes a few KB inside a 200 MB texture pack then costs a few KB to
+store, instead of another 200 MB.
+
+Where the new file still lines up with a base block (unchanged runs, edits in place),
+checking it is one zlib.adler32() call over the whole block. Only content that moved needs
+the checksum rolled forward a byte at a time, which runs in Python. So a search that finds
+nothing within a block's worth of offsets skips ahead twice as far each time before rolling
+again, and a match found after skipping is extended backwards over whatever it skipped.
+Each file gets at most ROLL_LIMIT bytes of rolling; past it, only block-aligned spots are
+checked, and a file that shifted all over ends up over its literal budget and is stored
+in full instead.
+
+A delta file is a header line followed by operations:
+    b'C' <offset u64> <length u64>   copy bytes from the base file
+    b'L' <length u64> <data>         literal bytes
+"""
+
+import os
+import json
+import zlib
+import mmap
+import struct
+
+MAGIC = b'PZVMDELTA1\n'
+PROFILE_DELTA_FILE = 'delta.json'
+ADLER_MOD = 65521
+MIN_BLOCK = 2 * 1024
+MAX_BLOCK = 128 * 1024
+COPY_CHUNK = 4 * 1024 * 1024
+# Spots probed before a full search to see whether a file is worth delta-encoding at all.
+SAMPLES = 16
+# Offsets per file the checksum is rolled over byte by byte (about a second of Python).
+ROLL_LIMIT = 2 * 1024 * 1024
+_COPY = struct.Struct('<QQ')
+_LITERAL = struct.Struct('<Q')
+
+def block_size_for(size):
+    """rsync's rule of thumb, about sqrt(size): balances the block table against literal overhead."""
+    return max(MIN_BLOCK, min(MAX_BLOCK, int(size ** 0.5) // 1024 * 1024))
+
+def _map(f):
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def make_signature(base, block):
+    """Maps the adler32 of every full block of 'base' to [(strong hash, offset), ...]."""
+    import hashlib # Deferred like in core.store: only captures need it.
+    signature = {}
+    for offset in range(0, len(base) - block + 1, block):
+        chunk = base[offset:offset + block]
+        signature.setdefault(zlib.adler32(chunk), []).append(
+            (hashlib.blake2b(chunk, digest_size=16).digest(), offset))
+    return signature
+
+def _match_at(signature, data, pos, block):
+    """Returns the base offset of a block equal to data[pos:pos + block], or None."""
+    import hashlib
+    candidates = signature.get(zlib.adler32(data[pos:pos + block]))
+    if candidates:
+        strong = hashlib.blake2b(data[pos:pos + block], digest_size=16).digest()
+        for candidate, offset in candidates:
+            if candidate == strong:
+                return offset
+    return None
+
+def _find_block(signature, data, pos, stop, block):
+    """
+    Looks for a block of the base starting anywhere in data[pos:stop + 1], rolling the
+    checksum forward one byte at a time. Returns (position, base offset) or None.
+    """
+    import hashlib
+    weak = zlib.adler32(data[pos:pos + block])
+    while True:
+        candidates = signature.get(weak)
+        if candidates:
+            strong = hashlib.blake2b(data[pos:pos + block], digest_size=16).digest()
+            for candidate, offset in candidates:
+                if candidate == strong:
+                    return pos, offset
+        if pos >= stop:
+            return None
+        out, incoming = data[pos], data[pos + block]
+        a = ((weak & 0xffff) - out + incoming) % ADLER_MOD
+        b = ((weak >> 16) - block * out + a - 1) % ADLER_MOD
+        weak = (b << 16) | a
+        pos += 1
+
+def _mostly_unmatched(signature, data, block, max_literal):
+    """
+    Probes a few spots spread over 'data' for base blocks nearby. In a file that shares
+    most of its content with the base, almost every spot finds one within a block's
+    length, so few hits means the full (byte by byte) search isn't worth running.
+    """
+    end = len(data)
+    hits = 0
+    for i in range(SAMPLES):
+        start = end * i // SAMPLES
+        if _find_block(signature, data, start, min(start + block, end - block), block):
+            hits += 1
+    return hits < SAMPLES * (1 - max_literal / end) / 2
+
+def compute_delta(base, data, block=None, max_literal=None):
+    """
+    Returns the operations that rebuild 'data' from 'base' (both bytes-like, e.g. mmaps):
+    a list of ('copy', offset, length) and ('literal', start, end) tuples, where the
+    literal range refers to 'data'. Returns None if more than 'max_literal' bytes would
+    have to be stored literally, since then the delta isn't worth it.
+    """
+    block = block or block_size_for(len(data))
+    signature = make_signature(base, block)
+    end = len(data)
+    if max_literal is not None and end >= SAMPLES * block * 4 \
+            and _mostly_unmatched(signature, data, block, max_literal):
+        return None
+    ops = []
+    literal_total = 0
+    rolled = skip = 0
+    pos = 0 # Everything before 'pos' is covered by 'ops'.
+    match = 0 # Where to look next; nothing in data[pos:match] starts a base block.
+    while match + block <= end:
+        stop = end - block
+        if max_literal is not None:
+            stop = min(stop, pos + max_literal - literal_total)
+            if stop < match:
+                return None # Ran out of literal budget before the next match.
+        offset = _match_at(signature, data, match, block)
+        if offset is None and match + block <= stop:
+            # An edit in place leaves the next block where it was.
+            offset = _match_at(signature, data, match + block, block)
+            if offset is not None:
+                match += block
+        if offset is None:
+            if rolled >= ROLL_LIMIT:
+                match += block
+                continue
+            # Rolling over one block's worth of offsets meets every block boundary of moved content.
+            window = min(stop, match + block, match + ROLL_LIMIT - rolled)
+            found = _find_block(signature, data, match, window, block)
+            rolled += (found[0] if found else window) - match
+            if found is None:
+                # Never past the last block-long stretch the literal budget still reaches.
+                match = max(window + 1, min(window + 1 + skip, stop - block))
+                skip = skip * 2 or block
+                continue
+            match, offset = found
+        if skip:
+            # The skip may have jumped over blocks that already lined up again.
+            while match - block >= pos and offset >= block \
+                    and data[match - block:match] == base[offset - block:offset]:
+                match -= block
+                offset -= block
+            skip = 0
+        if pos < match:
+            ops.append(('literal', pos, match))
+            literal_total += match - pos
+        if ops and ops[-1][0] == 'copy' and ops[-1][1] + ops[-1][2] == offset:
+            ops[-1] = ('copy', ops[-1][1], ops[-1][2] + block)
+        else:
+            ops.append(('copy', offset, block))
+        pos = match = match + block
+    if pos < end:
+        ops.append(('literal', pos, end))
+        literal_total += end - pos
+        if max_literal is not None and literal_total > max_literal:
+            return None
+    return ops
+
+def write_delta(base_path, src_path, delta_path, base_digest, max_ratio=0.5):
+    """
+    Writes a delta that rebuilds 'src_path' from 'base_path' (whose contents hash to
+    'base_digest'). Returns the delta's size, or None (writing nothing) if it would be
+    bigger than 'max_ratio' of the file.
+    """
+    with open(base_path, 'rb') as fbase, open(src_path, 'rb') as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        if not size or not os.fstat(fbase.fileno()).st_size:
+            return None
+        with _map(fbase) as base, _map(fsrc) as data:
+            ops = compute_delta(base, data, max_literal=int(size * max_ratio))
+            if ops is None:
+                return None
+            with open(delta_path, 'wb') as out:
+                out.write(MAGIC)
+                out.write(json.dumps({'base': base_digest, 'size': size}).encode() + b'\n')
+                for op in ops:
+                    if op[0] == 'copy':
+                        out.write(b'C' + _COPY.pack(op[1], op[2]))
+                    else:
+                        out.write(b'L' + _LITERAL.pack(op[2] - op[1]))
+                        out.write(data[op[1]:op[2]])
+                return out.tell()
+
+def read_delta_header(delta_path):
+    """Returns {'base': base digest, 'size': size of the rebuilt file}."""
+    with open(delta_path, 'rb') as f:
+        if f.readline() != MAGIC:
+            raise ValueError(f"'{delta_path}' is not a delta file.")
+        return json.loads(f.readline())
+
+def apply_delta(delta_path, base_path, out_path):
+    """Rebuilds the file a delta was made from into 'out_path'."""
+    with open(delta_path, 'rb') as fdelta, open(base_path, 'rb') as fbase, open(out_path, 'wb') as out:
+        if fdelta.readline() != MAGIC:
+            raise ValueError(f"'{delta_path}' is not a delta file.")
+        fdelta.readline() # The header; the caller already resolved the base from it.
+        while True:
+            kind = fdelta.read(1)
+            if not kind:
+                break
+            if kind == b'C':
+                offset, length = _COPY.unpack(fdelta.read(_COPY.size))
+                fbase.seek(offset)
+                _copy_bytes(fbase, out, length)
+            elif kind == b'L':
+                length, = _LITERAL.unpack(fdelta.read(_LITERAL.size))
+                _copy_bytes(fdelta, out, length)
+            else:
+                raise ValueError(f"'{delta_path}' is corrupt.")
+
+def _copy_bytes(src, dst, length):
+    while length:
+        chunk = src.read(min(COPY_CHUNK, length))
+        if not chunk:
+            raise ValueError("Delta refers to data past the end of its base file.")
+        dst.write(chunk)
+        length -= len(chunk)
+
+def read_profile_delta(profile_path):
+    """
+    Returns a delta profile's record, {'base': profile, 'files': {rel: digest}, 'materialized': bool},
+    or None for a profile that was stored in full. 'files' are the ones kept only as deltas.
+    """
+    try:
+        with open(os.path.join(profile_path, PROFILE_DELTA_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_profile_delta(profile_path, record):
+    path = os.path.join(profile_path, PROFILE_DELTA_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=4)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,132 @@
+# core/instances.py
+
+"""
+Named instances: several installs of the game or of its dedicated server (app 380870) on
+one host, each with its own steamapps folder and user folder (a server's -cachedir),
+listed in the config:
+
+    "instances": [
+        {"name": "pvp-1", "steamapps_path": "/srv/pz/pvp-1/steamapps",
+         "zomboid_user_path": "/srv/pz/pvp-1/Zomboid"},
+        {"name": "coop", "app_id": "108600", ...}
+    ]
+
+Every instance gets a VersionManager of its own (app_id defaults to the dedicated server).
+Its profiles are kept in '<manager folder>/.instances/<name>' and its game files go into
+the manager folder's object store, so ten servers on the same build store it only once.
+An instance given a 'manager_path' of its own keeps its own object store instead.
+
+A Fleet runs a capture or a switch on many instances at once, e.g. rolling every server
+back to B41 with one command.
+"""
+
+import os
+import time
+
+from core import trace
+from core.progress import OperationCancelled
+
+INSTANCES_DIR = '.instances'
+# Keys that describe one particular install, so an instance never takes them from the main config.
+INSTANCE_KEYS = ('app_id', 'steamapps_path', 'zomboid_user_path', 'manager_path', 'storage_roots',
+                 'placement_policy', 'instances')
+
+def make_instance_manager(parent, entry):
+    """Builds the VersionManager for one 'instances' entry of the 'parent' manager's config."""
+    for key in ('name', 'steamapps_path', 'zomboid_user_path'):
+        if not entry.get(key):
+            raise ValueError(f"Instance '{entry.get('name', '?')}' has no '{key}' in the config.")
+    # Tuning keys (copy_workers, verify_before_switch, ...) apply to every instance.
+    config = {key: value for key, value in parent.config.items() if key not in INSTANCE_KEYS}
+    config['app_id'] = parent.DEDICATED_SERVER_APP_ID
+    config.update(entry)
+    shares_store = not entry.get('manager_path')
+    if shares_store:
+        config['manager_path'] = os.path.join(parent.manager_path, INSTANCES_DIR, entry['name'])
+    manager = type(parent)(parent.config_file, config)
+    if shares_store:
+        manager.store_owner = parent
+    return manager
+
+class Fleet:
+    """
+    Runs one operation on many instances at once, at most 'workers' at a time ('fleet_workers'
+    in the config, 4 by default). One instance failing doesn't stop the others: every call
+    returns {'ok': all succeeded, 'instances': [...]} with one entry per instance, in the
+    order asked for: {'instance', 'ok', 'result' or 'error', 'seconds'}.
+    """
+
+    def __init__(self, manager, workers=None):
+        self.manager = manager
+        self.workers = workers or manager.config.get('fleet_workers', 4)
+
+    def select(self, names=None):
+        """The instance managers for 'names' (all instances if None), by name."""
+        instances = self.manager.get_instances()
+        if not names:
+            return instances
+        unknown = [name for name in names if name not in instances]
+        if unknown:
+            raise ValueError(f"No instance named {', '.join(unknown)} in the config.")
+        return {name: instances[name] for name in names}
+
+    def status(self, names=None):
+        """The active profile and stored profiles of every instance."""
+        return [{'instance': name, 'app_id': manager.app_id, 'active_profile': manager.get_active_profile() or None,
+                 'profiles': manager.get_stored_versions()}
+                for name, manager in self.select(names).items()]
+
+    @trace.traced('fleet.capture', 'profile_name')
+    def capture(self, profile_name, names=None, progress=None):
+        """Stores each instance's current install as its profile 'profile_name'."""
+        return self.run("Capturing", lambda manager, tracker: manager.capture_current_version(
+            profile_name, progress=tracker), names, progress)
+
+    @trace.traced('fleet.switch', 'profile_name')
+    def switch(self, profile_name, names=None, progress=None):
+        """Switches each instance to its profile 'profile_name'."""
+        def switch_one(manager, tracker):
+            manager.switch_to_version(profile_name, tracker)
+            return {'active_profile': profile_name}
+        return self.run("Switching", switch_one, names, progress)
+
+    def run(self, verb, func, names=None, progress=None):
+        """
+        Calls func(instance manager, tracker) for every instance. Each call gets a tracker of its
+        own, cancelled along with 'progress'; 'progress' itself counts finished instances.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        instances = self.select(names)
+        if progress:
+            progress.start_phase(f"{verb} {len(instances)} instances", 0, len(instances))
+
+        def run_one(name, manager):
+            started = time.perf_counter()
+            entry = {'instance': name, 'ok': False}
+            with trace.span('fleet.instance', instance=name) as span:
+                try:
+                    if progress:
+                        progress.check_cancelled()
+                    entry['result'] = func(manager, progress.child() if progress else None)
+                    entry['ok'] = True
+                except OperationCancelled:
+                    entry['error'] = "Cancelled."
+                except Exception as e:
+                    entry['error'] = str(e)
+                span.set(ok=entry['ok'])
+            entry['seconds'] = time.perf_counter() - started
+            print(f"[{name}] {verb}: {'done' if entry['ok'] else entry['error']} ({entry['seconds']:.2f}s)")
+            if progress and not progress.cancelled:
+                try:
+                    progress.advance(0, 1)
+                except OperationCancelled:
+                    pass # Cancelled just now; the instances still running report it themselves.
+            return entry
+
+        with ThreadPoolExecutor(max(1, min(self.workers, len(instances) or 1)),
+                                thread_name_prefix='instance') as pool:
+            futures = [pool.submit(run_one, name, manager) for name, manager in instances.items()]
+            results = [future.result() for future in futures]
+        if progress:
+            progress.finish_phase()
+        return {'ok': all(entry['ok'] for entry in results), 'instances': results}
@@ -0,0 +1,200 @@
+# core/jobs.py
+
+import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.progress import ProgressTracker, OperationCancelled
+
+# Lock name for jobs that change the live game install, user folder or manifest.
+INSTALL = 'install'
+# Lock name for jobs that add to the shared object and Workshop stores (their new files
+# aren't listed by any profile yet) and for jobs that collect the stores' garbage.
+STORE = 'store'
+
+class Job:
+    """One queued or running operation. Read its state through snapshot()."""
+
+    def __init__(self, job_id, kind, func, profile, locks, description):
+        self.id = job_id
+        self.kind = kind
+        self.func = func
+        self.profile = profile
+        self.locks = locks
+        self.description = description
+        self.state = 'queued'
+        self.result = None
+        self.error = None
+        self.tracker = None
+        self.progress = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def snapshot(self):
+        """A plain dict with the job's state and latest progress, safe to hand to another thread."""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'profile': self.profile,
+            'description': self.description,
+            'state': self.state,
+            'progress': self.progress if self.state == 'running' else None,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+class JobScheduler:
+    """
+    Runs long operations (capture, switch, archive, verify, ...) on a small worker pool.
+    Every job holds a set of locks while it runs: its profile, plus the live install for
+    jobs that touch it. Jobs start in the order they were submitted as soon as their locks
+    are free, so two operations on the same profile (or two switches) never overlap while
+    unrelated ones run side by side. A job never overtakes an older queued job it shares a
+    lock with, so e.g. a queued switch runs before an archive of its profile queued later.
+    'on_update' is called with a job snapshot whenever a job changes state or reports
+    progress; it runs on a worker thread, so GUIs should only hand it off.
+    """
+
+    def __init__(self, workers=2, on_update=None, progress_interval=0.25):
+        self.workers = workers
+        self.on_update = on_update
+        self.progress_interval = progress_interval
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._queue = []
+        self._held = set()
+        self._running = 0
+
+    def submit(self, kind, func, profile=None, uses_install=False, description=None, locks=()):
+        """
+        Queues func(tracker) as a job and returns it. 'func' should report through the
+        ProgressTracker it is given, which also raises OperationCancelled once cancelled.
+        Its return value becomes the job's result. 'locks' are extra lock names to hold,
+        e.g. for a background copy that must not run twice but shouldn't block its profile.
+        """
+        locks = set(locks)
+        if profile:
+            locks.add(f'profile:{profile}')
+        if uses_install:
+            locks.add(INSTALL)
+        with self._lock:
+            job = Job(next(self._ids), kind, func, profile, locks, description or kind)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id):
+        """Cancels a job: a queued job never starts, a running one stops at its next progress report."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            if job.state == 'queued':
+                self._queue.remove(job)
+                self._finish(job, 'cancelled', error="Cancelled before it started.")
+            else:
+                job.tracker.cancel()
+        self._notify(job)
+        return True
+
+    def cancel_all(self):
+        for job in self.active_jobs():
+            self.cancel(job['id'])
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.snapshot() if job else None
+
+    def jobs(self):
+        """Snapshots of every job submitted so far, oldest first."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.snapshot() for job in jobs]
+
+    def active_jobs(self):
+        return [job for job in self.jobs() if job['state'] in ('queued', 'running')]
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until the job has finished (or 'timeout' passed). Returns its snapshot."""
+        job = self._jobs[job_id]
+        job._done.wait(timeout)
+        return job.snapshot()
+
+    def forget_finished(self):
+        """Drops finished jobs from the job list."""
+        with self._lock:
+            self._jobs = {job_id: job for job_id, job in self._jobs.items() if not job.finished}
+
+    def shutdown(self, cancel=True):
+        """Cancels (optionally) everything and waits for running jobs to clean up and stop."""
+        if cancel:
+            self.cancel_all()
+        self._pool.shutdown(wait=True)
+
+    def _dispatch(self):
+        """
+        Starts every queued job whose locks are free, oldest first, up to the worker count.
+        Locks an older queued job still waits for count as taken for the jobs behind it.
+        """
+        with self._lock:
+            waiting = set()
+            for job in list(self._queue):
+                if self._running >= self.workers:
+                    break
+                if job.locks & (self._held | waiting):
+                    waiting |= job.locks
+                    continue
+                self._queue.remove(job)
+                self._held |= job.locks
+                self._running += 1
+                job.state = 'running'
+                job.started_at = time.time()
+                job.tracker = ProgressTracker(interval=self.progress_interval)
+                # Hooked up after construction so its first report doesn't run under our lock.
+                job.tracker.callback = lambda info, job=job: self._on_progress(job, info)
+                self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        self._notify(job)
+        state, result, error = 'done', None, None
+        try:
+            result = job.func(job.tracker)
+        except OperationCancelled:
+            state, error = 'cancelled', "Cancelled."
+        except Exception as e:
+            state, error = 'failed', str(e)
+        with self._lock:
+            job.result = result
+            self._held -= job.locks
+            self._running -= 1
+            self._finish(job, state, error)
+        self._notify(job)
+        self._dispatch()
+
+    def _finish(self, job, state, error=None):
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        job._done.set()
+
+    def _on_progress(self, job, info):
+        job.progress = info
+        self._notify(job)
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job.snapshot())
@@ -1,75 +1,322 @@
 # core/manager.py
 
 import os
-import platform
 import shutil
-import subprocess
 import json
-import vdf # For parsing Steam's appmanifest
+import time
+import itertools
+
+# Only cheap modules are imported up front so the CLI starts fast. Heavier or
+# platform-specific ones (thread pools, tarfile, platform, subprocess) are imported
+# by the methods that need them.
+from core import trace
+from core.delta import PROFILE_DELTA_FILE, read_profile_delta, write_profile_delta
+from core.progress import OperationCancelled
+from core.profiles import ProfileIndex, read_appstate, read_manifest_info
+from core.store import ObjectStore, FileJournal, FILE_INDEX, GC_MIN_AGE, read_file_index, write_file_index
+from core.workshop import WorkshopStore, read_workshop_items, read_profile_workshop, write_profile_workshop
 
 class VersionManager:
     CONFIG_FILE = 'config.json'
     PZ_APP_ID = '108600'
+    DEDICATED_SERVER_APP_ID = '380870'
+    # Folder under steamapps/common for each app the manager knows.
+    APP_INSTALL_DIRS = {PZ_APP_ID: 'ProjectZomboid', DEDICATED_SERVER_APP_ID: 'Project Zomboid Dedicated Server'}
     MANIFEST_FILE = f'appmanifest_{PZ_APP_ID}.acf'
+    # Workshop mods belong to the game, so servers keep them under the game's app id too.
+    WORKSHOP_MANIFEST_FILE = f'appworkshop_{PZ_APP_ID}.acf'
+    SWITCH_JOURNAL = '.switch_journal.json'
+    STAGING_SUFFIX = '.pzvm-new'
+    QUARANTINE_SUFFIX = '.pzvm-quarantine'
+    # Numbers quarantined folders, so two set aside in the same second get different names.
+    _quarantine_ids = itertools.count(1)
+    ARCHIVE_FILE = 'archive.tar.gz'
+    RESTORING_DIR = '.restoring'
+    # Written into a profile staged on another storage root; old copies wait in MIGRATED_DIR to be deleted.
+    MIGRATION_FILE = 'migration.json'
+    MIGRATED_DIR = '.migrated'
+    # Kept while a migration swaps a profile between roots, so recover_interrupted_migrations() can finish it.
+    MIGRATION_JOURNAL = '.migration_journal.json'
+    # Where an imported bundle is put together before it's renamed into place as a profile.
+    IMPORTING_DIR = '.importing'
+    # Smaller changed files are stored whole even in delta captures; their deltas wouldn't save much.
+    DELTA_MIN_SIZE = 256 * 1024
 
-    def __init__(self):
-        self.config = self.load_config()
+    def __init__(self, config_file=None, config=None):
+        self.config_file = config_file or self.CONFIG_FILE
+        self.config = config if config is not None else self.load_config()
+        # The Steam app whose install this manager swaps: the game, or the dedicated server.
+        self.app_id = str(self.config.get('app_id', self.PZ_APP_ID))
+        self.manifest_file = f'appmanifest_{self.app_id}.acf'
         self.steamapps_path = self.config.get('steamapps_path', '')
         self.manager_path = self.config.get('manager_path', '')
         self.zomboid_user_path = self.config.get('zomboid_user_path', '')
+        # Named installs (e.g. a host's dedicated servers), each managed on its own (see core/instances.py).
+        self.instances = self.config.get('instances', [])
+        # The manager whose object store an instance shares, and with it garbage collection.
+        self.store_owner = None
+        # Number of copy threads; 0 lets the copy engine pick based on the CPU count.
+        self.copy_workers = self.config.get('copy_workers', 0)
+        # Hash-check a profile against its file index before switching to it (opt-in, see verify_profile).
+        self.verify_before_switch = self.config.get('verify_before_switch', False)
+        # Capture Workshop mods into the shared workshop store and link them in on switch.
+        self.manage_workshop = self.config.get('manage_workshop', True)
+        # Pull the new version's hot files into the page cache after a switch, and learn which
+        # files those are from the launches that follow (see core/prewarm.py).
+        self.prewarm_after_switch = self.config.get('prewarm_after_switch', False)
+        # More folders (on other drives) to keep profiles in, and how to pick one (see core/storage.py).
+        self.storage_roots = self.config.get('storage_roots', [])
+        self.placement_policy = self.config.get('placement_policy', 'most_free')
+        # Take the write permission off stored objects (None: everywhere but Windows, see ObjectStore).
+        self.read_only_objects = self.config.get('read_only_objects')
+        # Write timing spans of every operation to this file (see core/trace.py); PZVM_TRACE works too.
+        trace_file = self.config.get('trace_file') or os.environ.get('PZVM_TRACE')
+        if trace_file and not trace.enabled():
+            trace.enable(trace_file)
+        self._profile_index = None
+        self._version_name_cache = (None, None)
+        self._prewarmer = None
+        self._launch_recorder = None
 
     def load_config(self):
         """Loads configuration from a JSON file."""
-        if os.path.exists(self.CONFIG_FILE):
-            with open(self.CONFIG_FILE, 'r') as f:
+        if os.path.exists(self.config_file):
+            with open(self.config_file, 'r') as f:
                 return json.load(f)
         return {}
 
     def save_config(self):
         """Saves the current paths to the JSON config file."""
-        config_data = {
+        # Update in place so hand-edited tuning keys survive a save from the UI.
+        self.config.update({
             'steamapps_path': self.steamapps_path,
             'manager_path': self.manager_path,
             'zomboid_user_path': self.zomboid_user_path,
-        }
-        with open(self.CONFIG_FILE, 'w') as f:
-            json.dump(config_data, f, indent=4)
+            'copy_workers': self.copy_workers,
+            'verify_before_switch': self.verify_before_switch,
+            'manage_workshop': self.manage_workshop,
+            'prewarm_after_switch': self.prewarm_after_switch,
+            'storage_roots': self.storage_roots,
+            'placement_policy': self.placement_policy,
+        })
+        with open(self.config_file, 'w') as f:
+            json.dump(self.config, f, indent=4)
 
     def get_game_install_path(self):
-        return os.path.join(self.steamapps_path, 'common', 'ProjectZomboid')
+        return os.path.join(self.steamapps_path, 'common', self.APP_INSTALL_DIRS.get(self.app_id, 'ProjectZomboid'))
 
     def get_manifest_path(self):
-        return os.path.join(self.steamapps_path, self.MANIFEST_FILE)
+        return os.path.join(self.steamapps_path, self.manifest_file)
 
-    def get_stored_versions(self):
-        """Scans the manager directory and returns a list of stored version profiles."""
+    def get_storage_pool(self):
+        from core.storage import StoragePool
+        return StoragePool.from_config(self.manager_path, self.storage_roots)
+
+    def get_profile_path(self, profile_name):
+        if not self.storage_roots:
+            return os.path.join(self.manager_path, profile_name)
+        pool = self.get_storage_pool()
+        # Profiles that don't exist yet default to the manager folder; captures place them themselves.
+        return (pool.find(profile_name) or pool.primary).profile_path(profile_name)
+
+    def get_workshop_content_path(self):
+        return os.path.join(self.steamapps_path, 'workshop', 'content', self.PZ_APP_ID)
+
+    def get_workshop_manifest_path(self):
+        return os.path.join(self.steamapps_path, 'workshop', self.WORKSHOP_MANIFEST_FILE)
+
+    def get_object_store(self, path=None):
+        """
+        The object store for files under 'path' (a profile, usually): every storage root has
+        its own, since hardlinks can't cross drives. Without a path, the manager folder's.
+        Instances kept in the manager folder use its store.
+        """
+        if self.store_owner is not None:
+            return self.store_owner.get_object_store(path)
+        if path is None or not self.storage_roots:
+            return ObjectStore(self.manager_path, self.read_only_objects)
+        return ObjectStore(self.get_storage_pool().root_for(path).path, self.read_only_objects)
+
+    def get_instances(self):
+        """Managers for the named instances in the config ('instances'), by name. See core/instances.py."""
+        from core.instances import make_instance_manager
+        return {entry['name']: make_instance_manager(self, entry) for entry in self.instances}
+
+    def get_instance(self, name):
+        instances = self.get_instances()
+        if name not in instances:
+            raise ValueError(f"No instance named '{name}' in the config.")
+        return instances[name]
+
+    def get_workshop_store(self):
+        return WorkshopStore(self.manager_path)
+
+    def get_copy_engine(self):
+        from core.copier import CopyEngine
+        return CopyEngine(self.copy_workers)
+
+    def get_scanner(self):
+        from core.scanner import TreeScanner
+        return TreeScanner(cache_dir=os.path.join(self.manager_path, '.cache'))
+
+    def scan_game_install(self, use_cache=True):
+        """Lists the game install with sizes; cached scans make repeated checks near-instant."""
+        return self.get_scanner().scan(self.get_game_install_path(), use_cache=use_cache)
+
+    def get_profile_index(self):
+        roots = [self.manager_path] + [root.path for root in self.get_storage_pool().roots[1:]]
+        if self._profile_index is None or self._profile_index.roots != roots:
+            self._profile_index = ProfileIndex(self.manager_path, roots[1:])
+        return self._profile_index
+
+    def get_profile_infos(self):
+        """Returns cached metadata for every stored profile (see ProfileIndex)."""
         if not os.path.isdir(self.manager_path):
             return []
-        return [d for d in os.listdir(self.manager_path) if os.path.isdir(os.path.join(self.manager_path, d))]
+        return self.get_profile_index().get_profiles()
+
+    def get_stored_versions(self):
+        """Returns a list of stored version profiles, using the profile index instead of rescanning."""
+        return [info['name'] for info in self.get_profile_infos()]
+
+    def get_active_profile(self):
+        """Returns the name of the profile the game install currently links to, or an empty string."""
+        game_path = self.get_game_install_path()
+        if os.path.islink(game_path):
+            try:
+                target_path = os.readlink(game_path)
+                return os.path.basename(os.path.dirname(target_path))
+            except OSError:
+                pass
+        return ""
+
+    def is_steam_updating(self):
+        """
+        True if Steam is downloading the game or its manifest says an update is in progress.
+        While a profile is linked, that means Steam is writing straight into the stored profile.
+        """
+        if os.path.isdir(os.path.join(self.steamapps_path, 'downloading', self.app_id)):
+            return True
+        try:
+            # StateFlags 4 means "fully installed"; anything else is some stage of an update.
+            return read_appstate(self.get_manifest_path()).get('StateFlags', '4') != '4'
+        except Exception:
+            return False
+
+    def is_game_running(self):
+        """True if the game (or a dedicated server) is running from the install right now, where that can be told."""
+        from core.utils import is_path_in_use
+        game_path = self.get_game_install_path()
+        return os.path.exists(game_path) and is_path_in_use(game_path)
+
+    def get_watch_targets(self):
+        """
+        Folders (and the entries in them) worth watching for changes made outside the app:
+        Steam's manifest and downloads, the game install link, the manager folder, and the
+        active profile's game files. Returns (folder, kinds[, recursive]) watches for PathWatcher.
+        """
+        game_path = os.path.normpath(self.get_game_install_path())
+        watches = [
+            (self.steamapps_path, {self.manifest_file: 'manifest', 'downloading': 'download'}),
+            (os.path.join(self.steamapps_path, 'downloading'), {self.app_id: 'download'}),
+            (os.path.dirname(game_path), {os.path.basename(game_path): 'install'}),
+            (self.manager_path, 'profiles'),
+        ]
+        watches += [(root.path, 'profiles') for root in self.get_storage_pool().roots[1:]]
+        active_profile = self.get_active_profile()
+        if active_profile:
+            # Anything written here while linked is written into the stored profile itself, at any depth.
+            watches.append((os.path.join(self.get_profile_path(active_profile), 'GameFiles'), 'write_through', True))
+        return [watch for watch in watches if watch[0] and os.path.isdir(watch[0])]
+
+    def get_overview(self):
+        """
+        Everything the main window shows, read in one go: the active profile and detected
+        version, the stored profiles (each with 'active', 'archived', 'delta' and
+        'materialized'), the storage roots when there are several, folders set aside by a
+        switch, and the folders to watch. It touches the disk, so GUIs call it off the UI thread.
+        """
+        active_profile = self.get_active_profile()
+        profiles = []
+        for info in self.get_profile_infos():
+            name = info['name']
+            record = read_profile_delta(self.get_profile_path(name))
+            profiles.append(dict(info, active=name == active_profile, archived=self.is_archived(name),
+                                 delta=record is not None, materialized=record is None or record['materialized']))
+        return {
+            'active_profile': active_profile,
+            'detected_version': self.detect_current_version_name(),
+            'steam_updating': bool(active_profile) and self.is_steam_updating(),
+            'profiles': profiles,
+            'storage_roots': self.get_storage_roots() if self.storage_roots else [],
+            'quarantined': self.get_quarantined_paths(),
+            'watch_targets': self.get_watch_targets(),
+        }
 
     def detect_current_version_name(self):
         """Reads the current appmanifest to find the name of the active branch."""
         manifest_path = self.get_manifest_path()
-        if not os.path.exists(manifest_path):
+        try:
+            manifest_mtime = os.stat(manifest_path).st_mtime_ns
+        except OSError:
             return "Not Found"
-        
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            data = vdf.load(f)
-        
-        appstate = data.get('AppState', {})
-        build_id = appstate.get('buildid', 'Unknown Build')
-        beta_key = appstate.get('UserConfig', {}).get('BetaKey')
 
+        # Only re-parse the manifest when Steam (or a switch) has rewritten it.
+        cached_key, cached_name = self._version_name_cache
+        if cached_key == (manifest_path, manifest_mtime):
+            return cached_name
+
+        build_id, beta_key = read_manifest_info(manifest_path)
         if beta_key:
-            return f"{beta_key} (Build: {build_id})"
-        return f"Stable (Build: {build_id})"
+            name = f"{beta_key} (Build: {build_id})"
+        else:
+            name = f"Stable (Build: {build_id})"
+        self._version_name_cache = ((manifest_path, manifest_mtime), name)
+        return name
 
-    def capture_current_version(self, profile_name):
-        """Copies game files, moves user data, and copies manifest to a new profile folder."""
-        profile_path = os.path.join(self.manager_path, profile_name)
-        if os.path.exists(profile_path):
-            raise ValueError(f"Profile '{profile_name}' already exists.")
+    @trace.traced('capture', 'profile_name')
+    def capture_current_version(self, profile_name, engine=None, scan=None, progress=None, base=None):
+        """
+        Stores game files, moves user data, and copies manifest to a new profile folder.
+        If an earlier capture of the same profile was interrupted, it resumes from its journal.
+        'scan' can be a ScanResult of the game install from an earlier size check, so the
+        tree is only walked once. 'progress' is an optional ProgressTracker; cancelling it
+        stops the capture and removes the partial profile.
+        With 'base' (another stored profile, usually the previous build), large changed files
+        are stored as binary deltas over the base's version of them. They are rebuilt by
+        materialize_profile(), which a switch to the profile runs by itself.
+        With extra storage roots configured, a new profile goes to the one the placement
+        policy picks (see core.storage); a delta capture goes next to its base.
+        """
+        base_files = self._read_delta_base(base) if base else None
+        profile_path = self.get_profile_path(profile_name)
+        journal = FileJournal(profile_path)
+        resumed = os.path.exists(profile_path)
+        if resumed:
+            if not journal.exists():
+                raise ValueError(f"Profile '{profile_name}' already exists.")
+            if 'capture' not in journal.load()[1]:
+                # An interrupted update_profile() left it; the profile itself is complete.
+                raise ValueError(f"Profile '{profile_name}' already exists and has an unfinished update. "
+                                 f"Run the update again to finish it.")
+            print(f"Resuming interrupted capture of '{profile_name}'...")
+        elif self.storage_roots:
+            if base:
+                root = self.get_storage_pool().root_for(self.get_profile_path(base))
+            else:
+                scan = scan or self.scan_game_install()
+                root = self.get_storage_pool().choose(self.placement_policy, scan.total_size)
+            profile_path = root.profile_path(profile_name)
+            journal = FileJournal(profile_path)
+            print(f"Storing '{profile_name}' in {root.path}.")
+        try:
+            return self._capture_steps(profile_name, profile_path, journal, engine, scan, progress,
+                                       base, base_files)
+        except OperationCancelled:
+            self._discard_partial_capture(profile_path, journal, resumed)
+            raise
 
+    def _capture_steps(self, profile_name, profile_path, journal, engine, scan, progress, base, base_files):
         game_install_path = self.get_game_install_path()
         manifest_path = self.get_manifest_path()
 
@@ -79,45 +326,1320 @@ class VersionManager:
         dest_manifest = os.path.join(profile_path, 'manifest.acf')
 
         os.makedirs(profile_path, exist_ok=True)
+        done_files, done_steps = journal.load()
+        journal.record_step('capture')
+        engine = engine or self.get_copy_engine()
+
+        # 1. Store game files (deduplicated) and link them into the profile
+        if 'game_files' not in done_steps:
+            print(f"Storing game files for {dest_game_files}...")
+            if done_files:
+                scan = None # Resuming relies on exact sizes and mtimes, so rescan without the cache.
+            with trace.span('capture.game_files'):
+                files, stats = self._store_game_files(game_install_path, dest_game_files, engine,
+                                                      known=done_files, journal=journal, scan=scan,
+                                                      progress=progress, delta_base=base_files)
+                write_file_index(profile_path, files)
+                if base:
+                    write_profile_delta(profile_path, {'base': base, 'files': stats['deltas'],
+                                                       'materialized': not stats['deltas']})
+            journal.record_step('game_files')
+        else:
+            files = read_file_index(profile_path)
 
-        # 1. Copy game files
-        print(f"Copying game files to {dest_game_files}...")
-        shutil.copytree(game_install_path, dest_game_files)
+        # 2. Store Workshop mods (shared between profiles) and link in the ones this profile uses
+        if 'workshop' not in done_steps:
+            workshop = self.capture_workshop(profile_name, engine, progress)
+            journal.record_step('workshop')
+        else:
+            workshop = None
 
-        # 2. Cut and move user data
-        print(f"Moving user data to {dest_user_data}...")
-        shutil.move(self.zomboid_user_path, dest_user_data)
+        # 3. Cut and move user data
+        if 'user_data' not in done_steps:
+            print(f"Moving user data to {dest_user_data}...")
+            with trace.span('capture.user_data'):
+                user_data = self._move_user_data(dest_user_data, progress)
+            journal.record_step('user_data')
+        else:
+            user_data = None
 
-        # 3. Copy manifest
+        # 4. Copy manifest
         print(f"Copying manifest to {dest_manifest}...")
-        shutil.copy2(manifest_path, dest_manifest)
+        with trace.span('manifest.copy', path=manifest_path):
+            shutil.copy2(manifest_path, dest_manifest)
+        journal.discard()
+        self.get_profile_index().record(profile_name, captured_at=time.time())
 
-        # 4. Re-create symlinks to keep the captured version active
+        # 5. Re-create symlinks to keep the captured version active
         #self._create_symlinks(profile_name)
         print("Capture complete.")
+        record = read_profile_delta(profile_path)
+        return {'files': len(files), 'copy_strategy': engine.strategy,
+                'copied': dict(engine.strategy_counts), 'user_data': user_data, 'workshop': workshop,
+                'deltas': len(record['files']) if record else None}
+
+    def _read_delta_base(self, base):
+        """Returns the file index of the profile a delta capture is based on."""
+        base_path = self.get_profile_path(base)
+        if not os.path.exists(base_path):
+            raise FileNotFoundError(f"Base profile '{base}' not found.")
+        if self.is_archived(base):
+            raise ValueError(f"Base profile '{base}' is archived. Restore it first.")
+        files = read_file_index(base_path)
+        if files is None:
+            raise ValueError(f"Base profile '{base}' has no file index to build deltas against.")
+        return files
+
+    def _discard_partial_capture(self, profile_path, journal, resumed):
+        """Removes what a cancelled capture stored so far, unless that could lose save files."""
+        journal.close()
+        if resumed and os.path.exists(os.path.join(profile_path, 'UserData')):
+            # An earlier run may have been cut short while deleting the moved saves from the
+            # source, so some of them might only exist here. Keep everything for a resume.
+            print("Capture cancelled; kept the partial profile because it holds moved user data.")
+            return
+        self._remove_link_folder(os.path.join(profile_path, 'Workshop'))
+        shutil.rmtree(profile_path, ignore_errors=True)
+        print("Capture cancelled; removed the partial profile.")
+
+    @trace.traced('update', 'profile_name')
+    def update_profile(self, profile_name, engine=None, progress=None):
+        """
+        Brings a stored profile up to date with the current game install (e.g. after a Steam
+        hotfix), copying only the files that changed and deleting the ones that are gone.
+        An interrupted (or cancelled) update resumes from its journal the next time it is run.
+        """
+        profile_path = self.get_profile_path(profile_name)
+        if not os.path.exists(profile_path):
+            raise FileNotFoundError(f"Profile '{profile_name}' not found.")
+
+        game_install_path = self.get_game_install_path()
+        if not os.path.isdir(game_install_path):
+            raise FileNotFoundError(f"No game install found at '{game_install_path}'.")
+        active_profile = self.get_active_profile()
+        if active_profile and active_profile != profile_name:
+            raise ValueError(f"The current install is the stored profile '{active_profile}', "
+                             f"not '{profile_name}'.")
 
-    def switch_to_version(self, profile_name):
-        """Switches the active version to the selected profile by swapping symlinks and manifest."""
-        profile_path = os.path.join(self.manager_path, profile_name)
+        # Files kept only as deltas have to be on disk to be compared with the install.
+        self.materialize_profile(profile_name, engine, progress)
+        if active_profile == profile_name:
+            # The install is this profile, so whatever wrote into it may have changed objects other profiles share.
+            self.repair_written_through(profile_name)
+        dest_game_files = os.path.join(profile_path, 'GameFiles')
+        journal = FileJournal(profile_path)
+        # The journal holds files finished by an interrupted run; they win over the old index.
+        known = read_file_index(profile_path) or {}
+        journal_files, _ = journal.load()
+        known.update(journal_files)
+        journal.record_step('update')
+
+        engine = engine or self.get_copy_engine()
+        print(f"Updating {dest_game_files}...")
+        files, stats = self._store_game_files(game_install_path, dest_game_files, engine,
+                                              known=known, journal=journal, progress=progress)
+        write_file_index(profile_path, files)
+
+        manifest_path = self.get_manifest_path()
+        if os.path.exists(manifest_path):
+            dest_manifest = os.path.join(profile_path, 'manifest.acf')
+            with trace.span('manifest.copy', path=manifest_path):
+                shutil.copy2(manifest_path, dest_manifest + '.tmp')
+                os.replace(dest_manifest + '.tmp', dest_manifest)
+        stats['workshop'] = self.capture_workshop(profile_name, engine, progress)
+        journal.discard()
+        self.get_profile_index().record(profile_name, damaged_files=None)
+        print(f"Update complete: {stats['changed']} changed, {stats['removed']} removed, "
+              f"{stats['unchanged']} unchanged.")
+        return stats
+
+    @trace.traced('workshop', 'profile_name')
+    def capture_workshop(self, profile_name, engine=None, progress=None):
+        """
+        Records the Workshop mods that are installed right now as the set this profile uses.
+        Each mod version (item id + Steam's update time) is stored once for all profiles, so
+        versions another profile already stored are reused without copying anything.
+        Steam updates mods in place, so while this profile was live an update went into the
+        stored version it linked to; once the new version is stored, the old one is put back.
+        Returns {'items', 'stored', 'reused'}, or None if there is no Workshop folder.
+        """
+        content_path = self.get_workshop_content_path()
+        if not self.manage_workshop or not os.path.isdir(content_path):
+            return None
+        profile_path = self.get_profile_path(profile_name)
+        store = self.get_workshop_store()
+        engine = engine or self.get_copy_engine()
+        installed = read_workshop_items(self.get_workshop_manifest_path())
+        previous = read_profile_workshop(profile_path) or {}
+
+        items, stored = {}, 0
+        for item_id in sorted(os.listdir(content_path)):
+            source = os.path.join(content_path, item_id)
+            if item_id.startswith('.') or not os.path.isdir(source):
+                continue
+            scan = None
+            version = installed.get(item_id)
+            if version is None:
+                # A mod copied in by hand: Steam doesn't know it, so go by its newest file.
+                scan = self.get_scanner().scan(source, use_cache=False)
+                version = f"local-{max((mtime for _, _, mtime in scan.files), default=0)}"
+            if not store.has(item_id, version):
+                print(f"Storing Workshop item {item_id} (version {version})...")
+                files, _ = self._store_game_files(source, store.content_path(item_id, version), engine,
+                                                  scan=scan, progress=progress)
+                write_file_index(store.version_path(item_id, version), files)
+                stored += 1
+            items[item_id] = version
+
+        for item_id, version in previous.items():
+            if items.get(item_id) != version and store.has(item_id, version):
+                self._restore_workshop_version(item_id, version)
+        self._link_workshop_items(profile_path, items)
+        if os.path.exists(self.get_workshop_manifest_path()):
+            shutil.copy2(self.get_workshop_manifest_path(), os.path.join(profile_path, 'appworkshop.acf'))
+        write_profile_workshop(profile_path, items)
+        print(f"Workshop: {len(items)} items, {stored} newly stored.")
+        return {'items': len(items), 'stored': stored, 'reused': len(items) - stored}
+
+    def _restore_workshop_version(self, item_id, version):
+        """
+        Rebuilds a stored Workshop mod version from its file index if its files changed since
+        it was stored (Steam updated or removed the mod through a profile's link).
+        Returns True if it had to.
+        """
+        store = self.get_workshop_store()
+        version_path = store.version_path(item_id, version)
+        content_path = store.content_path(item_id, version)
+        files = read_file_index(version_path) or {}
+        objects = self.get_object_store(version_path)
+        if os.path.isdir(content_path):
+            scan = self.get_scanner().scan(content_path, use_cache=False)
+            current = {rel_path.replace(os.sep, '/'): os.path.join(content_path, rel_path)
+                       for rel_path, _, _ in scan.files}
+            if current.keys() == files.keys() and all(
+                    objects.has(entry[2]) and os.path.samefile(current[key], objects.object_path(entry[2]))
+                    for key, entry in files.items()):
+                return False
+        if not all(objects.has(entry[2]) and os.path.getsize(objects.object_path(entry[2])) == entry[0]
+                   for entry in files.values()):
+            # The stored files themselves were written to; there's nothing left to rebuild it from.
+            shutil.rmtree(version_path)
+            print(f"Removed Workshop item {item_id} (version {version}): it was changed in place "
+                  f"and can't be rebuilt. Steam will download it again.")
+            return True
+        staged = content_path + self.STAGING_SUFFIX
+        shutil.rmtree(staged, ignore_errors=True)
+        os.makedirs(staged)
+        for key, entry in files.items():
+            dest = os.path.join(staged, *key.split('/'))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            objects.link(entry[2], dest)
+        if os.path.isdir(content_path):
+            os.rename(content_path, content_path + '.pzvm-old')
+        os.rename(staged, content_path)
+        shutil.rmtree(content_path + '.pzvm-old', ignore_errors=True)
+        print(f"Put back Workshop item {item_id} (version {version}), which was changed through a profile.")
+        return True
+
+    def _keep_live_workshop(self, profile_name):
+        """
+        Steam installs and updates mods through the live Workshop link, i.e. inside the
+        profile's Workshop folder. Stores those changes as the profile's own (see
+        capture_workshop()) before the link is taken down.
+        """
+        content_path = self.get_workshop_content_path()
+        links_path = os.path.join(self.get_profile_path(profile_name), 'Workshop')
+        if self.manage_workshop and os.path.islink(content_path) and os.path.isdir(links_path) \
+                and os.path.realpath(content_path) == os.path.realpath(links_path):
+            self.capture_workshop(profile_name)
+
+    def _link_workshop_items(self, profile_path, items):
+        """Rebuilds the profile's 'Workshop' folder: one link per item to the version it uses."""
+        store = self.get_workshop_store()
+        links_path = os.path.join(profile_path, 'Workshop')
+        staged = links_path + self.STAGING_SUFFIX
+        self._remove_link_folder(staged)
+        os.makedirs(staged)
+        for item_id, version in items.items():
+            self._make_dir_link(os.path.normpath(store.content_path(item_id, version)),
+                                os.path.join(staged, item_id))
+        # Swap the whole folder at once; the live Workshop link (if any) points at this path.
+        self._remove_link_folder(links_path)
+        os.rename(staged, links_path)
+
+    @staticmethod
+    def _remove_link_folder(path):
+        """
+        Deletes a folder of folder links without touching what the links point to.
+        Real folders in it (mods Steam installed through the live link) are deleted too, so
+        they have to be stored first.
+        """
+        if not os.path.isdir(path):
+            return
+        for name in os.listdir(path):
+            entry = os.path.join(path, name)
+            if os.path.isdir(entry) and not os.path.islink(entry):
+                shutil.rmtree(entry)
+                continue
+            try:
+                os.unlink(entry)
+            except OSError:
+                os.rmdir(entry) # Windows removes directory links with rmdir.
+        os.rmdir(path)
+
+    @trace.traced('store', 'source_dir')
+    def _store_game_files(self, source_dir, dest_dir, engine=None, known=None, journal=None, scan=None,
+                          progress=None, delta_base=None):
+        """
+        Adds every file under 'source_dir' to the object store and makes 'dest_dir' an exact
+        mirror of it, built from links to the stored objects. 'known' is the last recorded
+        index of 'dest_dir': files whose size and mtime still match it are not read again.
+        'delta_base' is the file index of a base profile for a delta capture: files that match
+        it by size and mtime aren't read either, and changed large files may be stored as
+        deltas over the base's version, which leaves them out of 'dest_dir' for now.
+        Returns (file index, stats); stats['deltas'] maps those files to their digests.
+        """
+        if scan is None:
+            scan = self.get_scanner().scan(source_dir, use_cache=False)
+        store = self.get_object_store(dest_dir)
+        engine = engine or self.get_copy_engine()
+        known = known or {}
+        # When the profile is the live install (Steam patched it through the symlink),
+        # source and destination are the same files and only need re-linking.
+        in_place = os.path.realpath(source_dir) == os.path.realpath(dest_dir)
+
+        files = {}
+        jobs = []
+        source_dirs = set()
+        for rel_dir in scan.dirs:
+            source_dirs.add(rel_dir)
+            os.makedirs(os.path.normpath(os.path.join(dest_dir, rel_dir)), exist_ok=True)
+        for rel_path, size, mtime_ns in scan.files:
+            key = rel_path.replace(os.sep, '/')
+            dest = os.path.join(dest_dir, rel_path)
+            entry = known.get(key)
+            if entry and entry[:2] == [size, mtime_ns] and os.path.exists(dest):
+                files[key] = entry
+                continue
+            jobs.append((size, os.path.join(source_dir, rel_path), dest, key))
+
+        if progress:
+            progress.start_phase("Storing game files", scan.total_size, scan.file_count)
+            # Files that didn't change are done already.
+            progress.advance(sum(entry[0] for entry in files.values()), len(files))
+        if jobs:
+            # Pick the cheapest copy primitive the source and store filesystems agree on.
+            strategy = engine.detect_strategy(jobs[0][1], store.tmp_path)
+            print(f"Copy strategy: {strategy}")
+
+        def store_one(src, dest, key):
+            st = os.stat(src)
+            started = time.perf_counter()
+            digest, as_delta = None, False
+            if delta_base is not None:
+                digest, as_delta = self._store_against_base(store, src, st, delta_base.get(key))
+            if as_delta:
+                entry = [st.st_size, st.st_mtime_ns, digest]
+                if journal:
+                    journal.record_file(key, entry)
+                if progress:
+                    progress.advance(st.st_size, 1)
+                span.add(delta_seconds=time.perf_counter() - started)
+                return key, entry, False, True
+            digest = store.ingest(src, digest, copy_function=engine.copy_file)
+            ingested = time.perf_counter()
+            linked = False
+            if not (os.path.exists(dest) and os.path.samefile(dest, store.object_path(digest))):
+                linked = store.link(digest, dest)
+            span.add(ingest_seconds=ingested - started, link_seconds=time.perf_counter() - ingested)
+            if in_place:
+                st = os.stat(dest)
+            entry = [st.st_size, st.st_mtime_ns, digest]
+            if journal:
+                journal.record_file(key, entry)
+            if progress:
+                progress.advance(st.st_size, 1)
+            return key, entry, linked, False
+
+        span = trace.current()
+        results = engine.run(store_one, jobs)
+        if progress:
+            progress.finish_phase()
+        files.update((key, entry) for key, entry, _, _ in results)
+        linked = sum(1 for _, _, was_linked, _ in results if was_linked)
+        deltas = {key: entry[2] for key, entry, _, as_delta in results if as_delta}
+        removed = 0 if in_place else self._prune_mirror(dest_dir, files, source_dirs)
+        span.set(files=len(files), changed=len(jobs), removed=removed, linked=linked, deltas=len(deltas),
+                 bytes_stored=sum(job[0] for job in jobs))
+        print(f"Stored {len(jobs)} files ({linked} hardlinked, {len(deltas)} as deltas) using "
+              f"{engine.workers} threads. Copied new objects with {engine.describe_strategies()}.")
+        return files, {'changed': len(jobs), 'unchanged': len(files) - len(jobs), 'removed': removed,
+                       'deltas': deltas}
+
+    def _store_against_base(self, store, src, st, base_entry):
+        """
+        The delta capture part of storing one file. Returns (digest, stored as a delta); when
+        it wasn't, the file still has to be ingested (the digest saves hashing it again).
+        """
+        if base_entry and base_entry[:2] == [st.st_size, st.st_mtime_ns]:
+            digest = base_entry[2] # Untouched since the base was stored, so it isn't read at all.
+        else:
+            digest = store.hash_file(src)
+        if store.has(digest):
+            return digest, False
+        if store.has_delta(digest):
+            return digest, True
+        if base_entry and base_entry[2] != digest and st.st_size >= self.DELTA_MIN_SIZE:
+            return digest, store.add_delta(src, digest, base_entry[2])
+        return digest, False
+
+    @staticmethod
+    def _prune_mirror(dest_dir, files, source_dirs):
+        """Deletes files and folders from 'dest_dir' that are no longer in the source tree."""
+        removed = 0
+        for dirpath, _, filenames in os.walk(dest_dir, topdown=False):
+            rel_dir = os.path.normpath(os.path.relpath(dirpath, dest_dir))
+            for filename in filenames:
+                key = os.path.normpath(os.path.join(rel_dir, filename)).replace(os.sep, '/')
+                if key not in files:
+                    os.remove(os.path.join(dirpath, filename))
+                    removed += 1
+            if rel_dir not in source_dirs and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+        return removed
+
+    def _move_user_data(self, dest_user_data, progress=None):
+        """
+        Moves the user data folder into a profile, finishing a move that was interrupted.
+        Returns the timings from move_tree(); None if an earlier run already moved it.
+        """
+        source = self.zomboid_user_path
+        if not os.path.exists(source):
+            if os.path.exists(dest_user_data):
+                return None # Moved completely by an earlier, interrupted run.
+            raise FileNotFoundError(f"User data folder '{source}' not found.")
+
+        from core.mover import move_tree
+        result = move_tree(source, dest_user_data, self.get_copy_engine(), progress)
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in result['timings'].items())
+        print(f"Moved user data by {result['method']} ({phases}).")
+        return result
+
+    def is_delta_profile(self, profile_name):
+        """True if the profile was captured as deltas over another profile."""
+        return read_profile_delta(self.get_profile_path(profile_name)) is not None
+
+    def is_materialized(self, profile_name):
+        """False for a delta profile whose delta-encoded files aren't rebuilt in its GameFiles yet."""
+        record = read_profile_delta(self.get_profile_path(profile_name))
+        return record is None or record['materialized']
+
+    @trace.traced('materialize', 'profile_name')
+    def materialize_profile(self, profile_name, engine=None, progress=None):
+        """
+        Rebuilds the files a delta profile only keeps as deltas and links them into its
+        GameFiles. Switching to the profile does this by itself; running it ahead of time
+        (e.g. as a background job) makes that switch as quick as any other.
+        Returns {'files', 'bytes'} rebuilt.
+        """
+        profile_path = self.get_profile_path(profile_name)
+        record = read_profile_delta(profile_path)
+        if record is None or record['materialized']:
+            return {'files': 0, 'bytes': 0}
+        store = self.get_object_store(profile_path)
+        engine = engine or self.get_copy_engine()
+        files = read_file_index(profile_path)
+        game_files = os.path.join(profile_path, 'GameFiles')
+        jobs = [(files[rel][0], rel, files[rel]) for rel in record['files']]
+        total = sum(job[0] for job in jobs)
+        if progress:
+            progress.start_phase("Rebuilding files from deltas", total, len(jobs))
+
+        def rebuild(rel, entry):
+            store.materialize(entry[2], entry[1])
+            dest = os.path.join(game_files, *rel.split('/'))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            store.link(entry[2], dest)
+            if progress:
+                progress.advance(entry[0], 1)
+
+        engine.run(rebuild, jobs)
+        if progress:
+            progress.finish_phase()
+        record['materialized'] = True
+        write_profile_delta(profile_path, record)
+        print(f"Rebuilt {len(jobs)} files of {profile_name} from deltas over '{record['base']}'.")
+        return {'files': len(jobs), 'bytes': total}
+
+    @trace.traced('dematerialize', 'profile_name')
+    def dematerialize_profile(self, profile_name):
+        """
+        Shrinks a materialized delta profile back to its deltas: the rebuilt files leave its
+        GameFiles, and their objects are deleted unless another profile links them.
+        Returns (objects removed, bytes freed).
+        """
+        profile_path = self.get_profile_path(profile_name)
+        record = read_profile_delta(profile_path)
+        if record is None:
+            raise ValueError(f"Profile '{profile_name}' is not stored as deltas.")
+        if self.get_active_profile() == profile_name:
+            raise ValueError(f"Profile '{profile_name}' is active. Switch to another version first.")
+        for rel in record['files']:
+            try:
+                os.remove(os.path.join(profile_path, 'GameFiles', *rel.split('/')))
+            except FileNotFoundError:
+                pass
+        record['materialized'] = False
+        write_profile_delta(profile_path, record)
+
+        # Only objects that can be rebuilt from a delta go; collect_garbage() handles the rest.
+        store = self.get_object_store(profile_path)
+        removed, freed = 0, 0
+        for digest in set(record['files'].values()):
+            try:
+                st = os.stat(store.object_path(digest))
+            except FileNotFoundError:
+                continue
+            if st.st_nlink == 1 and store.has_delta(digest):
+                os.remove(store.object_path(digest))
+                removed += 1
+                freed += st.st_size
+        print(f"Shrunk {profile_name} back to deltas; freed {removed} objects ({freed} bytes).")
+        return removed, freed
+
+    def is_archived(self, profile_name):
+        """True if the profile's files are packed away in an archive (see archive_profile)."""
+        profile_path = self.get_profile_path(profile_name)
+        return (os.path.exists(os.path.join(profile_path, self.ARCHIVE_FILE))
+                and not os.path.exists(os.path.join(profile_path, 'GameFiles')))
+
+    @trace.traced('archive', 'profile_name')
+    def archive_profile(self, profile_name, progress=None):
+        """
+        Compresses a profile's GameFiles and UserData into a single archive on all cores and
+        deletes the uncompressed folders. Store objects only this profile used are freed.
+        The profile stays listed and is restored automatically when switched to.
+        """
+        profile_path = self.get_profile_path(profile_name)
         if not os.path.exists(profile_path):
             raise FileNotFoundError(f"Profile '{profile_name}' not found.")
+        if self.is_archived(profile_name):
+            raise ValueError(f"Profile '{profile_name}' is already archived.")
+        if self.get_active_profile() == profile_name:
+            raise ValueError(f"Profile '{profile_name}' is active. Switch to another version first.")
+
+        from core.archive import archive_profile_folders
+        archive_path = os.path.join(profile_path, self.ARCHIVE_FILE)
+        if progress:
+            info = next((info for info in self.get_profile_infos() if info['name'] == profile_name), {})
+            progress.start_phase("Archiving", info.get('size') or 0, info.get('file_count') or 0)
+        print(f"Archiving {profile_name} to {archive_path}...")
+        archive_profile_folders(profile_path, archive_path, ('GameFiles', 'UserData'), progress)
+
+        for folder in ('GameFiles', 'UserData'):
+            shutil.rmtree(os.path.join(profile_path, folder), ignore_errors=True)
+        removed, freed = self.collect_garbage()
+        self.get_profile_index().record(profile_name, archived=True)
+        print(f"Archived {profile_name}; freed {removed} stored objects ({freed} bytes).")
 
-        # 1. Remove existing symlinks and manifest
-        self._remove_symlinks_and_manifest()
+    @trace.traced('restore', 'profile_name')
+    def restore_profile(self, profile_name, progress=None):
+        """Unpacks an archived profile so it can be used again. Returns restore throughput stats."""
+        profile_path = self.get_profile_path(profile_name)
+        if not self.is_archived(profile_name):
+            raise ValueError(f"Profile '{profile_name}' is not archived.")
+        from core.archive import restore_profile_folders
+        archive_path = os.path.join(profile_path, self.ARCHIVE_FILE)
+        if progress:
+            progress.start_phase("Restoring archive", os.path.getsize(archive_path))
 
-        # 2. Copy the stored manifest back to the steamapps folder
-        stored_manifest = os.path.join(profile_path, 'manifest.acf')
-        shutil.copy2(stored_manifest, self.get_manifest_path())
+        # Unpack next to the profile and move the folders in only once complete: is_archived()
+        # keys off GameFiles, so a crash mid-restore must never leave a partial one behind.
+        # A previous restore may have been interrupted; start from a clean slate.
+        restoring_path = os.path.join(profile_path, self.RESTORING_DIR)
+        for folder in ('GameFiles', 'UserData'):
+            shutil.rmtree(os.path.join(profile_path, folder), ignore_errors=True)
+        shutil.rmtree(restoring_path, ignore_errors=True)
+        try:
+            read_bytes, seconds = restore_profile_folders(restoring_path, archive_path, self.get_object_store(profile_path),
+                                                          read_file_index(profile_path), progress)
+            # UserData first: the GameFiles rename is what marks the profile restored.
+            for folder in ('UserData', 'GameFiles'):
+                os.makedirs(os.path.join(restoring_path, folder), exist_ok=True)
+                os.replace(os.path.join(restoring_path, folder), os.path.join(profile_path, folder))
+        except BaseException:
+            shutil.rmtree(restoring_path, ignore_errors=True)
+            if not os.path.exists(os.path.join(profile_path, 'GameFiles')):
+                shutil.rmtree(os.path.join(profile_path, 'UserData'), ignore_errors=True)
+            raise
+        os.rmdir(restoring_path)
+        os.remove(archive_path)
+        self.get_profile_index().record(profile_name, archived=False)
+        rate = read_bytes / seconds / (1024 * 1024) if seconds else 0
+        print(f"Restored {profile_name} in {seconds:.1f}s ({rate:.1f} MB/s of archive).")
+        return {'archive_bytes': read_bytes, 'seconds': seconds}
+
+    def get_storage_roots(self):
+        """The storage roots (see core.storage) with their free space, speed, and the profiles in each."""
+        pool = self.get_storage_pool()
+        infos = self.get_profile_infos()
+        return [dict(root.describe(), profiles=[info['name'] for info in infos
+                                                if os.path.normpath(info.get('root') or '') == root.path])
+                for root in pool.roots]
+
+    @trace.traced('migrate.stage', 'profile_name', 'root_path')
+    def stage_migration(self, profile_name, root_path, engine=None, progress=None):
+        """
+        The slow half of moving a profile to another storage root: copies it into a staging
+        folder on that root, at most 'migrate_rate_mb' MB/s so the game and Steam stay
+        responsive. Game files go into that root's object store, so files another profile
+        there already has are only linked. The profile stays usable (and switchable) all
+        along; finish_migration() then catches up with its saves and swaps it over.
+        A delta profile moves as a full copy, as its base stays behind; its files have to be
+        rebuilt first (materialize_profile(), which needs the profile to itself), or it's refused.
+        """
+        from core.mover import mirror_tree
+        from core.storage import MIGRATING_DIR, Throttle
+        pool = self.get_storage_pool()
+        target = pool.get(root_path)
+        profile_path = self.get_profile_path(profile_name)
+        if not os.path.exists(profile_path):
+            raise FileNotFoundError(f"Profile '{profile_name}' not found.")
+        if pool.root_for(profile_path) is target:
+            raise ValueError(f"Profile '{profile_name}' is already stored in '{target.path}'.")
+        if target.has_profile(profile_name):
+            raise ValueError(f"'{target.path}' already has a profile named '{profile_name}'.")
+        if FileJournal(profile_path).exists():
+            raise ValueError(f"Profile '{profile_name}' has an unfinished capture or update. Finish it first.")
+        if not self.is_materialized(profile_name):
+            raise ValueError(f"Profile '{profile_name}' is stored as deltas. Rebuild its files before moving it.")
+        info = next((info for info in self.get_profile_infos() if info['name'] == profile_name), {})
+        needed = (info.get('size') or 0) * 1.1
+        if target.free_space() < needed:
+            raise ValueError(f"Not enough disk space in '{target.path}'.")
 
-        # 3. Create new symlinks pointing to the selected profile
-        self._create_symlinks(profile_name)
+        engine = engine or self.get_copy_engine()
+        throttle = Throttle(self.config.get('migrate_rate_mb', 100) * 1024 * 1024 or None)
+        staging = os.path.join(target.path, MIGRATING_DIR, profile_name)
+        # Whatever an earlier attempt staged is redone; its objects are in the store by now.
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        files_path = os.path.join(profile_path, FILE_INDEX)
+        files_mtime = os.stat(files_path).st_mtime_ns if os.path.exists(files_path) else None
+        game_files = os.path.join(profile_path, 'GameFiles')
+        print(f"Copying {profile_name} to {target.path}...")
+        try:
+            if os.path.isdir(game_files):
+                self._stage_game_files(game_files, os.path.join(staging, 'GameFiles'),
+                                       self.get_object_store(target.path), read_file_index(profile_path) or {},
+                                       engine, throttle, progress)
+            mirror_tree(profile_path, staging, engine, skip=('GameFiles', PROFILE_DELTA_FILE),
+                        throttle=throttle, progress=progress)
+            with open(os.path.join(staging, self.MIGRATION_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'source': profile_path, 'files_mtime': files_mtime}, f, indent=4)
+        except BaseException:
+            # Cancelled or failed: drop the partial copy (objects it stored stay for the next try or GC).
+            self._remove_staging(staging)
+            raise
+        return staging
+
+    @staticmethod
+    def _remove_staging(staging):
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(staging)) # The MIGRATING_DIR, once nothing else is staged there.
+        except OSError:
+            pass
+
+    def _stage_game_files(self, game_files, dest_dir, store, files, engine, throttle, progress):
+        """Rebuilds a profile's GameFiles at 'dest_dir' from links into 'store', copying in missing objects."""
+        for dirpath, _, _ in os.walk(game_files):
+            os.makedirs(os.path.join(dest_dir, os.path.relpath(dirpath, game_files)), exist_ok=True)
+        jobs = [(entry[0], rel, entry) for rel, entry in files.items()]
+        if progress:
+            progress.start_phase("Moving game files", sum(job[0] for job in jobs), len(jobs))
+        if jobs:
+            engine.detect_strategy(os.path.join(game_files, *jobs[0][1].split('/')), store.tmp_path)
+
+        def copy(src, dst):
+            throttle.consume(os.path.getsize(src))
+            engine.copy_file(src, dst)
+
+        def stage_one(rel, entry):
+            # Digests come from the file index; verify_profile() is what checks them.
+            store.ingest(os.path.join(game_files, *rel.split('/')), entry[2], copy_function=copy)
+            store.link(entry[2], os.path.join(dest_dir, *rel.split('/')))
+            if progress:
+                progress.advance(entry[0], 1)
+
+        engine.run(stage_one, jobs)
+        if progress:
+            progress.finish_phase()
+
+    @trace.traced('migrate.finish', 'profile_name', 'root_path')
+    def finish_migration(self, profile_name, root_path, engine=None, progress=None):
+        """
+        Swaps a profile staged by stage_migration() into its new storage root: copies over
+        what changed in its user data meanwhile, renames the staged copy into place, points
+        the game at it if it's the active profile, and deletes the old copy. Refuses if the
+        profile's game files were updated since staging (stage it again then), and, for the
+        active profile, while the game runs or Steam updates it, as their writes would land in
+        the old copy. A journal lets recover_interrupted_migrations() finish a cut-short swap.
+        """
+        from core.mover import mirror_tree
+        from core.storage import MIGRATING_DIR
+        target = self.get_storage_pool().get(root_path)
+        staging = os.path.join(target.path, MIGRATING_DIR, profile_name)
+        try:
+            with open(os.path.join(staging, self.MIGRATION_FILE), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"No staged copy of '{profile_name}' in '{target.path}'.")
+        profile_path = record['source']
+        files_path = os.path.join(profile_path, FILE_INDEX)
+        files_mtime = os.stat(files_path).st_mtime_ns if os.path.exists(files_path) else None
+        if self.get_profile_path(profile_name) != profile_path or files_mtime != record['files_mtime']:
+            raise ValueError(f"Profile '{profile_name}' changed while it was being moved. Move it again.")
+
+        active = self.get_active_profile() == profile_name
+        if active and self.is_steam_updating():
+            raise ValueError(f"Steam is updating '{profile_name}'. Move it once the update is done.")
+        if active and self.is_game_running():
+            raise ValueError(f"The game is running from '{profile_name}'. Close it, then move it again.")
+
+        mirror_tree(profile_path, staging, engine or self.get_copy_engine(),
+                    skip=('GameFiles', PROFILE_DELTA_FILE, self.MIGRATION_FILE), progress=progress)
+        os.remove(os.path.join(staging, self.MIGRATION_FILE))
+        # Set aside on its own drive first (instant), so no moment has the profile in two roots.
+        old_copy = os.path.join(os.path.dirname(profile_path), self.MIGRATED_DIR, profile_name)
+        os.makedirs(os.path.dirname(old_copy), exist_ok=True)
+        self._write_journal_file(self._get_migration_journal_path(), {
+            'profile': profile_name, 'source': profile_path, 'old_copy': old_copy,
+            'target': target.profile_path(profile_name), 'active': active})
+        os.rename(profile_path, old_copy)
+        os.rename(staging, target.profile_path(profile_name))
+        self._finish_migration_swap(self._read_migration_journal(), progress)
+        for folder in (os.path.dirname(staging), os.path.dirname(old_copy)):
+            if os.path.isdir(folder) and not os.listdir(folder):
+                os.rmdir(folder)
+        removed, freed = self.collect_garbage()
+        print(f"Moved {profile_name} to {target.path}; freed {removed} stored objects ({freed} bytes).")
+        return {'profile': profile_name, 'root': target.path, 'objects_removed': removed, 'bytes_freed': freed}
+
+    def _finish_migration_swap(self, journal, progress=None):
+        """The part of a migration after the renames: point the game at the new copy, then drop the old one."""
+        if journal['active']:
+            self.switch_to_version(journal['profile'], progress)
+        if os.path.exists(journal['old_copy']):
+            shutil.rmtree(journal['old_copy'])
+        os.remove(self._get_migration_journal_path())
+
+    def _get_migration_journal_path(self):
+        return os.path.join(self.manager_path, self.MIGRATION_JOURNAL)
+
+    def _read_migration_journal(self):
+        path = self._get_migration_journal_path()
+        if not self.manager_path or not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def migrate_profile(self, profile_name, root_path, engine=None, progress=None):
+        """
+        Moves a profile to another storage root (stage_migration() and finish_migration() in
+        one go), rebuilding a delta profile's files first. The caller holds the profile.
+        """
+        self.materialize_profile(profile_name, engine, progress)
+        self.stage_migration(profile_name, root_path, engine, progress)
+        return self.finish_migration(profile_name, root_path, engine, progress)
+
+    def recover_interrupted_migrations(self):
+        """
+        Cleans up after a finish_migration() that was cut short: if the profile arrived in its
+        new root, the game is pointed at it (if it was active) and the set aside copy deleted;
+        if not, the old copy goes back in place, which is where the game's links still point.
+        Staged copies that stage_migration() never finished are deleted, so call it only when
+        no move is running (e.g. at startup). Returns the names of the profiles recovered.
+        """
+        from core.storage import MIGRATING_DIR
+        recovered = []
+        journal = self._read_migration_journal()
+        if journal is not None:
+            if os.path.exists(journal['target']):
+                self._finish_migration_swap(journal)
+            else:
+                if os.path.exists(journal['old_copy']) and not os.path.exists(journal['source']):
+                    os.rename(journal['old_copy'], journal['source'])
+                os.remove(self._get_migration_journal_path())
+            recovered.append(journal['profile'])
+        for root in self.get_storage_pool().roots:
+            old_copies = os.path.join(root.path, self.MIGRATED_DIR)
+            if not os.path.isdir(old_copies):
+                continue
+            for name in os.listdir(old_copies):
+                old_copy = os.path.join(old_copies, name)
+                if self.get_storage_pool().find(name):
+                    shutil.rmtree(old_copy)
+                else:
+                    os.rename(old_copy, root.profile_path(name))
+                recovered.append(name)
+            os.rmdir(old_copies)
+        for root in self.get_storage_pool().roots:
+            staged_copies = os.path.join(root.path, MIGRATING_DIR)
+            if not os.path.isdir(staged_copies):
+                continue
+            for name in os.listdir(staged_copies):
+                if not os.path.exists(os.path.join(staged_copies, name, self.MIGRATION_FILE)):
+                    print(f"Deleting the unfinished copy of '{name}' in '{root.path}'.")
+                    self._remove_staging(os.path.join(staged_copies, name))
+        # A link left pointing at where the active profile used to be.
+        game_path = self.get_game_install_path()
+        active_profile = self.get_active_profile()
+        if active_profile and os.path.islink(game_path) and not os.path.exists(game_path) \
+                and self.get_storage_pool().find(active_profile):
+            self.switch_to_version(active_profile)
+            recovered.append(active_profile)
+        return sorted(set(recovered))
+
+    def plan_rebalance(self):
+        """
+        The moves that bring the profiles in line with the placement policy, as
+        [(profile, from root, to root)]. With 'hot_on_fast', the active profile and the
+        'hot_profiles' most recently used ones belong on fast drives, the rest on slow ones.
+        """
+        active_profile = self.get_active_profile()
+        infos = [dict(info, active=info['name'] == active_profile) for info in self.get_profile_infos()]
+        moves = self.get_storage_pool().plan(self.placement_policy, infos, self.config.get('hot_profiles', 2))
+        return [(name, source.path, target.path) for name, source, target in moves]
+
+    def _bundle_source(self, profile_name):
+        """Checks a profile can be exported and rebuilds its delta-encoded files. Returns (path, file index)."""
+        profile_path = self.get_profile_path(profile_name)
+        if not os.path.exists(profile_path):
+            raise FileNotFoundError(f"Profile '{profile_name}' not found.")
+        if self.is_archived(profile_name):
+            raise ValueError(f"Profile '{profile_name}' is archived. Restore it first.")
+        if FileJournal(profile_path).exists():
+            raise ValueError(f"Profile '{profile_name}' has an unfinished capture or update. Finish it first.")
+        files = read_file_index(profile_path)
+        if files is None:
+            raise ValueError(f"Profile '{profile_name}' has no file index to export from.")
+        self.materialize_profile(profile_name)
+        return profile_path, files
+
+    @trace.traced('export', 'profile_name')
+    def export_profile(self, profile_name, bundle_path, include_user_data=False, progress=None):
+        """
+        Writes a profile's game files, manifest and optionally its user data (saves, mods
+        settings) to a bundle file (see core/bundle.py) that import_profile() on another
+        machine turns back into a profile. A delta profile is rebuilt first.
+        Returns {'objects', 'files', 'bytes'} written.
+        """
+        from core.bundle import write_bundle
+        profile_path, files = self._bundle_source(profile_name)
+        print(f"Exporting {profile_name} to {bundle_path}...")
+        tmp_path = bundle_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as out:
+                result = write_bundle(profile_path, out, files, include_user_data, progress)
+            os.replace(tmp_path, bundle_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return result
+
+    @trace.traced('export.serve', 'profile_name', 'address')
+    def serve_profile(self, profile_name, address, include_user_data=False, connections=1, progress=None):
+        """
+        Sends a profile as a bundle to the next 'connections' machines that import from
+        'address' ('tcp://0.0.0.0:7890', or 'unix:///path' on one machine). Each importer
+        only receives the game files its store doesn't have yet. An importer that fails
+        doesn't stop the others; its entry in 'sent' holds the error.
+        """
+        from core.bundle import serve, write_bundle
+        profile_path, files = self._bundle_source(profile_name)
+
+        def send(conn):
+            with conn.makefile('rb') as peer, conn.makefile('wb') as out:
+                return write_bundle(profile_path, out, files, include_user_data, progress, peer)
+        sent = serve(address, send, connections, progress)
+        return {'ok': not any('error' in result for result in sent), 'sent': sent}
+
+    @trace.traced('import', 'source')
+    def import_profile(self, source, profile_name=None, progress=None):
+        """
+        Adds a profile from a bundle: a file written by export_profile(), or the address a
+        serve_profile() is listening on. It is named like the exported profile unless
+        'profile_name' is given, and stored like a capture (files the store already has are
+        only linked), so it can be switched to right away. Game files of an interrupted
+        import stay in the store, so importing again only fetches the rest.
+        """
+        from core.bundle import BundleReader, connect, is_address
+        from core.storage import SPACE_MARGIN
+        if is_address(source):
+            sock = connect(source)
+            stream, reply = sock.makefile('rb'), sock.makefile('wb')
+        else:
+            sock, reply = None, None
+            stream = open(source, 'rb')
+        try:
+            reader = BundleReader(stream, reply)
+            header = reader.read_header()
+            profile_name = profile_name or header['profile']
+            pool = self.get_storage_pool()
+            if pool.find(profile_name):
+                raise ValueError(f"Profile '{profile_name}' already exists.")
+            size = sum(size for _, size in header['objects']) + sum(entry['size'] for entry in header['extra'])
+            root = pool.choose(self.placement_policy, size) if self.storage_roots else pool.primary
+            store = self.get_object_store(root.path)
+            needed = sum(size for _, size in reader.missing(store)) + sum(entry['size'] for entry in header['extra'])
+            if root.free_space() < needed * SPACE_MARGIN:
+                raise ValueError(f"Not enough disk space in '{root.path}'.")
+
+            # Built in a dot-folder and renamed into place, so a cut-off import never shows up as a profile.
+            staging = os.path.join(root.path, self.IMPORTING_DIR, profile_name)
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(os.path.join(staging, 'UserData')) # Left empty without user data; the game fills it.
+            print(f"Importing {profile_name} into {root.path}...")
+            try:
+                result = reader.read_into(staging, store, progress)
+                os.rename(staging, root.profile_path(profile_name))
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            finally:
+                if not os.listdir(os.path.dirname(staging)):
+                    os.rmdir(os.path.dirname(staging))
+        finally:
+            stream.close()
+            if sock is not None:
+                reply.close()
+                sock.close()
+        self.get_profile_index().record(profile_name, captured_at=time.time())
+        print(f"Imported {profile_name}: {result['objects']} files received, {result['skipped']} already stored.")
+        return dict(result, profile=profile_name, root=root.path)
+
+    @trace.traced('gc')
+    def collect_garbage(self):
+        """
+        Deletes Workshop mod versions that no profile uses anymore, then stored game file
+        objects that neither an unarchived profile nor a stored mod version uses. Each
+        storage root's object store is only checked against the profiles kept in that root.
+        Instances sharing the object store (see core/instances.py) are included. Anything
+        stored within the last GC_MIN_AGE seconds is kept, but jobs that add to the stores
+        should still not run alongside it (the scheduler's STORE lock, see core/jobs.py).
+        """
+        if self.store_owner is not None:
+            return self.store_owner.collect_garbage()
+        pool = self.get_storage_pool()
+        # Per root: (objects referenced, files kept as deltas)
+        usage = {root.path: (set(), set()) for root in pool.roots}
+        sharing = [manager for manager in self.get_instances().values() if manager.store_owner is self]
+        for manager in [self] + sharing:
+            manager._collect_usage(pool, usage)
+
+        removed, freed = 0, 0
+        for root in pool.roots:
+            referenced, delta_files = usage[root.path]
+            # Deltas need their bases; objects that a delta can rebuild may go once nothing links them.
+            store = ObjectStore(root.path)
+            bases = store.collect_deltas(delta_files)
+            referenced |= bases
+            referenced -= {digest for digest in delta_files | bases if store.has_delta(digest)}
+            root_removed, root_freed = store.collect_garbage(referenced)
+            removed += root_removed
+            freed += root_freed
+        return removed, freed
+
+    def _collect_usage(self, pool, usage):
+        """
+        Adds the objects this manager's profiles and Workshop mods use to 'usage', per root
+        of 'pool', and deletes the Workshop mod versions no profile uses anymore.
+        """
+        workshop_versions = set()
+        for name in self.get_stored_versions():
+            profile_path = self.get_profile_path(name)
+            referenced, delta_files = usage[pool.root_for(profile_path).path]
+            workshop_versions.update((read_profile_workshop(profile_path) or {}).items())
+            delta_files.update((read_profile_delta(profile_path) or {'files': {}})['files'].values())
+            if self.is_archived(name):
+                continue
+            files = read_file_index(profile_path) or {}
+            referenced.update(entry[2] for entry in files.values())
+
+        # Workshop mods are stored in the manager folder, so their objects are in its store.
+        referenced = usage[pool.root_for(self.manager_path).path][0]
+        workshop = self.get_workshop_store()
+        now = time.time()
+        for item_id, version in list(workshop.iter_versions()):
+            version_path = workshop.version_path(item_id, version)
+            # A capture stores the version before it writes the profile's workshop.json.
+            if (item_id, version) in workshop_versions or now - os.stat(version_path).st_mtime < GC_MIN_AGE:
+                files = read_file_index(version_path) or {}
+                referenced.update(entry[2] for entry in files.values())
+            else:
+                shutil.rmtree(version_path)
+                if not os.listdir(os.path.dirname(version_path)):
+                    os.rmdir(os.path.dirname(version_path))
+                print(f"Removed unused Workshop item {item_id} (version {version}).")
+
+    def _store_sharers(self):
+        """This manager and every instance manager using the same object stores (see core/instances.py)."""
+        owner = self.store_owner or self
+        return [owner] + [manager for manager in owner.get_instances().values() if manager.store_owner is owner]
+
+    def find_written_through(self, profile_name):
+        """
+        Finds stored objects that something wrote into in place through a profile's links (the
+        game, a mod, or a patcher that rewrites files instead of replacing them), which changes
+        every profile sharing them. Only files touched since the file index was written are
+        looked at, and only ones that are still the stored object are hashed.
+        Returns {digest: [files of this profile]}.
+        """
+        profile_path = self.get_profile_path(profile_name)
+        files = read_file_index(profile_path)
+        if not files:
+            return {}
+        store = self.get_object_store(profile_path)
+        since = os.stat(os.path.join(profile_path, FILE_INDEX)).st_mtime_ns
+        game_files = os.path.join(profile_path, 'GameFiles')
+        written, checked = {}, {}
+        for rel, entry in files.items():
+            try:
+                st = os.stat(os.path.join(game_files, *rel.split('/')))
+                if st.st_mtime_ns <= since and st.st_size == entry[0]:
+                    continue
+                obj = os.stat(store.object_path(entry[2]))
+            except FileNotFoundError:
+                continue
+            if (obj.st_ino, obj.st_dev) != (st.st_ino, st.st_dev):
+                continue # Replaced by a new file; the object itself is untouched.
+            if entry[2] not in checked:
+                checked[entry[2]] = store.hash_file(store.object_path(entry[2])) != entry[2]
+            if checked[entry[2]]:
+                written.setdefault(entry[2], []).append(rel)
+        return written
+
+    def needs_written_through_check(self, profile_name):
+        """
+        True if nothing stops writes into the profile's shared files (its store doesn't use
+        read-only objects), so after it was live, repair_written_through() should look at it.
+        """
+        return not self.get_object_store(self.get_profile_path(profile_name)).read_only
+
+    def repair_written_through(self, profile_name):
+        """
+        Cleans up after find_written_through(): each changed object leaves the store (the
+        profile's own changed files become plain files that update_profile() stores anew), and
+        every other profile with that file is re-linked to a copy rebuilt from a stored delta.
+        Where no delta exists the original is lost; those profiles get their files recorded
+        as 'damaged_files' in the profile index (like the profile itself) until they verify
+        clean again or are updated.
+        Returns {'objects', 'rebuilt', 'damaged': {profile: [files]}}.
+        """
+        written = self.find_written_through(profile_name)
+        if not written:
+            return {'objects': 0, 'rebuilt': 0, 'damaged': {}}
+        profile_path = self.get_profile_path(profile_name)
+        store = self.get_object_store(profile_path)
+        # Until update_profile() stores them anew, the profile itself no longer matches its index either.
+        self.get_profile_index().record(profile_name, damaged_files=sorted(rel for rels in written.values() for rel in rels))
+        rebuilt = set()
+        for digest, rels in written.items():
+            print(f"Warning: '{rels[0]}' of {profile_name} was modified in place; evicting its stored object.")
+            os.remove(store.object_path(digest))
+            if store.has_delta(digest):
+                try:
+                    store.materialize(digest)
+                    rebuilt.add(digest)
+                except (OSError, ValueError) as e:
+                    print(f"Could not rebuild {digest} from its delta: {e}")
+
+        damaged = {}
+        for manager in self._store_sharers():
+            for name in manager.get_stored_versions():
+                other_path = manager.get_profile_path(name)
+                if other_path == profile_path or manager.is_archived(name) \
+                        or manager.get_object_store(other_path).root != store.root:
+                    continue
+                lost = []
+                for rel, entry in (read_file_index(other_path) or {}).items():
+                    if entry[2] not in written:
+                        continue
+                    dest = os.path.join(other_path, 'GameFiles', *rel.split('/'))
+                    if entry[2] in rebuilt:
+                        store.link(entry[2], dest)
+                    elif os.path.exists(dest):
+                        lost.append(rel)
+                if lost:
+                    print(f"Warning: {len(lost)} files of {name} were changed through {profile_name} "
+                          f"and can't be rebuilt, e.g. '{lost[0]}'. Verify it, or store it again from Steam.")
+                    manager.get_profile_index().record(name, damaged_files=lost)
+                    damaged[name] = lost
+        return {'objects': len(written), 'rebuilt': len(rebuilt), 'damaged': damaged}
+
+    @trace.traced('verify', 'profile_name')
+    def verify_profile(self, profile_name, progress=None, use_cache=True):
+        """
+        Hashes a profile's game files on all cores and compares them with the file index
+        written when it was captured. Files unchanged since they were last verified are
+        skipped unless use_cache is False. Returns the report from verify_profile_files().
+        """
+        profile_path = self.get_profile_path(profile_name)
+        if not os.path.exists(profile_path):
+            raise FileNotFoundError(f"Profile '{profile_name}' not found.")
+        if self.is_archived(profile_name):
+            raise ValueError(f"Profile '{profile_name}' is archived. Restore it first.")
+        if not self.is_materialized(profile_name):
+            raise ValueError(f"Profile '{profile_name}' is stored as deltas. Materialize it first.")
+        from core.verify import verify_profile_files
+        print(f"Verifying {profile_name}...")
+        result = verify_profile_files(profile_path, progress, use_cache)
+        if result['ok']:
+            self.get_profile_index().record(profile_name, damaged_files=None)
+        print(f"Verified {result['files']} files ({result['hashed']} hashed, {result['cached']} unchanged) "
+              f"in {result['seconds']:.1f}s: {len(result['missing'])} missing, {len(result['corrupt'])} corrupt.")
+        return result
+
+    @trace.traced('switch', 'profile_name')
+    def switch_to_version(self, profile_name, progress=None):
+        """
+        Switches the active version to the selected profile by swapping symlinks and manifest.
+        The new links and manifest are built next to their targets first and then renamed into
+        place, so the switch costs a handful of syscalls whatever the size of the install.
+        A journal lets recover_interrupted_switch() finish or undo a switch that was cut short.
+        Archived profiles are restored and delta profiles materialized first. With
+        'verify_before_switch' set in the config, a profile whose files don't match their
+        hashes is refused. Without read-only objects, check the profile switched away from
+        with repair_written_through() afterwards (see needs_written_through_check()); that
+        reads the whole profile, so it's left to a job of its own.
+        """
+        profile_path = self.get_profile_path(profile_name)
+        if not os.path.exists(profile_path):
+            raise FileNotFoundError(f"Profile '{profile_name}' not found.")
+        self.recover_interrupted_switch()
+        active_profile = self.get_active_profile()
+        if active_profile:
+            self._keep_live_workshop(active_profile)
+        if self.is_archived(profile_name):
+            self.restore_profile(profile_name, progress)
+        self.materialize_profile(profile_name, progress=progress)
+        # Profiles stored before file indexes existed have nothing to verify against.
+        if self.verify_before_switch and os.path.exists(os.path.join(profile_path, FILE_INDEX)):
+            result = self.verify_profile(profile_name, progress)
+            if not result['ok']:
+                raise ValueError(f"Profile '{profile_name}' failed verification: {len(result['missing'])} missing "
+                                 f"and {len(result['corrupt'])} corrupt files. Not switching.")
+        damaged = next((info.get('damaged_files') for info in self.get_profile_infos() if info['name'] == profile_name), None)
+        if damaged:
+            print(f"Warning: {len(damaged)} files of {profile_name} were changed through another version, "
+                  f"e.g. '{damaged[0]}'.")
+
+        items = [
+            {'kind': 'link', 'source': os.path.join(profile_path, 'GameFiles'),
+             'target': self.get_game_install_path()},
+            {'kind': 'link', 'source': os.path.join(profile_path, 'UserData'),
+             'target': self.zomboid_user_path},
+            {'kind': 'file', 'source': os.path.join(profile_path, 'manifest.acf'),
+             'target': self.get_manifest_path()},
+        ]
+        workshop_links = os.path.join(profile_path, 'Workshop')
+        if self.manage_workshop and os.path.isdir(workshop_links):
+            # Profiles captured without Workshop data leave the Workshop folder as it is.
+            items.append({'kind': 'link', 'source': workshop_links, 'target': self.get_workshop_content_path()})
+            if os.path.exists(os.path.join(profile_path, 'appworkshop.acf')):
+                items.append({'kind': 'file', 'source': os.path.join(profile_path, 'appworkshop.acf'),
+                              'target': self.get_workshop_manifest_path()})
+        for item in items:
+            item['target'] = os.path.normpath(item['target'])
+            item['staged'] = item['target'] + self.STAGING_SUFFIX
+        journal = {'profile': profile_name, 'state': 'staging', 'items': items}
+        self._write_switch_journal(journal)
+
+        # 1. Stage the new symlinks and manifest next to their targets (nothing live changes yet)
+        with trace.span('switch.stage', items=len(items)):
+            for item in items:
+                self._remove_staged(item['staged'])
+                os.makedirs(os.path.dirname(item['target']), exist_ok=True)
+                if item['kind'] == 'link':
+                    self._make_dir_link(os.path.normpath(item['source']), item['staged'])
+                else:
+                    with trace.span('manifest.copy', path=item['source']):
+                        shutil.copy2(item['source'], item['staged'])
+
+        # 2. Move everything into place
+        with trace.span('switch.commit', items=len(items)):
+            journal['state'] = 'committing'
+            self._write_switch_journal(journal)
+            self._commit_switch(journal)
+        self.get_profile_index().record(profile_name, last_used=time.time())
         print(f"Switched to {profile_name}.")
-    
+        if self.prewarm_after_switch:
+            self.prewarm_profile(profile_name)
+
+    def prewarm_profile(self, profile_name):
+        """
+        Starts pulling the profile's hot set (its recorded launch files, latest save, and so
+        on; see core.prewarm) into the page cache on a background thread, so the first launch
+        after a switch doesn't wait on a cold disk. It reads at most 'prewarm_rate_mb' MB/s
+        and 'prewarm_limit_mb' MB in total. Stops an earlier pre-warm. Returns the Prewarmer.
+        """
+        from core.prewarm import Prewarmer, build_hot_set, read_hot_set
+        self.stop_prewarm()
+        profile_path = self.get_profile_path(profile_name)
+        limit = self.config.get('prewarm_limit_mb', 4096) * 1024 * 1024
+        rate = self.config.get('prewarm_rate_mb', 200) * 1024 * 1024
+
+        def hot_set():
+            # Finding it walks the whole (cold) profile, so that happens on the background thread too.
+            return build_hot_set(os.path.join(profile_path, 'GameFiles'), os.path.join(profile_path, 'UserData'),
+                                 read_hot_set(profile_path), limit)
+        print(f"Pre-warming {profile_name} in the background.")
+        self._prewarmer = Prewarmer(hot_set, rate).start()
+        return self._prewarmer
+
+    def stop_prewarm(self):
+        if self._prewarmer is not None:
+            self._prewarmer.stop()
+            self._prewarmer = None
+
+    def record_launch(self, seconds=120):
+        """
+        Starts noting which game files the active version opens during the next 'seconds'
+        (call it when launching the game), so later pre-warms fetch exactly those first.
+        Returns the LaunchRecorder, or None if no stored version is active.
+        """
+        from core.prewarm import LaunchRecorder
+        profile_name = self.get_active_profile()
+        if not profile_name:
+            return None
+        self.stop_launch_recording()
+        self._launch_recorder = LaunchRecorder(self.get_profile_path(profile_name), seconds).start()
+        return self._launch_recorder
+
+    def stop_launch_recording(self):
+        if self._launch_recorder is not None:
+            self._launch_recorder.stop()
+            self._launch_recorder = None
+
+    def recover_interrupted_switch(self):
+        """
+        Finishes or undoes a switch that was interrupted (crash, power loss, closed app).
+        A switch that was still staging is rolled back, one that was committing is rolled forward.
+        Returns a short description of what was done, or None if there was nothing to recover.
+        """
+        journal = self._read_switch_journal()
+        if journal is None:
+            return None
+        if journal['state'] == 'committing':
+            self._commit_switch(journal)
+            return f"Finished interrupted switch to '{journal['profile']}'."
+        for item in journal['items']:
+            self._remove_staged(item['staged'])
+        self._clear_switch_journal()
+        return f"Rolled back interrupted switch to '{journal['profile']}'."
+
+    def _commit_switch(self, journal):
+        # Items whose staged copy is gone were already moved into place before an interruption.
+        for item in journal['items']:
+            if os.path.lexists(item['staged']):
+                self._replace_with_staged(item['staged'], item['target'])
+        self._clear_switch_journal()
+
+    def _replace_with_staged(self, staged, target):
+        """Atomically puts a staged link or file in place of 'target'."""
+        if os.path.isdir(target) and not os.path.islink(target):
+            # Real data (e.g. a fresh Steam download) is never deleted here, only set aside.
+            self._quarantine(target)
+        import platform
+        if platform.system() == "Windows" and os.path.islink(target):
+            # Windows can't rename over a directory link, so swap it out in two quick renames.
+            old_link = target + '.pzvm-old'
+            os.rename(target, old_link)
+            os.rename(staged, target)
+            os.unlink(old_link)
+        else:
+            os.replace(staged, target)
+
+    def _quarantine(self, path):
+        """Renames a real folder out of the way (same drive, so it's instant) instead of deleting it."""
+        quarantine_path = (f"{path}{self.QUARANTINE_SUFFIX}-{time.strftime('%Y%m%d-%H%M%S')}"
+                           f"-{os.getpid()}-{next(self._quarantine_ids)}")
+        os.rename(path, quarantine_path)
+        print(f"Moved '{path}' aside to '{quarantine_path}'.")
+        return quarantine_path
+
+    def get_quarantined_paths(self):
+        """Lists folders that a switch or unlink moved aside instead of deleting."""
+        paths = []
+        for target in (self.get_game_install_path(), self.zomboid_user_path, self.get_workshop_content_path()):
+            parent, name = os.path.split(os.path.normpath(target))
+            if os.path.isdir(parent):
+                paths += [os.path.join(parent, entry) for entry in os.listdir(parent)
+                          if entry.startswith(name + self.QUARANTINE_SUFFIX)]
+        return paths
+
+    def purge_quarantine(self, progress=None):
+        """
+        Deletes quarantined folders. This is the slow part of a switch or unlink that set a
+        folder aside, so it runs as a job of its own after them. Returns the deleted paths.
+        """
+        paths = self.get_quarantined_paths()
+        if progress:
+            progress.start_phase("Deleting set-aside folders", 0, len(paths))
+        for path in paths:
+            if progress:
+                progress.check_cancelled()
+            shutil.rmtree(path)
+            print(f"Deleted '{path}'.")
+            if progress:
+                progress.advance(0, 1)
+        if progress:
+            progress.finish_phase()
+        return paths
+
+    @staticmethod
+    def _remove_staged(path):
+        if os.path.islink(path):
+            os.unlink(path)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+    def _get_switch_journal_path(self):
+        return os.path.join(self.manager_path, self.SWITCH_JOURNAL)
+
+    def _read_switch_journal(self):
+        if not self.manager_path or not os.path.exists(self._get_switch_journal_path()):
+            return None
+        with open(self._get_switch_journal_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_switch_journal(self, journal):
+        self._write_journal_file(self._get_switch_journal_path(), journal)
+
+    @staticmethod
+    def _write_journal_file(path, journal):
+        """Writes a journal durably: synced to disk, then renamed over the old one."""
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(journal, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _clear_switch_journal(self):
+        if os.path.exists(self._get_switch_journal_path()):
+            os.remove(self._get_switch_journal_path())
+
+    @trace.traced('unlink')
     def _remove_symlinks_and_manifest(self):
         """A helper function to safely remove the current symlinks and manifest file."""
         game_path = self.get_game_install_path()
         user_path = self.zomboid_user_path
         manifest_path = self.get_manifest_path()
+        active_profile = self.get_active_profile()
+        if active_profile:
+            self._keep_live_workshop(active_profile)
 
         # Safely remove directory/symlink
         def safe_remove(path):
@@ -126,18 +1648,39 @@ class VersionManager:
             if os.path.islink(path):
                 os.unlink(path)
             elif os.path.isdir(path):
-                shutil.rmtree(path)
+                # A real folder may be a version that was never stored; keep it aside instead.
+                self._quarantine(path)
 
         safe_remove(game_path)
         safe_remove(user_path)
+
+        # Only unlink Workshop mods the manager linked in; a real Workshop folder is Steam's.
+        workshop_path = self.get_workshop_content_path()
+        if os.path.islink(workshop_path):
+            os.unlink(workshop_path)
+            if os.path.exists(self.get_workshop_manifest_path()):
+                os.remove(self.get_workshop_manifest_path())
         
         if os.path.exists(manifest_path):
             os.remove(manifest_path)
 
-    # --- THIS FUNCTION IS THE ONLY ONE THAT CHANGED ---
+    @staticmethod
+    @trace.traced('link.create', 'target')
+    def _make_dir_link(source, target):
+        """Creates a directory symlink at 'target' pointing to 'source'."""
+        import platform
+        if platform.system() == "Windows":
+            import subprocess
+            # On Windows, we build the full command as a string to pass to the shell,
+            # which correctly handles quotes around paths with spaces.
+            # shell=True is needed here to process the command correctly.
+            subprocess.run(f'mklink /D "{target}" "{source}"', check=True, shell=True, capture_output=True)
+        else: # Linux/macOS
+            os.symlink(source, target, target_is_directory=True)
+
     def _create_symlinks(self, profile_name):
         """A helper function to create the symlinks for a given profile."""
-        profile_path = os.path.join(self.manager_path, profile_name)
+        profile_path = self.get_profile_path(profile_name)
         
         # Normalize paths to use the correct OS-specific separators (e.g., '\' on Windows)
         source_game_files = os.path.normpath(os.path.join(profile_path, 'GameFiles'))
@@ -145,17 +1688,6 @@ class VersionManager:
         
         target_game_files = os.path.normpath(self.get_game_install_path())
         target_user_data = os.path.normpath(self.zomboid_user_path)
-        
-        system = platform.system()
-        if system == "Windows":
-            # On Windows, we build the full command as a string to pass to the shell,
-            # which correctly handles quotes around paths with spaces.
-            cmd_game = f'mklink /D "{target_game_files}" "{source_game_files}"'
-            cmd_user = f'mklink /D "{target_user_data}" "{source_user_data}"'
-            
-            # shell=True is needed here to process the command correctly.
-            subprocess.run(cmd_game, check=True, shell=True, capture_output=True)
-            subprocess.run(cmd_user, check=True, shell=True, capture_output=True)
-        else: # Linux/macOS
-            os.symlink(source_game_files, target_game_files, target_is_directory=True)
-            os.symlink(source_user_data, target_user_data, target_is_directory=True)
\ No newline at end of file
+
+        self._make_dir_link(source_game_files, target_game_files)
+        self._make_dir_link(source_user_data, target_user_data)
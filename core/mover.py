@@ -0,0 +1,239 @@
+# core/mover.py
+
+import os
+import time
+import shutil
+
+from core import trace
+from core.copier import CopyEngine
+from core.scanner import TreeScanner
+
+# Tiny files are handed to the copy threads in batches, so that thread hand-off and
+# future bookkeeping don't cost more than copying a 2 KB save chunk does.
+BATCH_FILES = 128
+BATCH_BYTES = 4 * 1024 * 1024
+# FAT/exFAT drives keep mtimes to 2 seconds, so a copied file's mtime may be rounded.
+MTIME_TOLERANCE_NS = 2_000_000_000
+VERIFY_CHUNK = 1024 * 1024
+
+def _batches(files):
+    """Groups (rel, size, mtime_ns) entries into (batch size, batch) jobs for CopyEngine.run()."""
+    batch, batch_bytes = [], 0
+    for entry in files:
+        if entry[1] >= BATCH_BYTES:
+            yield entry[1], [entry]
+            continue
+        batch.append(entry)
+        batch_bytes += entry[1]
+        if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+            yield batch_bytes, batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch_bytes, batch
+
+def _matches(path, size, mtime_ns):
+    st = os.stat(path)
+    return st.st_size == size and abs(st.st_mtime_ns - mtime_ns) <= MTIME_TOLERANCE_NS
+
+def _same_content(path, other_path):
+    """True if the two files hold the same bytes."""
+    with open(path, 'rb') as f, open(other_path, 'rb') as other:
+        while True:
+            chunk = f.read(VERIFY_CHUNK)
+            if chunk != other.read(VERIFY_CHUNK):
+                return False
+            if not chunk:
+                return True
+
+@trace.traced('move', 'source', 'dest')
+def move_tree(source, dest, engine=None, progress=None):
+    """
+    Moves the folder 'source' to 'dest'. On the same device that's a single rename.
+    Across devices the files are copied on many threads in batches, compared with the
+    source byte for byte, and only then deleted from the source. If 'dest' already
+    exists (an earlier move was interrupted), files that already arrived are skipped.
+    Returns {'method', 'files', 'bytes', 'timings'} with the seconds spent in each phase.
+    """
+    timings = {}
+    started = time.perf_counter()
+    if os.path.islink(source):
+        shutil.move(source, dest) # Moves the link itself, not what it points to.
+        timings['rename'] = time.perf_counter() - started
+        trace.current().set(method='rename')
+        return {'method': 'rename', 'files': None, 'bytes': None, 'timings': timings}
+    if not os.path.exists(dest) and os.stat(source).st_dev == os.stat(os.path.dirname(dest)).st_dev:
+        os.rename(source, dest)
+        timings['rename'] = time.perf_counter() - started
+        trace.current().set(method='rename')
+        return {'method': 'rename', 'files': None, 'bytes': None, 'timings': timings}
+
+    engine = engine or CopyEngine()
+    scan = TreeScanner().scan(source, use_cache=False)
+    for rel_dir in scan.dirs:
+        os.makedirs(os.path.normpath(os.path.join(dest, rel_dir)), exist_ok=True)
+    timings['scan'] = time.perf_counter() - started
+    jobs = list(_batches(scan.files))
+    if scan.files:
+        engine.detect_strategy(os.path.join(source, scan.files[0][0]), dest)
+
+    started = time.perf_counter()
+    if progress:
+        progress.start_phase("Moving user data", scan.total_size, scan.file_count)
+
+    def copy_batch(batch):
+        for rel, size, mtime_ns in batch:
+            dst = os.path.join(dest, rel)
+            try:
+                arrived = _matches(dst, size, mtime_ns)
+            except FileNotFoundError:
+                arrived = False
+            if not arrived:
+                engine.copy_file(os.path.join(source, rel), dst)
+            if progress:
+                progress.advance(size, 1)
+
+    engine.run(copy_batch, jobs)
+    if progress:
+        progress.finish_phase()
+    timings['copy'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    mismatched = []
+    def verify_batch(batch):
+        for rel, size, mtime_ns in batch:
+            # Size and mtime prove nothing here: the copy got them from the source.
+            dst = os.path.join(dest, rel)
+            if not (_matches(dst, size, mtime_ns) and _same_content(os.path.join(source, rel), dst)):
+                os.remove(dst) # So that moving again copies it afresh instead of skipping it.
+                mismatched.append(rel)
+
+    engine.run(verify_batch, jobs)
+    if mismatched:
+        raise OSError(f"{len(mismatched)} copied files (e.g. '{mismatched[0]}') don't match the originals; "
+                      f"the source was left in place.")
+    timings['verify'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    def delete_batch(batch):
+        for rel, _, _ in batch:
+            os.remove(os.path.join(source, rel))
+
+    engine.run(delete_batch, jobs)
+    # Whatever the scan skipped (links) or didn't see yet (files written since) is moved the
+    # same way: nothing leaves the source before its copy compared equal.
+    dirs, links, files = _list_tree(source)
+    for rel in sorted(dirs):
+        os.makedirs(os.path.join(dest, rel), exist_ok=True)
+    for rel, target in links.items():
+        link_path = os.path.join(dest, rel)
+        if os.path.islink(link_path):
+            os.remove(link_path)
+        os.symlink(target, link_path, target_is_directory=os.path.isdir(os.path.join(source, rel)))
+        os.remove(os.path.join(source, rel))
+
+    def move_batch(batch):
+        for rel, _, _ in batch:
+            src, dst = os.path.join(source, rel), os.path.join(dest, rel)
+            engine.copy_file(src, dst)
+            if _same_content(src, dst):
+                os.remove(src)
+            else:
+                os.remove(dst)
+                mismatched.append(rel)
+
+    engine.run(move_batch, _batches(files))
+    if mismatched:
+        raise OSError(f"'{mismatched[0]}' changed while it was being moved; it was left in the source.")
+    # Only empty folders are left now; os.rmdir() refuses any that something was written to meanwhile.
+    for dirpath, _, _ in os.walk(source, topdown=False):
+        try:
+            os.rmdir(dirpath)
+        except OSError as e:
+            raise OSError(f"'{dirpath}' got new files during the move; move again to finish.") from e
+    timings['delete'] = time.perf_counter() - started
+    trace.current().set(method='copy', files=scan.file_count, bytes=scan.total_size,
+                        **{f'{phase}_seconds': seconds for phase, seconds in timings.items()})
+    return {'method': 'copy', 'files': scan.file_count, 'bytes': scan.total_size, 'timings': timings}
+
+def _list_tree(root, skip=()):
+    """Returns (folders, links {rel: target}, files [(rel, size, mtime_ns)]) under 'root', without following links."""
+    dirs, links, files = set(), {}, []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        if rel_dir == '.':
+            dirnames[:] = [name for name in dirnames if name not in skip]
+            filenames = [name for name in filenames if name not in skip]
+        for name in dirnames + filenames:
+            rel = os.path.normpath(os.path.join(rel_dir, name))
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path):
+                links[rel] = os.readlink(path)
+            elif name in dirnames:
+                dirs.add(rel)
+            else:
+                st = os.stat(path)
+                files.append((rel, st.st_size, st.st_mtime_ns))
+    return dirs, links, files
+
+@trace.traced('mirror', 'source', 'dest')
+def mirror_tree(source, dest, engine=None, skip=(), throttle=None, progress=None):
+    """
+    Makes 'dest' an exact copy of the folder 'source': files whose size or mtime differ are
+    copied, links are re-created as links, and whatever 'source' doesn't have is deleted.
+    Running it again after changes only copies the changes. Top-level entries named in
+    'skip' are left alone on both sides. 'throttle' (a core.storage.Throttle) caps the
+    copy rate. Returns the number of files copied.
+    """
+    engine = engine or CopyEngine()
+    dirs, links, files = _list_tree(source, skip)
+    for rel in sorted(dirs):
+        os.makedirs(os.path.join(dest, rel), exist_ok=True)
+    for rel, target in links.items():
+        link_path = os.path.join(dest, rel)
+        if os.path.islink(link_path) and os.readlink(link_path) == target:
+            continue
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        os.symlink(target, link_path, target_is_directory=os.path.isdir(os.path.join(source, rel)))
+
+    copied = []
+    if progress:
+        progress.start_phase("Copying profile data", sum(entry[1] for entry in files), len(files))
+
+    def copy_batch(batch):
+        for rel, size, mtime_ns in batch:
+            dst = os.path.join(dest, rel)
+            try:
+                arrived = not os.path.islink(dst) and _matches(dst, size, mtime_ns)
+            except FileNotFoundError:
+                arrived = False
+            if not arrived:
+                if throttle:
+                    throttle.consume(size)
+                if os.path.islink(dst):
+                    os.remove(dst)
+                engine.copy_file(os.path.join(source, rel), dst)
+                copied.append(rel)
+            if progress:
+                progress.advance(size, 1)
+
+    engine.run(copy_batch, _batches(files))
+    if progress:
+        progress.finish_phase()
+
+    # Drop what the source doesn't have (anymore).
+    keep = dirs | set(links) | {entry[0] for entry in files}
+    for dirpath, dirnames, filenames in os.walk(dest):
+        rel_dir = os.path.relpath(dirpath, dest)
+        names = [name for name in dirnames + filenames if rel_dir != '.' or name not in skip]
+        for name in names:
+            if os.path.normpath(os.path.join(rel_dir, name)) in keep:
+                continue
+            path = os.path.join(dirpath, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        dirnames[:] = [name for name in dirnames if name in names and os.path.isdir(os.path.join(dirpath, name))]
+    trace.current().set(files=len(files), copied=len(copied))
+    return len(copied)
@@ -0,0 +1,253 @@
+# core/prewarm.py
+
+"""
+Page cache pre-warming. A stored version that hasn't been played for weeks is cold on
+disk, so the first launch after switching to it waits on thousands of random reads.
+Right after a switch a Prewarmer asks the OS to read the version's hot set into the page
+cache in the background, at a limited rate so the rest of the system stays responsive.
+
+The hot set is learned: a LaunchRecorder watches which game files the game opens while
+it starts and stores that list with the profile. The most recently played save and the
+usual heavy hitters (jars, texture and sound packs) come next.
+"""
+
+import os
+import json
+import time
+import fnmatch
+import platform
+import threading
+
+from core import trace
+
+HOT_SET_FILE = 'hotset.json'
+# Files that every launch reads, for profiles without a recorded launch.
+HOT_PATTERNS = ('*.jar', '*.pack', '*.bank', '*.so', '*.dll')
+CHUNK_SIZE = 8 * 1024 * 1024
+
+def read_hot_set(profile_path):
+    """Returns the recorded launch files of a profile (paths relative to GameFiles), or []."""
+    try:
+        with open(os.path.join(profile_path, HOT_SET_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', [])
+    except FileNotFoundError:
+        return []
+
+def write_hot_set(profile_path, files):
+    path = os.path.join(profile_path, HOT_SET_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'recorded_at': time.time(), 'files': files}, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+def _walk_files(root):
+    """Yields (path, stat) for every file under 'root'."""
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                yield path, os.stat(path)
+            except OSError:
+                pass
+
+def latest_save(user_data_path):
+    """The folder of the most recently played save ('Saves/<mode>/<save>'), or None."""
+    saves = os.path.join(user_data_path, 'Saves')
+    newest, newest_mtime = None, 0
+    if not os.path.isdir(saves):
+        return None
+    for mode in os.listdir(saves):
+        mode_path = os.path.join(saves, mode)
+        if not os.path.isdir(mode_path):
+            continue
+        for save in os.listdir(mode_path):
+            save_path = os.path.join(mode_path, save)
+            mtime = os.stat(save_path).st_mtime
+            if os.path.isdir(save_path) and mtime > newest_mtime:
+                newest, newest_mtime = save_path, mtime
+    return newest
+
+def build_hot_set(game_files, user_data=None, recorded=(), limit_bytes=None):
+    """
+    Returns the files worth pre-warming, most important first, up to 'limit_bytes' in total:
+    the recorded launch files, the latest save, then files matching HOT_PATTERNS (biggest
+    first). Access times don't help here: storing a profile reads every file, and the
+    files are hardlinks shared with other profiles, so reading one there touches them too.
+    """
+    hot, seen = [], set()
+    total = 0
+
+    def take(path, size):
+        nonlocal total
+        if path in seen or (limit_bytes is not None and total + size > limit_bytes):
+            return
+        seen.add(path)
+        hot.append(path)
+        total += size
+
+    for rel in recorded:
+        path = os.path.join(game_files, *rel.split('/'))
+        if os.path.isfile(path):
+            take(path, os.path.getsize(path))
+    save = latest_save(user_data) if user_data else None
+    if save:
+        for path, st in _walk_files(save):
+            take(path, st.st_size)
+
+    matching = sorted((entry for entry in _walk_files(game_files)
+                       if any(fnmatch.fnmatch(os.path.basename(entry[0]), pattern) for pattern in HOT_PATTERNS)),
+                      key=lambda entry: entry[1].st_size, reverse=True)
+    for path, st in matching:
+        take(path, st.st_size)
+    return hot
+
+class Prewarmer:
+    """
+    Pulls files into the OS page cache on a background thread, at most 'rate' bytes per
+    second (None for no limit). On Linux it only hints the kernel (posix_fadvise WILLNEED),
+    which then reads ahead on its own; elsewhere the files are read and the data dropped.
+    'paths' may also be a function returning the files, called on that thread, so that
+    finding them (see build_hot_set()) doesn't hold up the caller either.
+    """
+
+    def __init__(self, paths, rate=None, chunk_size=CHUNK_SIZE):
+        self.paths = paths if callable(paths) else list(paths)
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='prewarm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        started = time.perf_counter()
+        if callable(self.paths):
+            with trace.span('prewarm.hot_set'):
+                self.paths = list(self.paths())
+        with trace.span('prewarm', files=len(self.paths)) as span:
+            for path in self.paths:
+                if self._stop.is_set():
+                    break
+                try:
+                    self._warm(path, started)
+                except OSError:
+                    continue # Gone or unreadable; it only would have been a hint anyway.
+                self.files += 1
+            span.add(bytes=self.bytes)
+        self.seconds = time.perf_counter() - started
+
+    def _warm(self, path, started):
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            size = os.fstat(fd).st_size
+            offset = 0
+            while offset < size and not self._stop.is_set():
+                length = min(self.chunk_size, size - offset)
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+                else:
+                    os.lseek(fd, offset, os.SEEK_SET)
+                    remaining = length
+                    while remaining > 0:
+                        data = os.read(fd, min(remaining, 1024 * 1024))
+                        if not data:
+                            break
+                        remaining -= len(data)
+                offset += length
+                self.bytes += length
+                if self.rate:
+                    # Stay under the rate on average; wait() also returns early on stop().
+                    ahead = self.bytes / self.rate - (time.perf_counter() - started)
+                    if ahead > 0:
+                        self._stop.wait(ahead)
+        finally:
+            os.close(fd)
+
+class LaunchRecorder:
+    """
+    Learns a profile's hot set: for 'seconds' after the game is launched, it notes which of
+    the files under 'game_files' get opened, from /proc (Linux) and from access times.
+    The result is saved with the profile, for build_hot_set() to put first.
+    """
+
+    def __init__(self, profile_path, seconds=120, poll_interval=1.0):
+        self.profile_path = profile_path
+        self.game_files = os.path.realpath(os.path.join(profile_path, 'GameFiles'))
+        self.seconds = seconds
+        self.poll_interval = poll_interval
+        self.files = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='launch-recorder', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops recording early; what was seen so far is still saved."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 5)
+            self._thread = None
+
+    def run(self):
+        before = {path: st.st_atime_ns for path, st in _walk_files(self.game_files)}
+        opened = []
+        seen = set()
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline and not self._stop.wait(self.poll_interval):
+            for path in self._open_game_files():
+                if path not in seen:
+                    seen.add(path)
+                    opened.append(path)
+        # Files read and closed again between two polls only show up in their access times.
+        for path, st in _walk_files(self.game_files):
+            if path not in seen and st.st_atime_ns > before.get(path, st.st_atime_ns):
+                seen.add(path)
+                opened.append(path)
+        self.files = [os.path.relpath(path, self.game_files).replace(os.sep, '/') for path in opened]
+        if self.files:
+            write_hot_set(self.profile_path, self.files)
+
+    def _open_game_files(self):
+        """Game files that any process has open or mapped right now (Linux only)."""
+        if platform.system() != "Linux":
+            return []
+        prefix = os.path.join(self.game_files, '')
+        found = []
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            try:
+                for fd in os.listdir(f'/proc/{pid}/fd'):
+                    target = os.readlink(f'/proc/{pid}/fd/{fd}')
+                    if target.startswith(prefix):
+                        found.append(target)
+                with open(f'/proc/{pid}/maps', 'r', encoding='utf-8', errors='replace') as f:
+                    for line in f:
+                        target = line.split(None, 5)[-1].strip()
+                        if target.startswith(prefix):
+                            found.append(target)
+            except OSError:
+                continue # Exited meanwhile, or not ours to look at.
+        return found
@@ -0,0 +1,157 @@
+# core/profiles.py
+
+import os
+import json
+import time
+import threading
+
+from core import trace
+from core.progress import format_size
+from core.store import FILE_INDEX
+
+def read_appstate(manifest_path):
+    """Returns the 'AppState' section of a Steam appmanifest file."""
+    import vdf # For parsing Steam's appmanifest; imported here as only a cache miss needs it.
+    with trace.span('vdf.parse', path=manifest_path), open(manifest_path, 'r', encoding='utf-8') as f:
+        data = vdf.load(f)
+    return data.get('AppState', {})
+
+def read_manifest_info(manifest_path):
+    """Returns (build_id, beta_key) from a Steam appmanifest file."""
+    appstate = read_appstate(manifest_path)
+    return appstate.get('buildid', 'Unknown Build'), appstate.get('UserConfig', {}).get('BetaKey')
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+class ProfileIndex:
+    """
+    Cached metadata (build id, beta key, size, file count, capture and last-used times)
+    for every stored profile, so the UI can list profiles without walking or parsing them.
+    Entries are re-read only when the file they came from has a new mtime:
+    the storage roots (profiles added/removed), manifest.acf, and files.json.
+    Profiles can live in the manager folder or any of the 'extra_roots' (see core.storage);
+    each entry records its 'root'. The index itself is kept in the manager folder.
+    """
+    INDEX_FILE = os.path.join('.cache', 'profiles.json')
+
+    def __init__(self, manager_path, extra_roots=()):
+        self.manager_path = manager_path
+        self.roots = [manager_path] + [root for root in extra_roots if root != manager_path]
+        self.path = os.path.join(manager_path, self.INDEX_FILE)
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {'profiles': {}}
+            self._data.setdefault('root_mtimes', {})
+        return self._data
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, indent=4)
+        os.replace(self.path + '.tmp', self.path)
+
+    def _refresh_names(self, data):
+        """Re-lists the storage roots, but only if their mtimes say something was added or removed."""
+        root_mtimes = {root: _mtime_ns(root) for root in self.roots}
+        if None not in root_mtimes.values() and root_mtimes == data['root_mtimes']:
+            return False
+        found = {}
+        for root in self.roots:
+            if os.path.isdir(root):
+                # Dot-folders (e.g. the shared '.store') belong to the manager, not to a profile.
+                for name in os.listdir(root):
+                    if not name.startswith('.') and os.path.isdir(os.path.join(root, name)):
+                        found.setdefault(name, root) # The first root wins, like StoragePool.find().
+        profiles = data['profiles']
+        data['profiles'] = {name: dict(profiles.get(name, {}), root=root) for name, root in found.items()}
+        data['root_mtimes'] = root_mtimes
+        return True
+
+    def _refresh_entry(self, name, entry):
+        """Brings one profile's metadata up to date. Returns True if anything was re-read."""
+        profile_path = os.path.join(entry.get('root') or self.manager_path, name)
+        changed = False
+
+        manifest_path = os.path.join(profile_path, 'manifest.acf')
+        manifest_mtime = _mtime_ns(manifest_path)
+        if manifest_mtime != entry.get('manifest_mtime'):
+            entry['build_id'], entry['beta_key'] = None, None
+            if manifest_mtime is not None:
+                try:
+                    entry['build_id'], entry['beta_key'] = read_manifest_info(manifest_path)
+                except Exception:
+                    pass # A broken manifest shouldn't hide the profile.
+            entry['manifest_mtime'] = manifest_mtime
+            changed = True
+
+        files_path = os.path.join(profile_path, FILE_INDEX)
+        files_mtime = _mtime_ns(files_path)
+        if files_mtime != entry.get('files_mtime'):
+            entry['size'], entry['file_count'] = None, None
+            if files_mtime is not None:
+                with open(files_path, 'r', encoding='utf-8') as f:
+                    files = json.load(f).get('files', {})
+                entry['size'] = sum(file_entry[0] for file_entry in files.values())
+                entry['file_count'] = len(files)
+            entry['files_mtime'] = files_mtime
+            changed = True
+
+        if 'captured_at' not in entry:
+            # Profiles stored before this index existed: the folder's creation is close enough.
+            entry['captured_at'] = os.stat(profile_path).st_ctime
+            entry.setdefault('last_used', None)
+            changed = True
+        return changed
+
+    def get_profiles(self):
+        """Returns a list of metadata dicts (with a 'name' key), sorted by name."""
+        with self._lock:
+            data = self._load()
+            changed = self._refresh_names(data)
+            for name, entry in data['profiles'].items():
+                changed |= self._refresh_entry(name, entry)
+            if changed:
+                self._save()
+            return [dict(entry, name=name) for name, entry in sorted(data['profiles'].items())]
+
+    def record(self, name, **fields):
+        """Stores extra facts about a profile, e.g. record('b41', last_used=time.time())."""
+        with self._lock:
+            data = self._load()
+            data['profiles'].setdefault(name, {}).update(fields)
+            self._save()
+
+def format_age(timestamp):
+    if not timestamp:
+        return "never"
+    seconds = time.time() - timestamp
+    for unit, length in (('day', 86400), ('hour', 3600), ('minute', 60)):
+        if seconds >= length:
+            count = int(seconds // length)
+            return f"{count} {unit}{'s' if count != 1 else ''} ago"
+    return "just now"
+
+def describe_profile(info):
+    """A one-line summary of a profile's metadata, e.g. 'unstable, Build 1234 - 3.1 GB - used 2 days ago'."""
+    parts = []
+    if info.get('build_id'):
+        parts.append(f"{info.get('beta_key') or 'Stable'}, Build {info['build_id']}")
+    if info.get('size') is not None:
+        parts.append(f"{format_size(info['size'])}, {info['file_count']} files")
+    if info.get('archived'):
+        parts.append("archived")
+    if info.get('damaged_files'):
+        parts.append(f"{len(info['damaged_files'])} damaged files")
+    parts.append(f"used {format_age(info.get('last_used'))}")
+    return " - ".join(parts)
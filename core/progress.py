@@ -0,0 +1,128 @@
+# core/progress.py
+
+import time
+import threading
+
+class OperationCancelled(Exception):
+    """Raised inside an operation whose ProgressTracker was cancelled."""
+
+class ProgressTracker:
+    """
+    Thread-safe byte and file counters for a long operation.
+    Any number of copy threads can call advance(); the callback receives a snapshot dict
+    at most once per 'interval' seconds, so reporting never slows down the copy itself.
+    The tracker is also how an operation gets cancelled: after cancel(), the next
+    advance() or start_phase() in any thread raises OperationCancelled.
+    """
+
+    def __init__(self, callback=None, interval=0.25):
+        self.callback = callback
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self.start_phase('')
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def child(self):
+        """A separate tracker for one of several operations run side by side; cancelling this one cancels it too."""
+        child = ProgressTracker()
+        child._cancelled = self._cancelled
+        return child
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise OperationCancelled("The operation was cancelled.")
+
+    def start_phase(self, phase, total_bytes=0, total_files=0):
+        """Resets the counters for a new phase (e.g. 'Storing game files') and reports it."""
+        self.check_cancelled()
+        with self._lock:
+            self.phase = phase
+            self.bytes_total = total_bytes
+            self.files_total = total_files
+            self.bytes_done = 0
+            self.files_done = 0
+            self.rate = None
+            self._started = time.monotonic()
+            self._last_time = self._started
+            self._last_bytes = 0
+            self._next_emit = 0
+        self._emit(force=True)
+
+    def advance(self, nbytes=0, files=0):
+        self.check_cancelled()
+        with self._lock:
+            self.bytes_done += nbytes
+            self.files_done += files
+        if time.monotonic() >= self._next_emit:
+            self._emit()
+
+    def finish_phase(self):
+        """Reports the final state of the current phase, regardless of the rate limit."""
+        self._emit(force=True)
+
+    def snapshot(self):
+        """Returns the current counters plus speed (bytes/s) and ETA (seconds) estimates."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_time
+            if elapsed > 0 and now - self._started > 0.5:
+                # Smooth the speed so one burst of tiny files doesn't make the ETA jump around.
+                current = (self.bytes_done - self._last_bytes) / elapsed
+                self.rate = current if self.rate is None else 0.7 * self.rate + 0.3 * current
+                self._last_time = now
+                self._last_bytes = self.bytes_done
+            eta = None
+            if self.rate and self.bytes_total:
+                eta = max(0.0, (self.bytes_total - self.bytes_done) / self.rate)
+            return {
+                'phase': self.phase,
+                'bytes_done': self.bytes_done,
+                'bytes_total': self.bytes_total,
+                'files_done': self.files_done,
+                'files_total': self.files_total,
+                'fraction': min(1.0, self.bytes_done / self.bytes_total) if self.bytes_total else None,
+                'rate': self.rate,
+                'eta': eta,
+                'elapsed': now - self._started,
+            }
+
+    def _emit(self, force=False):
+        if not self.callback:
+            return
+        # Whoever gets here first reports; everyone else just goes back to copying.
+        if not self._emit_lock.acquire(blocking=force):
+            return
+        try:
+            self._next_emit = time.monotonic() + self.interval
+            self.callback(self.snapshot())
+        finally:
+            self._emit_lock.release()
+
+def format_size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+def format_progress(info):
+    """Turns a progress snapshot into a one-line status message."""
+    parts = [info['phase'] or "Working"]
+    if info['bytes_total']:
+        parts.append(f"{format_size(info['bytes_done'])} / {format_size(info['bytes_total'])}")
+    if info['files_total']:
+        parts.append(f"{info['files_done']} / {info['files_total']} files")
+    if info['rate']:
+        parts.append(f"{info['rate'] / (1024 * 1024):.1f} MB/s")
+    if info['eta'] is not None:
+        minutes, seconds = divmod(int(info['eta']), 60)
+        parts.append(f"ETA {minutes}:{seconds:02d}")
+    return " - ".join(parts)
@@ -0,0 +1,123 @@
+# core/scanner.py
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from core import trace
+
+class ScanResult:
+    """The outcome of a tree scan: every file (relative path, size, mtime_ns) and folder."""
+
+    def __init__(self, root):
+        self.root = root
+        self.files = []
+        self.dirs = []
+        self.total_size = 0
+
+    @property
+    def file_count(self):
+        return len(self.files)
+
+class TreeScanner:
+    """
+    Walks a folder tree with os.scandir, scanning subfolders in parallel.
+    Listings are cached per folder and reused while the folder's mtime is unchanged.
+    A folder's mtime only changes when entries are added, removed or renamed, so the
+    cache suits trees that are updated by replacing files (like Steam installs) and is
+    NOT safe for trees where files are rewritten in place (like save folders).
+    """
+    CACHE_FILE = 'scan_cache.json'
+    # Folders changed this recently may change again within the same mtime tick; don't cache them.
+    RACY_SECONDS = 2
+
+    def __init__(self, cache_dir=None, workers=None):
+        self.cache_path = os.path.join(cache_dir, self.CACHE_FILE) if cache_dir else None
+        self.workers = workers or min(16, (os.cpu_count() or 4) * 2)
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, root, listings):
+        if not self.cache_path:
+            return
+        cache = self._load_cache()
+        # Replace everything under this root, so folders deleted since the last scan drop out.
+        prefix = os.path.join(root, '')
+        cache = {path: listing for path, listing in cache.items()
+                 if path != root and not path.startswith(prefix)}
+        cache.update(listings)
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _scan_dir(self, path, cache, racy_after):
+        """Lists one folder. Returns (listing, cacheable)."""
+        mtime = os.stat(path).st_mtime_ns
+        cached = cache.get(path)
+        if cached and cached['mtime'] == mtime:
+            return cached, True
+
+        files, dirs = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    # On Windows this stat comes free with the directory listing.
+                    st = entry.stat()
+                    files.append([entry.name, st.st_size, st.st_mtime_ns])
+        return {'mtime': mtime, 'files': files, 'dirs': dirs}, mtime < racy_after
+
+    def scan(self, root, use_cache=True):
+        """
+        Scans 'root' and returns a ScanResult. Pass use_cache=False when exact sizes and
+        mtimes matter (e.g. to decide which files changed); fresh results still refresh the cache.
+        """
+        with trace.span('scan', root=root, use_cache=use_cache) as span:
+            result = self._scan(root, use_cache, span)
+            span.add(files=result.file_count, dirs=len(result.dirs), bytes=result.total_size)
+        return result
+
+    def _scan(self, root, use_cache, span):
+        result = ScanResult(root)
+        if not os.path.isdir(root):
+            return result
+        # Key the cache by the real path: the game folder may be a symlink to any profile.
+        root = os.path.realpath(root)
+        cache = self._load_cache() if use_cache else {}
+        racy_after = time.time_ns() - self.RACY_SECONDS * 1_000_000_000
+        listings = {}
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='scan') as pool:
+            pending = {pool.submit(self._scan_dir, root, cache, racy_after): (root, '.')}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, rel_dir = pending.pop(future)
+                    listing, cacheable = future.result()
+                    if listing is cache.get(path):
+                        span.add(cached_dirs=1) # Listed from the cache, no stat() calls needed.
+                    if cacheable:
+                        listings[path] = listing
+                    result.dirs.append(rel_dir)
+                    for name, size, mtime in listing['files']:
+                        rel_path = name if rel_dir == '.' else os.path.join(rel_dir, name)
+                        result.files.append((rel_path, size, mtime))
+                        result.total_size += size
+                    for name in listing['dirs']:
+                        sub_rel = name if rel_dir == '.' else os.path.join(rel_dir, name)
+                        sub_path = os.path.join(path, name)
+                        pending[pool.submit(self._scan_dir, sub_path, cache, racy_after)] = (sub_path, sub_rel)
+
+        self._save_cache(root, listings)
+        return result
@@ -0,0 +1,174 @@
+# core/storage.py
+
+import os
+import time
+import platform
+import threading
+
+from core.utils import get_disk_free_space
+
+# Where new profiles go, and where rebalance() wants existing ones:
+#  - most_free:   the root with the most free space
+#  - fastest:     the fastest (SSD) root that has room, else the one with the most free space
+#  - hot_on_fast: the active and most recently used profiles on fast roots, the rest on slow ones
+PLACEMENT_POLICIES = ('most_free', 'fastest', 'hot_on_fast')
+# Leave this much headroom when deciding whether a profile fits on a drive.
+SPACE_MARGIN = 1.1
+MIGRATING_DIR = '.migrating'
+
+def is_fast_device(path):
+    """
+    True if 'path' is on an SSD/NVMe drive, False if on a spinning disk, None if unknown.
+    Only Linux tells us (through /sys); elsewhere set 'fast' on the root in the config.
+    """
+    if platform.system() != "Linux" or not os.path.exists(path):
+        return None
+    dev = os.stat(path).st_dev
+    block = f'/sys/dev/block/{os.major(dev)}:{os.minor(dev)}'
+    # A partition has no queue of its own; its disk (the parent folder) does.
+    for queue in (os.path.join(block, 'queue'), os.path.join(block, '..', 'queue')):
+        try:
+            with open(os.path.join(queue, 'rotational'), 'r') as f:
+                return f.read().strip() == '0'
+        except OSError:
+            continue
+    return None
+
+class StorageRoot:
+    """One folder profiles can be stored in. Each root keeps its own object store."""
+
+    def __init__(self, path, fast=None):
+        self.path = os.path.normpath(path)
+        self._fast = fast
+
+    @property
+    def fast(self):
+        if self._fast is None:
+            self._fast = bool(is_fast_device(self.path))
+        return self._fast
+
+    def free_space(self):
+        return get_disk_free_space(self.path) if os.path.isdir(self.path) else 0
+
+    def profile_path(self, profile_name):
+        return os.path.join(self.path, profile_name)
+
+    def has_profile(self, profile_name):
+        return os.path.isdir(self.profile_path(profile_name))
+
+    def describe(self):
+        return {'path': self.path, 'fast': self.fast, 'free': self.free_space()}
+
+class StoragePool:
+    """
+    The folders profiles may live in: the manager folder first, then any extra roots from
+    the config ('storage_roots', each a path or {"path": ..., "fast": true}). A profile
+    lives in exactly one root; its name is looked up in every root.
+    """
+
+    def __init__(self, roots):
+        self.roots = roots
+
+    @classmethod
+    def from_config(cls, manager_path, extra_roots):
+        roots = [StorageRoot(manager_path)]
+        for entry in extra_roots:
+            if isinstance(entry, str):
+                entry = {'path': entry}
+            root = StorageRoot(entry['path'], entry.get('fast'))
+            if all(root.path != other.path for other in roots):
+                roots.append(root)
+        return cls(roots)
+
+    @property
+    def primary(self):
+        return self.roots[0]
+
+    def get(self, path):
+        """The root with exactly this path."""
+        path = os.path.normpath(path)
+        for root in self.roots:
+            if root.path == path:
+                return root
+        raise ValueError(f"'{path}' is not one of the storage roots.")
+
+    def find(self, profile_name):
+        """The root holding a profile, or None."""
+        for root in self.roots:
+            if root.has_profile(profile_name):
+                return root
+        return None
+
+    def root_for(self, path):
+        """The root a path is inside of (the manager folder for paths outside all roots)."""
+        path = os.path.normpath(path)
+        best = None
+        for root in self.roots:
+            if path == root.path or path.startswith(os.path.join(root.path, '')):
+                if best is None or len(root.path) > len(best.path):
+                    best = root
+        return best or self.primary
+
+    def choose(self, policy, needed=0, hot=True):
+        """
+        Picks a root for a profile of 'needed' bytes under 'policy'. 'hot' is for the
+        hot_on_fast policy: active and recently used profiles are hot, new ones too.
+        Raises ValueError if no root has the room.
+        """
+        if policy not in PLACEMENT_POLICIES:
+            raise ValueError(f"Unknown placement policy '{policy}'. Use one of: {', '.join(PLACEMENT_POLICIES)}.")
+        free = {root.path: root.free_space() for root in self.roots}
+        fitting = [root for root in self.roots if free[root.path] >= needed * SPACE_MARGIN]
+        if not fitting:
+            raise ValueError(f"No storage root has {needed * SPACE_MARGIN / 2**30:.1f} GB free.")
+        by_space = sorted(fitting, key=lambda root: free[root.path], reverse=True)
+        if policy == 'most_free':
+            return by_space[0]
+        wanted = [root for root in by_space if root.fast == (hot or policy == 'fastest')]
+        return (wanted or by_space)[0]
+
+    def plan(self, policy, profiles, hot_count=2):
+        """
+        Returns the moves that bring existing profiles in line with 'policy', as
+        (profile name, from root, to root) tuples. 'profiles' are dicts with 'name',
+        'size', 'last_used' and 'active'. Only hot_on_fast moves profiles around; the
+        other policies only decide where new profiles go.
+        """
+        if policy != 'hot_on_fast' or not any(root.fast for root in self.roots) \
+                or all(root.fast for root in self.roots):
+            return []
+        ranked = sorted(profiles, key=lambda info: (not info.get('active'), -(info.get('last_used') or 0)))
+        hot = {info['name'] for info in ranked[:hot_count]}
+        moves = []
+        planned = {root.path: root.free_space() for root in self.roots}
+        for info in ranked:
+            current = self.find(info['name'])
+            if current is None or current.fast == (info['name'] in hot):
+                continue
+            size = (info.get('size') or 0) * SPACE_MARGIN
+            targets = sorted((root for root in self.roots
+                              if root.fast == (info['name'] in hot) and planned[root.path] >= size),
+                             key=lambda root: planned[root.path], reverse=True)
+            if targets:
+                planned[targets[0].path] -= size
+                planned[current.path] += size
+                moves.append((info['name'], current, targets[0]))
+        return moves
+
+class Throttle:
+    """Keeps work shared by any number of threads under 'rate' bytes per second (None: no limit)."""
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self._bytes = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        if not self.rate:
+            return
+        with self._lock:
+            self._bytes += n
+            ahead = self._bytes / self.rate - (time.monotonic() - self._started)
+        if ahead > 0:
+            time.sleep(ahead)
@@ -0,0 +1,297 @@
+# core/store.py
+
+import os
+import json
+import stat
+import shutil
+import time
+import threading
+
+FILE_INDEX = 'files.json'
+# Garbage collection leaves anything younger than this alone: a capture may not have listed it yet.
+GC_MIN_AGE = 3600
+
+class ObjectStore:
+    """
+    A content-addressed store for game files, kept inside the manager directory.
+    Every unique file is stored once as '.store/objects/<ab>/<hash>' and the
+    GameFiles folder of each profile is rebuilt from hardlinks to these objects.
+    A file can also be kept as '.store/deltas/<ab>/<hash>', a binary delta over another
+    object, and is only rebuilt into a whole object when a profile needs it on disk.
+    An object is one inode shared by every profile that has the file, so anything writing
+    into it in place (instead of replacing the file) changes all of them at once. With
+    'read_only' (the default except on Windows, where read-only files can't be replaced or
+    deleted) objects lose their write permission, so such a write fails instead.
+    """
+    STORE_DIR = '.store'
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root, read_only=None):
+        self.root = os.path.join(root, self.STORE_DIR)
+        self.objects_path = os.path.join(self.root, 'objects')
+        self.deltas_path = os.path.join(self.root, 'deltas')
+        self.tmp_path = os.path.join(self.root, 'tmp')
+        self.read_only = os.name != 'nt' if read_only is None else read_only
+
+    @classmethod
+    def hash_file(cls, path):
+        """Returns the SHA-256 hex digest of a file's contents."""
+        import hashlib # Deferred: the CLI's read-only commands never hash anything.
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(cls.HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_path, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def commit(self, tmp_path, digest):
+        """Moves a finished temp file (under tmp_path) into the store as object 'digest'."""
+        if self.read_only:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(tmp_path).st_mode) & ~0o222)
+        os.makedirs(os.path.dirname(self.object_path(digest)), exist_ok=True)
+        os.replace(tmp_path, self.object_path(digest))
+
+    def delta_path(self, digest):
+        return os.path.join(self.deltas_path, digest[:2], digest)
+
+    def has_delta(self, digest):
+        return os.path.exists(self.delta_path(digest))
+
+    def add_delta(self, src, digest, base_digest, max_ratio=0.5):
+        """
+        Stores the file 'src' (hashing to 'digest') as a binary delta over the object
+        'base_digest' instead of as a whole object (see core.delta). Returns True if the
+        delta was stored, False if it wouldn't be smaller than 'max_ratio' of the file.
+        """
+        from core.delta import write_delta
+        if self.has_delta(digest):
+            return True
+        base_path = self.materialize(base_digest)
+        os.makedirs(self.tmp_path, exist_ok=True)
+        os.makedirs(os.path.dirname(self.delta_path(digest)), exist_ok=True)
+        tmp_path = os.path.join(self.tmp_path, os.urandom(16).hex())
+        try:
+            if write_delta(base_path, src, tmp_path, base_digest, max_ratio) is None:
+                return False
+            os.replace(tmp_path, self.delta_path(digest))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return True
+
+    def delta_base(self, digest):
+        """The digest of the object a stored delta is based on."""
+        from core.delta import read_delta_header
+        return read_delta_header(self.delta_path(digest))['base']
+
+    def materialize(self, digest, mtime_ns=None):
+        """
+        Makes sure the object exists, rebuilding it from its delta (and the delta's base,
+        recursively) if it was only stored as one. A rebuilt object gets 'mtime_ns' as its
+        modification time, like an ingested copy keeps the original's. Returns its path.
+        """
+        obj_path = self.object_path(digest)
+        if os.path.exists(obj_path):
+            return obj_path
+        if not self.has_delta(digest):
+            raise FileNotFoundError(f"Object {digest} is neither stored nor stored as a delta.")
+        from core.delta import apply_delta
+        base_path = self.materialize(self.delta_base(digest))
+        os.makedirs(self.tmp_path, exist_ok=True)
+        os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+        tmp_path = os.path.join(self.tmp_path, os.urandom(16).hex())
+        try:
+            apply_delta(self.delta_path(digest), base_path, tmp_path)
+            if self.hash_file(tmp_path) != digest:
+                raise ValueError(f"Rebuilding object {digest} from its delta gave different contents.")
+            if mtime_ns is not None:
+                os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+            self.commit(tmp_path, digest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return obj_path
+
+    def ingest(self, src, digest=None, copy_function=shutil.copy2):
+        """
+        Adds a file to the store unless an identical one is already there.
+        Returns the digest of the file.
+        """
+        if digest is None:
+            digest = self.hash_file(src)
+        obj_path = self.object_path(digest)
+        if os.path.exists(obj_path):
+            return digest
+
+        # Copy to a private temp name first, then rename it into place so a
+        # half-written object can never be mistaken for a complete one.
+        os.makedirs(self.tmp_path, exist_ok=True)
+        os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+        tmp_path = os.path.join(self.tmp_path, os.urandom(16).hex())
+        try:
+            copy_function(src, tmp_path)
+            self.commit(tmp_path, digest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def link(self, digest, dest):
+        """
+        Places an object at 'dest', as a hardlink when the filesystem allows it.
+        An existing file at 'dest' is replaced atomically.
+        Returns True if a hardlink was made, False if it had to fall back to a copy.
+        """
+        if os.path.lexists(dest):
+            tmp_dest = f"{dest}.pzvm-{os.urandom(4).hex()}"
+            linked = self.link(digest, tmp_dest)
+            os.replace(tmp_dest, dest)
+            return linked
+
+        obj_path = self.object_path(digest)
+        try:
+            os.link(obj_path, dest)
+            return True
+        except OSError:
+            # FAT/exFAT drives and some network shares can't hardlink.
+            shutil.copy2(obj_path, dest)
+            return False
+
+    def collect_garbage(self, referenced, min_age=GC_MIN_AGE):
+        """
+        Deletes objects that no profile needs anymore ('referenced' is a set of digests).
+        Objects still hardlinked from somewhere, or added within 'min_age' seconds (a capture
+        may not have linked them yet), are kept. Returns (objects removed, bytes freed).
+        """
+        removed, freed = 0, 0
+        now = time.time()
+        for digest in list(self.iter_objects()):
+            if digest in referenced:
+                continue
+            obj_path = self.object_path(digest)
+            st = os.stat(obj_path)
+            if st.st_nlink > 1 or now - st.st_ctime < min_age:
+                continue
+            os.remove(obj_path)
+            removed += 1
+            freed += st.st_size
+        return removed, freed
+
+    def collect_deltas(self, referenced):
+        """
+        Deletes deltas of files no profile lists anymore. Returns the set of objects the
+        remaining deltas are built on (directly or through other deltas), which must be kept.
+        """
+        kept = set()
+        for digest in list(self._iter_dir(self.deltas_path)):
+            if digest in referenced:
+                kept.add(digest)
+            else:
+                os.remove(self.delta_path(digest))
+        bases, pending = set(), [self.delta_base(digest) for digest in kept]
+        while pending:
+            base = pending.pop()
+            if base in bases:
+                continue
+            bases.add(base)
+            if self.has_delta(base):
+                pending.append(self.delta_base(base))
+        return bases
+
+    def iter_objects(self):
+        """Yields the digest of every object in the store."""
+        return self._iter_dir(self.objects_path)
+
+    @staticmethod
+    def _iter_dir(path):
+        if not os.path.isdir(path):
+            return
+        for prefix in os.listdir(path):
+            prefix_path = os.path.join(path, prefix)
+            if os.path.isdir(prefix_path):
+                yield from os.listdir(prefix_path)
+
+def read_file_index(profile_path):
+    """
+    Loads a profile's file index, a mapping of 'relative/path' -> [size, mtime_ns, digest].
+    Returns None if the profile was captured without one.
+    """
+    index_path = os.path.join(profile_path, FILE_INDEX)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('files', {})
+
+def write_file_index(profile_path, files):
+    """Atomically writes a profile's file index."""
+    index_path = os.path.join(profile_path, FILE_INDEX)
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'files': files}, f)
+    os.replace(tmp_path, index_path)
+
+class FileJournal:
+    """
+    An append-only log of finished work for a capture or update, kept inside the profile.
+    If the operation is interrupted, the next run reads it back and skips what's already done.
+    """
+    JOURNAL_FILE = 'journal.jsonl'
+
+    def __init__(self, profile_path):
+        self.path = os.path.join(profile_path, self.JOURNAL_FILE)
+        self._file = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Returns (files, steps): the file entries and step names recorded so far."""
+        files, steps = {}, set()
+        if not self.exists():
+            return files, steps
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break # A torn last line from the interruption itself.
+                if 'file' in record:
+                    files[record['file']] = record['entry']
+                elif 'step' in record:
+                    steps.add(record['step'])
+        return files, steps
+
+    def _write(self, record):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+    def record_file(self, rel_path, entry):
+        self._write({'file': rel_path, 'entry': entry})
+
+    def record_step(self, step):
+        self._write({'step': step})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        """Closes and deletes the journal once the operation has fully completed."""
+        self.close()
+        if self.exists():
+            os.remove(self.path)
@@ -0,0 +1,191 @@
+# core/trace.py
+
+"""
+Structured timing spans for the manager's operations.
+
+    from core import trace
+    with trace.span('scan', root=path) as span:
+        ...
+        span.add(files=n, bytes=total)
+
+Tracing is off unless enable() is called (the manager does this when the config has a
+'trace_file' or PZVM_TRACE is set). While it's off, span() returns a shared do-nothing
+object, so instrumented code costs one function call per span.
+Spans are written as they finish, either as JSON lines (a '.jsonl' file) or in Chrome's
+trace event format (anything else; open it in chrome://tracing or https://ui.perfetto.dev).
+"""
+
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+
+class _NullSpan:
+    """Stands in for a span while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, **counters):
+        pass
+
+    def set(self, **fields):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    """One timed phase. add() sums counters (bytes, files, ...) and can be called from any thread."""
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.parent = None
+        self.start_ns = None
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._record(self, end_ns)
+        return False
+
+    def add(self, **counters):
+        with self.tracer._lock:
+            for key, value in counters.items():
+                self.args[key] = self.args.get(key, 0) + value
+
+    def set(self, **fields):
+        self.args.update(fields)
+
+class Tracer:
+    """Collects finished spans and streams them to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.chrome = not path.endswith('.jsonl')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin_ns = time.perf_counter_ns()
+        self._wall_origin = time.time()
+        self._threads = set()
+        self._file = open(path, 'wb')
+        if self.chrome:
+            # The closing bracket is written by close(); Chrome's JSON array format doesn't
+            # strictly need it, so a trace cut short by a crash still loads.
+            self._file.write(b'[\n')
+        atexit.register(self.close)
+
+    def span(self, name, **args):
+        return Span(self, name, args)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, span, end_ns):
+        thread = threading.current_thread()
+        start_us = (span.start_ns - self._origin_ns) / 1000
+        duration_us = (end_ns - span.start_ns) / 1000
+        lines = []
+        if self.chrome:
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                lines.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread.ident,
+                              'args': {'name': thread.name}})
+            lines.append({'name': span.name, 'cat': span.name.split('.')[0], 'ph': 'X', 'ts': start_us,
+                          'dur': duration_us, 'pid': os.getpid(), 'tid': thread.ident, 'args': span.args})
+        else:
+            lines.append({'name': span.name, 'parent': span.parent, 'thread': thread.name,
+                          'start': self._wall_origin + start_us / 1e6, 'seconds': duration_us / 1e6,
+                          **span.args})
+        with self._lock:
+            if self._file is None:
+                return
+            for line in lines:
+                self._file.write((json.dumps(line, default=str) + (',\n' if self.chrome else '\n')).encode())
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if self.chrome:
+                if self._file.tell() > 2:
+                    self._file.seek(-2, os.SEEK_END) # Drop the last event's trailing comma.
+                    self._file.truncate()
+                self._file.write(b'\n]\n')
+            self._file.close()
+            self._file = None
+
+_tracer = None
+
+def enable(path):
+    """Starts writing spans to 'path' (replacing any tracer that was already running)."""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(path)
+    return _tracer
+
+def disable():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = None
+
+def enabled():
+    return _tracer is not None
+
+def span(name, **args):
+    """Returns a context manager that times the enclosed phase (or does nothing if tracing is off)."""
+    if _tracer is None:
+        return NULL_SPAN
+    return _tracer.span(name, **args)
+
+def current():
+    """
+    The innermost open span on this thread (or a do-nothing one). Grab it before handing
+    work to a thread pool to let the workers add their counters to it.
+    """
+    if _tracer is None:
+        return NULL_SPAN
+    stack = _tracer._stack()
+    return stack[-1] if stack else NULL_SPAN
+
+def traced(name, *arg_names):
+    """
+    Decorator that runs every call of a function in a span. The arguments named in
+    'arg_names' (e.g. 'profile_name') are recorded with the span.
+    """
+    def decorate(func):
+        params = func.__code__.co_varnames[:func.__code__.co_argcount]
+        positions = [(arg, params.index(arg)) for arg in arg_names]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            fields = {arg: kwargs.get(arg, args[i] if i < len(args) else None) for arg, i in positions}
+            with _tracer.span(name, **fields):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
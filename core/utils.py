@@ -2,7 +2,6 @@
 
 import os
 import platform
-import winreg # For Windows registry access
 import shutil
 import subprocess
 
@@ -14,6 +13,7 @@ def get_default_steam_path():
     """Tries to find the default Steam installation path from the Windows Registry or common Linux paths."""
     system = platform.system()
     if system == "Windows":
+        import winreg # For Windows registry access; only exists on Windows
         try:
             # Steam's path is stored in the registry on Windows
             key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Valve\Steam")
@@ -61,4 +61,37 @@ def check_symlink_permissions():
 def get_disk_free_space(path):
     """Returns the free space in bytes on the drive where the path is located."""
     total, used, free = shutil.disk_usage(path)
-    return free
\ No newline at end of file
+    return free
+def is_path_in_use(path):
+    """
+    True if a running process was started from, or is working in, the folder 'path' (e.g.
+    the game install; links are followed). Reads /proc on Linux and the process list on
+    Windows; elsewhere it can't tell and returns False.
+    """
+    prefixes = tuple({os.path.join(os.path.normcase(folder), '')
+                      for folder in (os.path.abspath(path), os.path.realpath(path))})
+
+    def inside(other):
+        return os.path.join(os.path.normcase(other), '').startswith(prefixes)
+
+    system = platform.system()
+    if system == "Linux":
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            for link in ('exe', 'cwd'):
+                try:
+                    if inside(os.readlink(f'/proc/{pid}/{link}')):
+                        return True
+                except OSError:
+                    continue # Exited meanwhile, or not ours to look at.
+        return False
+    if system == "Windows":
+        # The game's exe, or the dedicated server's bundled Java, both live under the install.
+        command = ['powershell', '-NoProfile', '-Command', '(Get-Process | Where-Object Path).Path']
+        try:
+            output = subprocess.run(command, capture_output=True, text=True, timeout=30).stdout
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return any(inside(line.strip()) for line in output.splitlines() if line.strip())
+    return False
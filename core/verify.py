@@ -0,0 +1,131 @@
+# core/verify.py
+
+import os
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.store import ObjectStore, read_file_index
+
+VERIFY_CACHE = 'verify.json'
+# Below this many bytes to hash, starting worker processes costs more than it saves.
+POOL_THRESHOLD = 64 * 1024 * 1024
+# Files are sent to the workers in batches of about this size, so tiny files don't drown in IPC.
+BATCH_BYTES = 32 * 1024 * 1024
+BATCH_FILES = 256
+
+def _hash_batch(paths):
+    """Hashes a batch of files (in a worker process). A file that can't be read gets None."""
+    digests = []
+    for path in paths:
+        try:
+            digests.append(ObjectStore.hash_file(path))
+        except OSError:
+            digests.append(None)
+    return digests
+
+def _make_batches(jobs):
+    batch, batch_bytes = [], 0
+    for job in jobs:
+        batch.append(job)
+        batch_bytes += job[1]
+        if batch_bytes >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+def _load_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(path, cache):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(path + '.tmp', path)
+
+def verify_profile_files(profile_path, progress=None, use_cache=True, workers=None):
+    """
+    Checks a profile's GameFiles against the file index written when it was captured.
+    Files are hashed on a process pool; files whose size and mtime match the last verified
+    hash are trusted without reading them again (pass use_cache=False to hash everything).
+    Returns a dict with 'ok' and the lists of 'missing', 'corrupt' and 'extra' files.
+    """
+    started = time.perf_counter()
+    files = read_file_index(profile_path)
+    if files is None:
+        raise ValueError("This profile has no file index to verify against. Capture it again first.")
+    game_files = os.path.join(profile_path, 'GameFiles')
+    cache_path = os.path.join(profile_path, VERIFY_CACHE)
+    cache = _load_cache(cache_path) if use_cache else {}
+
+    missing, corrupt, jobs = [], [], []
+    verified = {}
+    cached = 0
+    for rel, (size, _, digest) in files.items():
+        try:
+            st = os.stat(os.path.join(game_files, rel))
+        except OSError:
+            missing.append(rel)
+            continue
+        if st.st_size != size:
+            corrupt.append(rel) # No need to read it to know it's wrong.
+        elif cache.get(rel) == [st.st_size, st.st_mtime_ns, digest]:
+            verified[rel] = cache[rel]
+            cached += 1
+        else:
+            jobs.append((rel, st.st_size, st.st_mtime_ns))
+
+    extra = []
+    for dirpath, _, names in os.walk(game_files):
+        for name in names:
+            rel = os.path.relpath(os.path.join(dirpath, name), game_files).replace(os.sep, '/')
+            if rel not in files:
+                extra.append(rel)
+
+    hashed_bytes = sum(job[1] for job in jobs)
+    if progress:
+        progress.start_phase("Verifying files", hashed_bytes, len(jobs))
+
+    def check(batch, digests):
+        for (rel, size, mtime_ns), digest in zip(batch, digests):
+            if digest == files[rel][2]:
+                verified[rel] = [size, mtime_ns, digest]
+            else:
+                corrupt.append(rel)
+            if progress:
+                progress.advance(size, 1)
+
+    # Largest files first, so one big texture pack doesn't end up alone at the end.
+    jobs.sort(key=lambda job: job[1], reverse=True)
+    batches = list(_make_batches(jobs))
+    paths = lambda batch: [os.path.join(game_files, job[0]) for job in batch]
+    if hashed_bytes < POOL_THRESHOLD or len(batches) < 2:
+        for batch in batches:
+            check(batch, _hash_batch(paths(batch)))
+    else:
+        # 'spawn' because the GUI calls this from a worker thread, and forking a threaded process is unsafe.
+        with ProcessPoolExecutor(min(workers or os.cpu_count() or 2, len(batches)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(_hash_batch, paths(batch)): batch for batch in batches}
+            for future in as_completed(futures):
+                check(futures[future], future.result())
+    if progress:
+        progress.finish_phase()
+
+    _save_cache(cache_path, verified)
+    return {
+        'ok': not missing and not corrupt,
+        'files': len(files),
+        'hashed': len(jobs),
+        'hashed_bytes': hashed_bytes,
+        'cached': cached,
+        'missing': sorted(missing),
+        'corrupt': sorted(corrupt),
+        'extra': sorted(extra),
+        'seconds': time.perf_counter() - started,
+    }
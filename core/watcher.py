@@ -0,0 +1,189 @@
+# core/watcher.py
+
+import os
+import struct
+import select
+import platform
+import threading
+
+# inotify(7) event flags
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+
+class PathWatcher:
+    """
+    Watches a few folders and calls callback(kind, path) on changes. Each watch is
+    (folder, kinds) or (folder, kinds, recursive): 'kinds' is either one kind for every entry
+    in the folder, or a {entry name: kind} dict to only report specific entries. A recursive
+    watch also covers every folder below, including ones created later, with the same 'kinds'.
+    Entries starting with a dot are ignored. Uses inotify on Linux and falls back to polling
+    everywhere else.
+    The callback runs on the watcher thread, so it should only hand the event off.
+    """
+
+    def __init__(self, watches, callback, poll_interval=2.0):
+        self.watches = [(os.path.normpath(folder), kinds, bool(recursive and recursive[0]))
+                        for folder, kinds, *recursive in watches]
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.backend = None
+
+    def start(self):
+        inotify = _Inotify.create() if platform.system() == "Linux" else None
+        if inotify is not None:
+            self.backend = 'inotify'
+            target = lambda: self._run_inotify(inotify)
+        else:
+            self.backend = 'polling'
+            target = self._run_polling
+        self._thread = threading.Thread(target=target, name='path-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def _kind_for(self, kinds, name):
+        if not name or name.startswith('.'):
+            return None
+        if isinstance(kinds, dict):
+            return kinds.get(name)
+        return kinds
+
+    def _subfolders(self, folder, kinds):
+        """The folders below 'folder' a recursive watch covers (not following links)."""
+        for dirpath, dirnames, _ in os.walk(folder):
+            dirnames[:] = [name for name in dirnames if self._kind_for(kinds, name)]
+            for name in dirnames:
+                yield os.path.join(dirpath, name)
+
+    def _run_inotify(self, inotify):
+        folders = {}
+
+        def watch(folder, kinds, recursive):
+            wd = inotify.add_watch(folder, WATCH_MASK)
+            if wd >= 0:
+                folders[wd] = (folder, kinds, recursive)
+            return wd
+
+        try:
+            for folder, kinds, recursive in self.watches:
+                if watch(folder, kinds, recursive) >= 0 and recursive:
+                    for subfolder in self._subfolders(folder, kinds):
+                        if watch(subfolder, kinds, recursive) < 0:
+                            print(f"Can't watch '{subfolder}' (too many folders for inotify?); "
+                                  f"changes below it go unnoticed.")
+                            break
+            while not self._stop.is_set():
+                # Wake up now and then to notice stop(); events themselves arrive immediately.
+                ready, _, _ = select.select([inotify.fd], [], [], 0.5)
+                if not ready:
+                    continue
+                for wd, mask, name in inotify.read_events():
+                    if wd not in folders:
+                        continue
+                    folder, kinds, recursive = folders[wd]
+                    if mask & IN_IGNORED: # The folder is gone, so is its watch.
+                        del folders[wd]
+                        continue
+                    kind = self._kind_for(kinds, name)
+                    if not kind:
+                        continue
+                    path = os.path.join(folder, name)
+                    if recursive and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                        # Whatever got written into it before the watch existed is covered by this event.
+                        for subfolder in [path, *self._subfolders(path, kinds)]:
+                            watch(subfolder, kinds, recursive)
+                    self.callback(kind, path)
+        finally:
+            inotify.close()
+
+    def _snapshot(self, folder, kinds, recursive=False, prefix=''):
+        """{relative path: (mtime_ns, size)} of the watched entries in 'folder' (and below, if recursive)."""
+        entries = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if self._kind_for(kinds, entry.name):
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                            entries[prefix + entry.name] = (st.st_mtime_ns, st.st_size)
+                            if recursive and entry.is_dir(follow_symlinks=False):
+                                entries.update(self._snapshot(entry.path, kinds, True, f'{prefix}{entry.name}{os.sep}'))
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        return entries
+
+    def _run_polling(self):
+        snapshots = [self._snapshot(*watch) for watch in self.watches]
+        while not self._stop.wait(self.poll_interval):
+            for i, (folder, kinds, recursive) in enumerate(self.watches):
+                current = self._snapshot(folder, kinds, recursive)
+                previous = snapshots[i]
+                for rel in set(current) | set(previous):
+                    if current.get(rel) != previous.get(rel):
+                        self.callback(self._kind_for(kinds, os.path.basename(rel)), os.path.join(folder, rel))
+                snapshots[i] = current
+
+class _Inotify:
+    """A minimal ctypes binding for inotify(7)."""
+
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+
+    @classmethod
+    def create(cls):
+        """Returns an inotify instance, or None if it isn't available."""
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def add_watch(self, folder, mask):
+        if not os.path.isdir(folder):
+            return -1
+        return self.libc.inotify_add_watch(self.fd, os.fsencode(folder), mask)
+
+    def read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
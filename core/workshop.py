@@ -0,0 +1,69 @@
+# core/workshop.py
+
+import os
+import json
+
+from core import trace
+from core.store import FILE_INDEX
+
+PROFILE_WORKSHOP_FILE = 'workshop.json'
+
+def read_workshop_items(manifest_path):
+    """
+    Returns {item id: time updated} for the items Steam lists as installed in an
+    appworkshop_<appid>.acf file, or {} if there is no such file.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    import vdf # Imported here like in core.profiles, only needed when something is captured.
+    with trace.span('vdf.parse', path=manifest_path), open(manifest_path, 'r', encoding='utf-8') as f:
+        data = vdf.load(f)
+    installed = data.get('AppWorkshop', {}).get('WorkshopItemsInstalled', {})
+    return {item_id: str(details.get('timeupdated', '0')) for item_id, details in installed.items()}
+
+def read_profile_workshop(profile_path):
+    """Returns the {item id: version} set a profile was captured with, or None if it has none."""
+    try:
+        with open(os.path.join(profile_path, PROFILE_WORKSHOP_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f).get('items', {})
+    except FileNotFoundError:
+        return None
+
+def write_profile_workshop(profile_path, items):
+    path = os.path.join(profile_path, PROFILE_WORKSHOP_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'items': items}, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+class WorkshopStore:
+    """
+    Workshop mods shared by all profiles, kept inside the manager directory.
+    Each version of a mod is stored once as '.workshop/<item id>/<time updated>/Content',
+    built from links into the object store (so two versions of a mod share unchanged files),
+    with its file index next to it. A profile only records which versions it uses, and its
+    'Workshop' folder holds one folder link per item pointing at the right version.
+    """
+    WORKSHOP_DIR = '.workshop'
+
+    def __init__(self, root):
+        self.root = os.path.join(root, self.WORKSHOP_DIR)
+
+    def version_path(self, item_id, version):
+        return os.path.join(self.root, item_id, version)
+
+    def content_path(self, item_id, version):
+        return os.path.join(self.version_path(item_id, version), 'Content')
+
+    def has(self, item_id, version):
+        # The file index is written last, so it marks a version as completely stored.
+        return os.path.exists(os.path.join(self.version_path(item_id, version), FILE_INDEX))
+
+    def iter_versions(self):
+        """Yields (item id, version) for every stored mod version."""
+        if not os.path.isdir(self.root):
+            return
+        for item_id in os.listdir(self.root):
+            item_path = os.path.join(self.root, item_id)
+            if os.path.isdir(item_path):
+                for version in os.listdir(item_path):
+                    yield item_id, version
@@ -2,17 +2,26 @@
 
 import sys
 import os
+import shutil
+import threading
+import multiprocessing
 import webbrowser
 from PySide6.QtWidgets import (QApplication, QMainWindow, QFileDialog, 
-                               QMessageBox, QInputDialog, QListWidgetItem, QStatusBar)
+                               QMessageBox, QInputDialog, QListWidgetItem, QStatusBar, QMenu, QPushButton)
 from PySide6.QtGui import QIcon
 from PySide6.QtUiTools import QUiLoader
-from PySide6.QtCore import Qt, QThread
+from PySide6.QtCore import Qt, QTimer
 
 from core.manager import VersionManager
+from core.progress import format_size
 from core.utils import (get_default_steam_path, get_default_zomboid_user_path, 
                       check_symlink_permissions, get_disk_free_space)
-from core.worker import CaptureWorker
+from core.worker import JobBridge, OverviewBridge, WatcherBridge
+from core.jobs import JobScheduler, STORE
+from core.copier import CopyEngine
+from core.watcher import PathWatcher
+from core.progress import format_progress
+from core.profiles import describe_profile
 
 #   script_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -55,12 +64,39 @@ class MainWindow(QMainWindow):
         self.setStatusBar(self.statusbar)
 
         self.manager = VersionManager()
-        
-        self.thread = None
-        self.worker = None
+
+        # Long operations run on the job scheduler, which queues them and keeps two
+        # operations on the same profile (or on the live install) from overlapping.
+        # Its updates arrive on worker threads and are relayed through the bridge.
+        self.job_bridge = JobBridge()
+        self.job_bridge.updated.connect(self.on_job_update)
+        self.scheduler = JobScheduler(on_update=self.job_bridge.updated.emit)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setVisible(False)
+        self.cancel_button.clicked.connect(self.cancel_jobs)
+        self.statusbar.addPermanentWidget(self.cancel_button)
+
+        # Filesystem watcher: events arrive on its own thread and are relayed through the bridge.
+        self.watcher = None
+        self.watch_targets = None
+        self.pending_watch_kinds = set()
+        self.unhandled_watch_kinds = set()
+        self.warned_write_through = False
+        self.watch_bridge = WatcherBridge()
+        self.watch_bridge.changed.connect(self.on_watch_event)
+
+        # What the window shows (profiles, active version, storage roots, ...) is read on a
+        # background thread, so a slow or busy disk never stalls the UI; see refresh_ui().
+        self.overview = None
+        self.overview_loading = False
+        self.overview_stale = False
+        self.purge_after_refresh = False
+        self.overview_bridge = OverviewBridge()
+        self.overview_bridge.ready.connect(self.apply_overview)
 
         self.setup_connections()
         self.load_settings()
+        self.recover_interrupted_switch()
         self.refresh_ui()
 
         # All widgets are now accessed via self.ui
@@ -78,38 +114,196 @@ class MainWindow(QMainWindow):
         self.ui.versionListWidget.itemSelectionChanged.connect(self.update_button_states)
         self.ui.prepareNewVersionBtn.clicked.connect(self.prepare_for_new_version)
         self.ui.playBtn.clicked.connect(self.launch_game)
+        self.ui.versionListWidget.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.ui.versionListWidget.customContextMenuRequested.connect(self.show_version_menu)
+
+    def show_version_menu(self, pos):
+        """Right-click menu with the less common actions for a stored version."""
+        item = self.ui.versionListWidget.itemAt(pos)
+        if not self.ui.captureVersionBtn.isEnabled() or self.overview is None:
+            return
+        menu = QMenu(self)
+        if not item:
+            import_action = menu.addAction("Import Version from Bundle...")
+            purge_action = menu.addAction("Delete Set-Aside Game Folders")
+            chosen = menu.exec(self.ui.versionListWidget.mapToGlobal(pos))
+            if chosen == import_action:
+                self.import_version()
+            elif chosen == purge_action:
+                self.purge_quarantine()
+            return
+        profile_name = item.data(Qt.UserRole)
+        info = self.profile_overview(profile_name)
+        update_action = menu.addAction("Update from Current Install")
+        verify_action = menu.addAction("Verify Files")
+        delta_action = None
+        if info.get('delta'):
+            if info.get('materialized'):
+                delta_action = menu.addAction("Shrink Back to Deltas")
+            else:
+                delta_action = menu.addAction("Rebuild Files Now (Faster Switch)")
+        if info.get('archived'):
+            archive_action = menu.addAction("Restore from Archive")
+        else:
+            archive_action = menu.addAction("Archive (Compress to Save Space)")
+        move_action = menu.addAction("Move to Drive...") if self.manager.storage_roots else None
+        export_action = menu.addAction("Export to Bundle...")
+        chosen = menu.exec(self.ui.versionListWidget.mapToGlobal(pos))
+        if chosen == update_action:
+            self.update_version(profile_name)
+        elif chosen == verify_action:
+            self.verify_version(profile_name)
+        elif chosen is not None and chosen == delta_action:
+            self.toggle_delta_version(profile_name)
+        elif chosen == archive_action:
+            self.archive_version(profile_name)
+        elif chosen is not None and chosen == move_action:
+            self.move_version(profile_name)
+        elif chosen == export_action:
+            self.export_version(profile_name)
+
+    def verify_version(self, profile_name):
+        def verify(tracker):
+            result = self.manager.verify_profile(profile_name, tracker)
+            if not result['ok']:
+                broken = result['missing'] + result['corrupt']
+                raise ValueError(f"'{profile_name}' has {len(result['missing'])} missing and "
+                                 f"{len(result['corrupt'])} corrupt files, e.g.\n" + "\n".join(broken[:10]))
+            return f"All {result['files']} files of '{profile_name}' are intact."
+        self.run_task('verify', verify, profile_name, description=f"Verifying '{profile_name}'")
+
+    def toggle_delta_version(self, profile_name):
+        """Rebuilds a delta version's files ahead of time, or drops the rebuilt files again."""
+        if not self.profile_overview(profile_name).get('materialized', True):
+            def materialize(tracker):
+                result = self.manager.materialize_profile(profile_name, progress=tracker)
+                return f"Rebuilt {result['files']} files of '{profile_name}'."
+            self.run_task('materialize', materialize, profile_name, description=f"Rebuilding '{profile_name}'")
+            return
+
+        def dematerialize(tracker):
+            removed, freed = self.manager.dematerialize_profile(profile_name)
+            return f"Shrunk '{profile_name}' back to deltas, freeing {format_size(freed)}."
+        self.run_task('dematerialize', dematerialize, profile_name, description=f"Shrinking '{profile_name}'")
+
+    def archive_version(self, profile_name):
+        if self.profile_overview(profile_name).get('archived'):
+            def restore(tracker):
+                self.manager.restore_profile(profile_name, tracker)
+                return f"Restored '{profile_name}'."
+            self.run_task('restore', restore, profile_name, description=f"Restoring '{profile_name}'")
+            return
+        reply = QMessageBox.question(self, "Confirm Archive",
+                                     f"Compress '{profile_name}' into an archive to save disk space?\n\n"
+                                     "It stays in the list and is unpacked automatically when you switch to it.",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            def archive(tracker):
+                self.manager.archive_profile(profile_name, tracker)
+                return f"Archived '{profile_name}'."
+            # Archiving collects the store's garbage, which mustn't run alongside a capture.
+            self.run_task('archive', archive, profile_name, description=f"Archiving '{profile_name}'", locks=[STORE])
+
+    def move_version(self, profile_name):
+        """
+        Moves a version to another storage root. The copy runs in the background without
+        locking the version, so it can still be switched to; a quick job then swaps it over.
+        """
+        current = self.profile_overview(profile_name).get('root') or ''
+        roots = [root for root in self.overview['storage_roots'] if root['path'] != os.path.normpath(current)]
+        labels = [f"{root['path']} ({format_size(root['free'])} free{', SSD' if root['fast'] else ''})"
+                  for root in roots]
+        choice, ok = QInputDialog.getItem(self, "Move Version", f"Move '{profile_name}' to:", labels, 0, False)
+        if not ok:
+            return
+        root_path = roots[labels.index(choice)]['path']
+
+        def finish(tracker):
+            self.manager.finish_migration(profile_name, root_path, progress=tracker)
+            return f"Moved '{profile_name}' to '{root_path}'."
+
+        def stage(tracker):
+            self.manager.stage_migration(profile_name, root_path, progress=tracker)
+            self.scheduler.submit('migrate', finish, profile_name, True, f"Moving '{profile_name}'", locks=[STORE])
+            return f"Copied '{profile_name}' to '{root_path}'; switching it over."
+        copy_description = f"Copying '{profile_name}' to '{root_path}'"
+        if self.profile_overview(profile_name).get('materialized', True):
+            self.run_task('migrate_copy', stage, description=copy_description, locks=[f'migrate:{profile_name}'])
+            return
+
+        # A delta version's files are rebuilt first, holding the version so nothing else changes it meanwhile.
+        def rebuild(tracker):
+            self.manager.materialize_profile(profile_name, progress=tracker)
+            self.scheduler.submit('migrate_copy', stage, description=copy_description, locks=[f'migrate:{profile_name}'])
+            return f"Rebuilt '{profile_name}'; copying it to '{root_path}'."
+        self.run_task('migrate_copy', rebuild, profile_name, description=f"Rebuilding '{profile_name}'")
+
+    def export_version(self, profile_name):
+        """Writes a version to a bundle file another machine can import it from."""
+        path, _ = QFileDialog.getSaveFileName(self, "Export Version", f"{profile_name}.pzbundle",
+                                              "Version bundles (*.pzbundle)")
+        if not path:
+            return
+        reply = QMessageBox.question(self, "Export Version", "Include this version's saves and settings?",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+
+        def export(tracker):
+            result = self.manager.export_profile(profile_name, path, reply == QMessageBox.Yes, tracker)
+            return f"Exported '{profile_name}' ({format_size(result['bytes'])}) to '{path}'."
+        self.run_task('export', export, profile_name, description=f"Exporting '{profile_name}'")
+
+    def import_version(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Version", "", "Version bundles (*.pzbundle);;All files (*)")
+        if not path:
+            return
+
+        def import_bundle(tracker):
+            result = self.manager.import_profile(path, progress=tracker)
+            return (f"Imported '{result['profile']}'; {result['skipped']} of its files were already stored "
+                    f"and weren't copied again.")
+        self.run_task('import', import_bundle, description=f"Importing '{os.path.basename(path)}'", locks=[STORE])
+
+    def purge_quarantine(self):
+        """Deletes the real game folders a switch or unlink renamed aside, in the background."""
+        def purge(tracker):
+            paths = self.manager.purge_quarantine(tracker)
+            return f"Deleted {len(paths)} set-aside folders." if paths else "No set-aside folders to delete."
+        # Doesn't touch the live install, so switches go on meanwhile; the lock keeps it to one at a time.
+        self.run_task('purge', purge, description="Deleting set-aside folders", locks=['purge'])
+
+    def run_task(self, kind, task, profile=None, uses_install=False, description=None, locks=()):
+        """
+        Queues task(tracker) on the job scheduler. Its progress shows on the progress bar and
+        its return value (a message) once it's done. 'uses_install' is for tasks that change
+        the live game install, so they wait for each other.
+        """
+        self.scheduler.submit(kind, task, profile, uses_install, description, locks)
+        self.set_ui_busy(True)
+
+    def cancel_jobs(self):
+        reply = QMessageBox.question(self, "Confirm Cancel",
+                                     "Cancel the running and queued operations?\n\n"
+                                     "Partially copied files are cleaned up; nothing already stored is lost.",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.scheduler.cancel_all()
+            self.statusbar.showMessage("Cancelling...")
+
+    def on_job_update(self, job):
+        """Receives job snapshots from the scheduler (relayed to the UI thread)."""
+        if job['state'] == 'running' and job['progress']:
+            self.on_progress(job['progress'], job['description'])
+        elif job['state'] in ('done', 'failed', 'cancelled'):
+            self.on_job_finished(job)
 
     def launch_game(self):
         """Launches Project Zomboid via the Steam URL protocol."""
         self.statusbar.showMessage("Launching Project Zomboid via Steam...", 3000)
+        if self.manager.prewarm_after_switch:
+            # Learn which files this version needs to start, for the pre-warm after the next switch.
+            self.manager.record_launch()
         webbrowser.open('steam://run/108600')
 
-    def refresh_ui(self):
-        self.ui.versionListWidget.clear()
-        stored_versions = self.manager.get_stored_versions()
-        current_version_name = self.manager.detect_current_version_name()
-        self.ui.activeVersionLabel.setText(f"Detected Active Version:\n{current_version_name}")
-        active_profile = ""
-        game_path = self.manager.get_game_install_path()
-        if os.path.islink(game_path):
-            try:
-                target_path = os.readlink(game_path)
-                active_profile = os.path.basename(os.path.dirname(target_path))
-            except Exception:
-                pass 
-        for version in stored_versions:
-            item = QListWidgetItem(version)
-            if version == active_profile:
-                item.setText(f"{version} (Active)")
-                item.setForeground(Qt.green)
-            self.ui.versionListWidget.addItem(item)
-        
-        # --- ADD THIS LINE TO CONTROL THE PLAY BUTTON'S STATE ---
-        self.ui.playBtn.setEnabled(bool(active_profile)) # Enable only if a version is active
-
-        self.update_button_states()
-
-    # ... (all other methods remain exactly the same) ...
     def prepare_for_new_version(self):
         """
         Safely unlinks the currently active version to prepare for a new Steam download.
@@ -121,15 +315,10 @@ class MainWindow(QMainWindow):
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            try:
-                self.statusbar.showMessage("Unlinking current version...")
+            def prepare(tracker):
                 self.manager._remove_symlinks_and_manifest()
-                self.statusbar.showMessage("Successfully unlinked. Ready for new version download.", 5000)
-                # Refresh the UI to show that nothing is active
-                self.refresh_ui() 
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"An error occurred while unlinking: {e}")
-                self.statusbar.clearMessage()
+                return "Successfully unlinked. Ready for new version download."
+            self.run_task('prepare', prepare, uses_install=True, description="Unlinking current version")
 
     def load_settings(self):
         self.ui.managerPathEdit.setText(self.manager.manager_path)
@@ -160,37 +349,91 @@ class MainWindow(QMainWindow):
         if not (ok and profile_name):
             return
 
-        self.set_ui_busy(True)
-
-        self.thread = QThread()
-        self.worker = CaptureWorker(self.manager, profile_name) 
-        self.worker.moveToThread(self.thread)
+        # Storing a new build as deltas over the previous one saves most of its disk space.
+        base = None
+        stored = [info['name'] for info in (self.overview or {}).get('profiles', []) if not info['archived']]
+        if stored:
+            full_copy = "None (store a full copy)"
+            choice, ok = QInputDialog.getItem(self, "Store Version",
+                                              "Store only the differences to an existing version?\n"
+                                              "It is rebuilt automatically when you switch to it.",
+                                              [full_copy] + stored, 0, False)
+            if not ok:
+                return
+            base = None if choice == full_copy else choice
+
+        manager_path = self.manager.manager_path
+
+        def capture(tracker):
+            # The same scan is handed to the capture, so the tree is only walked once.
+            scan = self.manager.scan_game_install()
+            # With extra storage roots the capture picks one that has room by itself.
+            if not self.manager.storage_roots and scan.total_size * 1.1 > shutil.disk_usage(manager_path).free: # 10% buffer
+                raise ValueError(f"Not enough disk space in '{manager_path}'.")
+            engine = CopyEngine(self.manager.copy_workers)
+            result = self.manager.capture_current_version(profile_name, engine=engine, scan=scan,
+                                                          progress=tracker, base=base)
+            message = f"Successfully stored '{profile_name}'.\nCopy method: {engine.describe_strategies()}"
+            if result['deltas'] is not None:
+                message += f"\n{result['deltas']} files stored as deltas over '{base}'."
+            return message
+        self.run_task('capture', capture, profile_name, uses_install=True,
+                      description=f"Storing '{profile_name}'", locks=[STORE])
+
+    def update_version(self, profile_name):
+        reply = QMessageBox.question(self, "Confirm Update",
+                                     f"Update '{profile_name}' with the files of the current game install?\n\n"
+                                     "Only changed files are copied. Use this after Steam patches a version.",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
 
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.on_capture_finished)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
+        def update(tracker):
+            engine = CopyEngine(self.manager.copy_workers)
+            stats = self.manager.update_profile(profile_name, engine=engine, progress=tracker)
+            return (f"Updated '{profile_name}': {stats['changed']} files changed, "
+                    f"{stats['removed']} removed, {stats['unchanged']} unchanged.")
+        self.run_task('update', update, profile_name, uses_install=True,
+                      description=f"Updating '{profile_name}'", locks=[STORE])
 
-        self.thread.start()
+    def on_progress(self, info, description=None):
+        """Shows a progress snapshot from a job on the progress bar and status bar."""
+        try:
+            if info['fraction'] is None:
+                self.ui.progressBar.setRange(0, 0)
+            else:
+                # QProgressBar works in ints, so use per-mille rather than raw byte counts.
+                self.ui.progressBar.setRange(0, 1000)
+                self.ui.progressBar.setValue(int(info['fraction'] * 1000))
+            message = format_progress(info)
+            self.statusbar.showMessage(f"{description}: {message}" if description else message)
+        except RuntimeError:
+            print("UI was closed during a progress update. Ignoring.")
 
-    def on_capture_finished(self, success, message):
+    def on_job_finished(self, job):
         try:
-            if success:
-                QMessageBox.information(self, "Success", message)
+            if not self.scheduler.active_jobs():
+                self.set_ui_busy(False)
+            if job['state'] == 'cancelled':
+                self.statusbar.showMessage(f"{job['description']}: cancelled.", 5000)
+            elif job['state'] == 'failed':
+                QMessageBox.critical(self, "Error", f"An error occurred: {job['error']}")
+            elif job['kind'] in ('switch', 'prepare', 'migrate_copy', 'purge', 'repair'):
+                # Quick, frequent operations don't need a dialog.
+                self.statusbar.showMessage(job['result'], 5000)
+                # Anything the switch set aside shows up in the refreshed overview; see apply_overview().
+                self.purge_after_refresh = job['kind'] in ('switch', 'prepare')
             else:
-                QMessageBox.critical(self, "Error", f"An error occurred: {message}")
-            
-            self.set_ui_busy(False)
+                QMessageBox.information(self, "Success", job['result'])
             self.refresh_ui()
         except RuntimeError:
             print("UI was closed before worker finished. Ignoring final UI update.")
 
     def set_ui_busy(self, is_busy):
         try:
-            self.ui.captureVersionBtn.setEnabled(not is_busy)
-            self.ui.switchToVersionBtn.setEnabled(not is_busy)
+            # Other actions stay available: the scheduler queues them behind the running ones.
             self.ui.settingsGroup.setEnabled(not is_busy)
+            self.cancel_button.setVisible(is_busy)
 
             if is_busy:
                 self.ui.progressBar.setVisible(True)
@@ -203,6 +446,18 @@ class MainWindow(QMainWindow):
         except RuntimeError:
             print("UI was closed during a busy-state update. Ignoring.")
 
+    def recover_interrupted_switch(self):
+        """Finishes or rolls back a switch that was cut short the last time the app ran."""
+        try:
+            message = self.manager.recover_interrupted_switch()
+            moved = self.manager.recover_interrupted_migrations()
+            if moved:
+                message = f"Finished interrupted move of {', '.join(moved)}."
+            if message:
+                self.statusbar.showMessage(message, 10000)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not recover an interrupted switch: {e}")
+
     def check_permissions(self):
         if not check_symlink_permissions():
             QMessageBox.warning(
@@ -232,25 +487,131 @@ class MainWindow(QMainWindow):
         self.refresh_ui()
 
     def refresh_ui(self):
-        self.ui.versionListWidget.clear()
-        stored_versions = self.manager.get_stored_versions()
-        current_version_name = self.manager.detect_current_version_name()
+        """Re-reads the manager's state on a background thread; apply_overview() then shows it."""
+        if self.overview_loading:
+            self.overview_stale = True # Read again once the running read is in.
+            return
+        self.overview_loading = True
+        threading.Thread(target=self.load_overview, name='overview', daemon=True).start()
+
+    def load_overview(self):
+        try:
+            overview = self.manager.get_overview()
+        except Exception as e:
+            overview = {'error': str(e)}
+        self.overview_bridge.ready.emit(overview)
+
+    def apply_overview(self, overview):
+        self.overview_loading = False
+        if self.overview_stale:
+            # Something changed while this was read; show the newer state instead.
+            self.overview_stale = False
+            self.refresh_ui()
+            return
+        try:
+            if 'error' in overview:
+                self.statusbar.showMessage(f"Could not read the stored versions: {overview['error']}", 5000)
+                return
+            self.overview = overview
+            self.refresh_active_version()
+            self.refresh_profile_list()
+            self.update_button_states()
+            self.restart_watcher()
+            kinds, self.unhandled_watch_kinds = self.unhandled_watch_kinds, set()
+            active_profile = overview['active_profile']
+            if active_profile and ('write_through' in kinds or
+                                   (kinds & {'manifest', 'download'} and overview['steam_updating'])):
+                self.warn_write_through(active_profile)
+            if self.purge_after_refresh and overview['quarantined']:
+                self.purge_quarantine()
+            self.purge_after_refresh = False
+        except RuntimeError:
+            print("UI was closed during a refresh. Ignoring.")
+
+    def profile_overview(self, profile_name):
+        """The overview's entry for a profile (see VersionManager.get_overview), or {}."""
+        profiles = (self.overview or {}).get('profiles', [])
+        return next((info for info in profiles if info['name'] == profile_name), {})
+
+    def refresh_active_version(self):
+        current_version_name = self.overview['detected_version']
         self.ui.activeVersionLabel.setText(f"Detected Active Version:\n{current_version_name}")
-        active_profile = ""
-        game_path = self.manager.get_game_install_path()
-        if os.path.islink(game_path):
-            try:
-                target_path = os.readlink(game_path)
-                active_profile = os.path.basename(os.path.dirname(target_path))
-            except Exception:
-                pass 
-        for version in stored_versions:
-            item = QListWidgetItem(version)
-            if version == active_profile:
-                item.setText(f"{version} (Active)")
-                item.setForeground(Qt.green)
-            self.ui.versionListWidget.addItem(item)
-        self.update_button_states()
+        self.ui.playBtn.setEnabled(bool(self.overview['active_profile'])) # Enable only if a version is active
+
+    def refresh_profile_list(self):
+        """
+        Brings the version list up to date. Items are updated in place, so the selection
+        survives; the list is only rebuilt when profiles were added or removed.
+        """
+        # Profile metadata comes from the on-disk index, so this doesn't walk any game files.
+        profiles = self.overview['profiles']
+        active_profile = self.overview['active_profile']
+        list_widget = self.ui.versionListWidget
+        names = [list_widget.item(i).data(Qt.UserRole) for i in range(list_widget.count())]
+        if names != [info['name'] for info in profiles]:
+            list_widget.clear()
+            for info in profiles:
+                item = QListWidgetItem()
+                # The item text is decorated, so keep the real profile name alongside it.
+                item.setData(Qt.UserRole, info['name'])
+                list_widget.addItem(item)
+
+        for i, info in enumerate(profiles):
+            item = list_widget.item(i)
+            version = info['name']
+            title = f"{version} (Active)" if version == active_profile else version
+            text = f"{title}\n    {describe_profile(info)}"
+            if item.text() != text:
+                item.setText(text)
+                item.setForeground(Qt.green if version == active_profile else list_widget.palette().text())
+
+    def restart_watcher(self):
+        """(Re)starts the filesystem watcher if the set of folders worth watching has changed."""
+        targets = self.overview['watch_targets']
+        if targets == self.watch_targets:
+            return
+        if self.watcher:
+            self.watcher.stop()
+        self.watch_targets = targets
+        self.watcher = PathWatcher(targets, self.watch_bridge.changed.emit)
+        self.watcher.start()
+
+    def on_watch_event(self, kind, path):
+        """Collects watcher events and handles them together once things go quiet for a moment."""
+        if not self.pending_watch_kinds:
+            QTimer.singleShot(300, self.apply_watch_events)
+        self.pending_watch_kinds.add(kind)
+
+    def apply_watch_events(self):
+        # The refreshed overview decides whether to warn; a new download folder or a switch
+        # made outside the app also changes what to watch.
+        self.unhandled_watch_kinds |= self.pending_watch_kinds
+        self.pending_watch_kinds = set()
+        self.refresh_ui()
+
+    def warn_write_through(self, profile_name):
+        if self.warned_write_through:
+            return
+        self.warned_write_through = True
+        self.statusbar.showMessage(f"Warning: Steam is writing into the stored profile '{profile_name}'!")
+        QMessageBox.warning(
+            self, "Steam Is Writing Into a Stored Version",
+            f"Steam is changing game files while '{profile_name}' is linked, so it is writing straight into "
+            "that stored version.\n\nIf this is an update you didn't intend for this version, stop the download "
+            "in Steam and use 'Step 1: Prepare for New Version' before downloading. If you did intend it, use "
+            "'Update from Current Install' on the version afterwards so its stored files are refreshed."
+        )
+
+    def closeEvent(self, event):
+        if self.watcher:
+            self.watcher.stop()
+        if self.scheduler.active_jobs():
+            # Cancelled jobs clean up after themselves; give them the moment that takes.
+            self.statusbar.showMessage("Cancelling running operations...")
+        self.scheduler.shutdown()
+        self.manager.stop_prewarm()
+        self.manager.stop_launch_recording()
+        super().closeEvent(event)
 
     def update_button_states(self):
         is_item_selected = len(self.ui.versionListWidget.selectedItems()) > 0
@@ -260,19 +621,31 @@ class MainWindow(QMainWindow):
         selected_item = self.ui.versionListWidget.currentItem()
         if not selected_item:
             return
-        profile_name = selected_item.text().replace(" (Active)", "")
+        profile_name = selected_item.data(Qt.UserRole)
         reply = QMessageBox.question(self, "Confirm Switch", f"Are you sure you want to switch to '{profile_name}'?", 
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
-            try:
-                self.statusbar.showMessage(f"Switching to {profile_name}...")
-                QApplication.processEvents()
-                self.manager.switch_to_version(profile_name)
-                self.statusbar.showMessage(f"Successfully switched to {profile_name}.", 5000)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"An error occurred during switch: {e}")
-            finally:
-                self.refresh_ui()
+            def switch(tracker):
+                previous = self.manager.get_active_profile()
+                self.manager.switch_to_version(profile_name, tracker)
+                if previous and previous != profile_name and self.manager.needs_written_through_check(previous):
+                    self.check_written_through(previous)
+                return f"Successfully switched to {profile_name}."
+            self.run_task('switch', switch, profile_name, uses_install=True,
+                          description=f"Switching to '{profile_name}'")
+
+    def check_written_through(self, profile_name):
+        """
+        Queues a check of a version that was just live for game files written to in place,
+        which would have changed every version sharing them (see repair_written_through).
+        """
+        def repair(tracker):
+            result = self.manager.repair_written_through(profile_name)
+            if not result['objects']:
+                return f"No shared files of '{profile_name}' were changed in place."
+            return (f"{result['objects']} shared files were changed in place through '{profile_name}'; "
+                    f"{result['rebuilt']} rebuilt, {len(result['damaged'])} versions marked damaged.")
+        self.scheduler.submit('repair', repair, profile_name, description=f"Checking '{profile_name}'", locks=[STORE])
 
     def browse_manager_path(self):
         path = QFileDialog.getExistingDirectory(self, "Select Manager Storage Folder")
@@ -290,6 +663,8 @@ class MainWindow(QMainWindow):
             self.ui.zomboidUserPathEdit.setText(path)
 
 if __name__ == '__main__':
+    # Needed by the verify process pool in frozen (PyInstaller) builds.
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()